@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'ktsessions.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -73,6 +74,11 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'KTFlow.wsgi.application'
+ASGI_APPLICATION = 'KTFlow.asgi.application'
+
+# Serve kt_session_by_url, get_attachment and get_attachments with the async views in
+# ktsessions/async_views.py. Only enable when running under an ASGI server (uvicorn)
+KT_ASYNC_READS = os.getenv('KT_ASYNC_READS', 'False') == 'True'
 
 
 # Database
@@ -123,6 +129,8 @@ SIMPLE_JWT = {
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
     'TOKEN_USER_CLASS': 'rest_framework_simplejwt.models.TokenUser',
+    # Blacklist kept in the KT_TOKEN_BLACKLIST store rather than the token_blacklist tables
+    'TOKEN_REFRESH_SERIALIZER': 'authentication.serializers.TokenRefreshSerializer',
 
     'JTI_CLAIM': 'jti',
 
@@ -152,13 +160,22 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'authentication.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',  # Or whatever your default is
     ],
 }
 
+# Render API responses with orjson (ktsessions/renderers.py); falls back to the
+# standard encoder when orjson is not installed
+KT_FAST_JSON = os.getenv('KT_FAST_JSON', 'True') == 'True'
+if KT_FAST_JSON:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = [
+        'ktsessions.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ]
+
 
 
 # Internationalization
@@ -202,6 +219,94 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE  # Use your existing TIME_ZONE setting
 
+# ktsessions loggers (processing progress, retries, takeovers) pass the attachment id as
+# `extra={'attachment_id': ...}`, so structured handlers can index it
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'plain'},
+    },
+    'loggers': {
+        'ktsessions': {
+            'handlers': ['console'],
+            'level': os.environ.get('KT_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+# Attachment processing pipeline
+# Long media is split into KT_SEGMENT_SECONDS segments transcribed in parallel (see ktsessions/tasks.py)
+KT_TRANSCRIBER = os.environ.get('KT_TRANSCRIBER', 'ktsessions.processing.LocalTranscriber')
+KT_SEGMENT_SECONDS = int(os.environ.get('KT_SEGMENT_SECONDS', 300))
+# LocalTranscriber stand-in: assumed audio/video length and simulated work per segment
+KT_LOCAL_MEDIA_DURATION = int(os.environ.get('KT_LOCAL_MEDIA_DURATION', 3600))
+KT_LOCAL_TRANSCRIBER_DELAY = float(os.environ.get('KT_LOCAL_TRANSCRIBER_DELAY', 1))
+# Seconds a processing claim stays valid without progress; after that a redelivered task takes the
+# attachment over and the requeue_stale_attachments beat task puts it back to pending
+KT_PROCESSING_LEASE = int(os.environ.get('KT_PROCESSING_LEASE', 30 * 60))
+# Results are deduplicated by content hash in the ProcessingResult table; optionally also cached in Redis
+KT_RESULT_CACHE_REDIS = os.environ.get('KT_RESULT_CACHE_REDIS', 'False') == 'True'
+KT_RESULT_CACHE_TTL = int(os.environ.get('KT_RESULT_CACHE_TTL', 60 * 60 * 24))
+# Attachment transcripts and summaries are kept compressed outside the attachment rows (ktsessions/content_store.py):
+# DatabaseContentStore in a side table or FileSystemContentStore under KT_CONTENT_STORE_ROOT
+KT_CONTENT_STORE = os.environ.get('KT_CONTENT_STORE', 'ktsessions.content_store.DatabaseContentStore')
+KT_CONTENT_STORE_ROOT = os.environ.get('KT_CONTENT_STORE_ROOT', str(BASE_DIR / 'content'))
+# zstd needs the zstandard package and falls back to gzip without it
+KT_CONTENT_CODEC = os.environ.get('KT_CONTENT_CODEC', 'zstd')
+KT_CONTENT_FRAME_SIZE = int(os.environ.get('KT_CONTENT_FRAME_SIZE', 256 * 1024))
+
+# Transactional outbox: create_attachment only writes OutboxMessage rows, which
+# `python manage.py relay_outbox` (or the drain_outbox beat task) publishes to Celery
+KT_OUTBOX_BATCH_SIZE = int(os.environ.get('KT_OUTBOX_BATCH_SIZE', 500))
+# Attachments removed per DELETE statement and transaction by session and bulk deletes (ktsessions/deletion.py)
+KT_DELETE_BATCH_SIZE = int(os.environ.get('KT_DELETE_BATCH_SIZE', 500))
+# Rows fetched per server-side cursor round trip by the NDJSON export (ktsessions/backup.py)
+KT_EXPORT_CHUNK_SIZE = int(os.environ.get('KT_EXPORT_CHUNK_SIZE', 2000))
+# Sessions or attachments written per bulk_create and transaction by the NDJSON import
+KT_IMPORT_BATCH_SIZE = int(os.environ.get('KT_IMPORT_BATCH_SIZE', 500))
+
+# Rendered pages of kt_session_list_create, invalidated per user by a generation counter
+KT_SESSION_LIST_CACHE_TTL = int(os.environ.get('KT_SESSION_LIST_CACHE_TTL', 60 * 10))
+
+# Per-request SQL/Redis/broker timings are exported on /metrics (ktsessions/instrumentation.py);
+# when enabled, requests sending `X-Debug-Timing: 1` also get them in a Server-Timing header
+KT_TIMING_HEADER = os.environ.get('KT_TIMING_HEADER', 'False') == 'True'
+# Bearer token the Prometheus scraper sends to read /metrics; staff users' access tokens work too
+KT_METRICS_TOKEN = os.environ.get('KT_METRICS_TOKEN', '')
+# Port on which celery workers serve their task metrics (0 disables), see ktsessions/telemetry.py
+KT_WORKER_METRICS_PORT = int(os.environ.get('KT_WORKER_METRICS_PORT', 0))
+
+# Users resolved from access tokens are cached in-process and in Redis (authentication/user_cache.py);
+# a deactivated user can stay authenticated in other processes for up to KT_USER_CACHE_LOCAL_TTL seconds
+KT_USER_CACHE_SIZE = int(os.environ.get('KT_USER_CACHE_SIZE', 1024))
+KT_USER_CACHE_LOCAL_TTL = int(os.environ.get('KT_USER_CACHE_LOCAL_TTL', 5))
+KT_USER_CACHE_TTL = int(os.environ.get('KT_USER_CACHE_TTL', 60))
+
+# Where rotated and logged out refresh tokens are blacklisted (authentication/blacklist.py):
+# RedisBlacklist keys expire with the tokens, DatabaseBlacklist uses simplejwt's token_blacklist tables,
+# MigratingBlacklist is RedisBlacklist also honouring those tables until purge_token_blacklist empties them
+KT_TOKEN_BLACKLIST = os.environ.get('KT_TOKEN_BLACKLIST', 'authentication.blacklist.MigratingBlacklist')
+
+# Rows accepted per request by the admin user import endpoint; larger files go through `manage.py import_users`
+KT_USER_IMPORT_MAX_ROWS = int(os.environ.get('KT_USER_IMPORT_MAX_ROWS', 10000))
+# Password hashing processes each web process starts on its first user import, shared by concurrent imports
+KT_PASSWORD_HASH_WORKERS = int(os.environ.get('KT_PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1)))
+CELERY_BEAT_SCHEDULE = {
+    'drain-outbox': {
+        'task': 'ktsessions.tasks.drain_outbox',
+        'schedule': 5.0,
+    },
+    'requeue-stale-attachments': {
+        'task': 'ktsessions.tasks.requeue_stale_attachments',
+        'schedule': 60.0,
+    },
+}
+
 # redis cache settings
 CACHES = {
     "default": {
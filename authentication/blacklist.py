@@ -0,0 +1,109 @@
+"""
+Refresh token blacklist stores, selected by KT_TOKEN_BLACKLIST.
+
+RedisBlacklist keeps one key per blacklisted jti that expires together with the
+token, so the blacklist never outgrows the live tokens and a refresh checks it
+with a single EXISTS. Nothing is recorded for tokens that are issued.
+
+DatabaseBlacklist is simplejwt's token_blacklist behaviour: an OutstandingToken
+row per issued token and a BlacklistedToken row per revoked one. Those tables are
+never trimmed; `python manage.py purge_token_blacklist` moves them over to Redis.
+
+MigratingBlacklist (default) is RedisBlacklist that also honours those tables, so
+tokens revoked before an upgrade stay revoked. Once purge_token_blacklist has
+emptied them it records that in Redis and the tables are no longer queried; a
+refresh then costs one MGET.
+"""
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+
+@lru_cache(maxsize=None)
+def get_blacklist():
+    """The store configured by KT_TOKEN_BLACKLIST"""
+    return import_string(settings.KT_TOKEN_BLACKLIST)()
+
+
+class BaseBlacklist:
+    """Interface authentication.tokens.RefreshToken expects from KT_TOKEN_BLACKLIST"""
+
+    def is_blacklisted(self, token):
+        raise NotImplementedError
+
+    def blacklist(self, token):
+        raise NotImplementedError
+
+    def outstand(self, token):
+        """Record a newly issued token, for stores that track them"""
+
+
+class RedisBlacklist(BaseBlacklist):
+    def _key(self, jti):
+        return f'auth:blacklist:{jti}'
+
+    def add(self, jti, exp):
+        """Blacklist jti until exp (epoch seconds); already expired tokens need no entry"""
+        ttl = int(exp - time.time()) + 1
+        if ttl > 0:
+            cache.set(self._key(jti), 1, ttl)
+
+    def is_blacklisted(self, token):
+        return cache.has_key(self._key(token[api_settings.JTI_CLAIM]))
+
+    def blacklist(self, token):
+        self.add(token[api_settings.JTI_CLAIM], token['exp'])
+
+
+class DatabaseBlacklist(BaseBlacklist):
+    def _outstanding(self, token):
+        from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+        user_model = get_user_model()
+        user_id = token.payload.get(api_settings.USER_ID_CLAIM)
+        outstanding, _ = OutstandingToken.objects.get_or_create(
+            jti=token[api_settings.JTI_CLAIM],
+            defaults={
+                'user': user_model.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first(),
+                'created_at': token.current_time,
+                'token': str(token),
+                'expires_at': datetime_from_epoch(token['exp']),
+            },
+        )
+        return outstanding
+
+    def is_blacklisted(self, token):
+        from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+        return BlacklistedToken.objects.filter(token__jti=token[api_settings.JTI_CLAIM]).exists()
+
+    def blacklist(self, token):
+        from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+        BlacklistedToken.objects.get_or_create(token=self._outstanding(token))
+        # The tables are in use again, MigratingBlacklist has to check them
+        cache.delete(MigratingBlacklist.PURGED_KEY)
+
+    def outstand(self, token):
+        self._outstanding(token)
+
+
+class MigratingBlacklist(RedisBlacklist):
+    """RedisBlacklist that still honours the token_blacklist tables, until purge_token_blacklist has run"""
+    PURGED_KEY = 'auth:blacklist:tables-purged'
+
+    def is_blacklisted(self, token):
+        key = self._key(token[api_settings.JTI_CLAIM])
+        found = cache.get_many([key, self.PURGED_KEY])
+        if key in found:
+            return True
+        return self.PURGED_KEY not in found and DatabaseBlacklist().is_blacklisted(token)
+
+    def mark_purged(self):
+        cache.set(self.PURGED_KEY, 1, None)
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+from authentication.blacklist import DatabaseBlacklist, MigratingBlacklist, RedisBlacklist, get_blacklist
+
+
+class Command(BaseCommand):
+    help = (
+        'Empty the token_blacklist tables in batches. Blacklisted tokens that have not expired '
+        'are first copied to the Redis blacklist; with the database blacklist only expired rows go.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--expired-only', action='store_true', help='keep rows of tokens that have not expired')
+
+    def handle(self, *args, **options):
+        blacklist = get_blacklist()
+        expired_only = options['expired_only'] or isinstance(blacklist, DatabaseBlacklist)
+        if not expired_only and not isinstance(blacklist, RedisBlacklist):
+            self.stderr.write(f'Unknown blacklist {type(blacklist).__name__}, only purging expired rows')
+            expired_only = True
+
+        now = aware_utcnow()
+        tokens = OutstandingToken.objects.all()
+        if expired_only:
+            tokens = tokens.filter(expires_at__lte=now)
+
+        purged = copied = 0
+        last_id = 0
+        while True:
+            rows = list(
+                tokens.filter(id__gt=last_id).order_by('id')
+                .values_list('id', 'jti', 'expires_at', 'blacklistedtoken')[:options['batch_size']]
+            )
+            if not rows:
+                break
+            if not expired_only:
+                for _, jti, expires_at, blacklisted in rows:
+                    if blacklisted is not None and expires_at > now:
+                        blacklist.add(jti, expires_at.timestamp())
+                        copied += 1
+
+            ids = [row[0] for row in rows]
+            with transaction.atomic():
+                BlacklistedToken.objects.filter(token_id__in=ids).delete()
+                OutstandingToken.objects.filter(id__in=ids).delete()
+            purged += len(rows)
+            last_id = rows[-1][0]
+
+        if isinstance(blacklist, MigratingBlacklist) and not expired_only:
+            blacklist.mark_purged()
+        self.stdout.write(self.style.SUCCESS(
+            f'Done, {purged} outstanding tokens purged, {copied} blacklisted tokens copied to Redis'
+        ))
@@ -0,0 +1,201 @@
+"""
+Bulk user import from CSV or NDJSON, for onboarding whole teams at once.
+
+Rows carry `email`, `name` and optionally `password` (users without one get an
+unusable password and sign in after a reset). Instead of register's per-user
+existence query, create and second save, an import:
+- validates every row like registration does (email, name, password length)
+- checks all emails against the database in a few IN queries
+- hashes passwords in a process pool: one bounded pool per web process, shared by
+  concurrent requests, or all cores for the import_users command
+- inserts the new users with one bulk_create inside a transaction
+"""
+import csv
+import io
+import json
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from rest_framework import serializers
+
+from .models import CustomUser
+
+FORMATS = ('csv', 'ndjson')
+EXISTENCE_CHUNK_SIZE = 5000
+INSERT_BATCH_SIZE = 1000
+# Below this many passwords per worker the pool costs more than it saves
+MIN_PASSWORDS_PER_WORKER = 8
+
+
+class UserImportSerializer(serializers.Serializer):
+    """Same field rules as UserRegistrationSerializer, without its per-row query"""
+    email = serializers.EmailField()
+    name = serializers.CharField(max_length=100)
+    password = serializers.CharField(min_length=8, required=False, allow_blank=True)
+
+
+def detect_format(filename='', content_type=''):
+    """'csv' or 'ndjson' from a file name or a content type, None if neither tells"""
+    filename, content_type = filename.lower(), content_type.lower()
+    if filename.endswith('.csv') or content_type.startswith('text/csv'):
+        return 'csv'
+    if filename.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type or 'jsonlines' in content_type:
+        return 'ndjson'
+    return None
+
+
+def parse_rows(data, file_format):
+    """
+    Rows of a CSV (with a header line) or NDJSON document, as dicts.
+    Raises ValueError on a line that is not a JSON object.
+    """
+    if isinstance(data, bytes):
+        data = data.decode('utf-8-sig')
+    if file_format == 'csv':
+        return [dict(row) for row in csv.DictReader(io.StringIO(data))]
+    if file_format == 'ndjson':
+        rows = []
+        for number, line in enumerate(data.splitlines(), start=1):
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError(f'line {number} is not a JSON object')
+            rows.append(row)
+        return rows
+    raise ValueError(f'format must be one of {", ".join(FORMATS)}')
+
+
+def _setup_worker():
+    # Spawned workers (macOS, Windows) start without Django configured
+    django.setup()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _shared_pool():
+    """The KT_PASSWORD_HASH_WORKERS processes of this process, started by the first import"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=settings.KT_PASSWORD_HASH_WORKERS, initializer=_setup_worker)
+        return _pool
+
+
+def _hash_shared(passwords, chunksize):
+    global _pool
+    pool = _shared_pool()
+    try:
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
+    except BrokenProcessPool:
+        # A worker died, e.g. killed for memory: the next import starts a new pool
+        with _pool_lock:
+            if _pool is pool:
+                _pool = None
+        raise
+
+
+def hash_passwords(passwords, workers=None):
+    """
+    make_password for each password (None gives an unusable one), in parallel processes:
+    the shared pool by default, or a pool of `workers` processes of its own (1 hashes inline)
+    """
+    to_hash = [password for password in passwords if password]
+    if workers == 1 or len(to_hash) < MIN_PASSWORDS_PER_WORKER * 2:
+        return [make_password(password or None) for password in passwords]
+
+    if workers is None:
+        workers = settings.KT_PASSWORD_HASH_WORKERS
+        hashed = _hash_shared(to_hash, chunksize=max(1, len(to_hash) // (workers * 4)))
+    else:
+        workers = min(workers, len(to_hash) // MIN_PASSWORDS_PER_WORKER)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_setup_worker) as executor:
+            hashed = list(executor.map(make_password, to_hash, chunksize=max(1, len(to_hash) // (workers * 4))))
+    hashed = iter(hashed)
+    return [next(hashed) if password else make_password(None) for password in passwords]
+
+
+def _existing_emails(emails):
+    existing = set()
+    emails = list(emails)
+    for start in range(0, len(emails), EXISTENCE_CHUNK_SIZE):
+        chunk = emails[start:start + EXISTENCE_CHUNK_SIZE]
+        # username mirrors email, but admin-created users may differ
+        for email, username in CustomUser.objects.filter(
+            Q(email__in=chunk) | Q(username__in=chunk)
+        ).values_list('email', 'username'):
+            existing.update((email, username))
+    return existing & set(emails)
+
+
+def import_users(rows, workers=None, dry_run=False):
+    """
+    Validate rows and create the users that do not exist yet.
+    Returns {'created': n, 'errors': [{'row': i, 'email': .., 'error': ..}, ...]}
+    with rows numbered from 1; invalid and already existing rows are skipped.
+    dry_run validates only and reports 'would_create' instead.
+    """
+    errors = []
+    valid = {}
+    for number, row in enumerate(rows, start=1):
+        serializer = UserImportSerializer(data=row)
+        if not serializer.is_valid():
+            errors.append({'row': number, 'email': row.get('email'), 'error': serializer.errors})
+            continue
+        data = serializer.validated_data
+        email = CustomUser.objects.normalize_email(data['email'])
+        if email in valid:
+            errors.append({'row': number, 'email': email, 'error': 'duplicate email in this import'})
+            continue
+        valid[email] = (number, data)
+
+    for email in _existing_emails(valid):
+        number, _ = valid.pop(email)
+        errors.append({'row': number, 'email': email, 'error': 'User with this email already exists.'})
+    errors.sort(key=lambda error: error['row'])
+
+    if dry_run:
+        return {'created': 0, 'would_create': len(valid), 'errors': errors}
+    if not valid:
+        return {'created': 0, 'errors': errors}
+
+    passwords = hash_passwords([data.get('password') for _, data in valid.values()], workers)
+    users = [
+        CustomUser(username=email, email=email, name=data['name'], password=password)
+        for (email, (_, data)), password in zip(valid.items(), passwords)
+    ]
+    rows = {email: number for email, (number, _) in valid.items()}
+    return {'created': _insert_users(users, rows, errors), 'errors': errors}
+
+
+def _insert_users(users, rows, errors):
+    """
+    bulk_create the users; returns how many were created. Emails taken since the
+    existence check (a registration or another import) are reported in `errors`
+    with their row in `rows` and the others inserted again; a second collision raises.
+    """
+    try:
+        with transaction.atomic():
+            CustomUser.objects.bulk_create(users, batch_size=INSERT_BATCH_SIZE)
+        return len(users)
+    except IntegrityError:
+        taken = _existing_emails(user.email for user in users)
+        if not taken:
+            raise
+
+    errors.extend(
+        {'row': rows[email], 'email': email, 'error': 'User with this email already exists.'} for email in taken
+    )
+    errors.sort(key=lambda error: error['row'])
+    users = [user for user in users if user.email not in taken]
+    with transaction.atomic():
+        CustomUser.objects.bulk_create(users, batch_size=INSERT_BATCH_SIZE)
+    return len(users)
@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as BaseTokenRefreshSerializer
 from .models import CustomUser
+from .tokens import RefreshToken
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, min_length=8)
@@ -8,6 +10,8 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
     class Meta:
         model = CustomUser
         fields = ('name', 'email', 'password')
+        # Uniqueness is checked once, by validate_email
+        extra_kwargs = {'email': {'validators': []}}
 
     def validate_email(self, value):
         if CustomUser.objects.filter(email=value).exists():
@@ -20,10 +24,9 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         user = CustomUser.objects.create_user(
             username=validated_data['email'],
             email=validated_data['email'],
-            name=validated_data['name']
+            name=validated_data['name'],
+            password=password,
         )
-        user.set_password(password)
-        user.save()
         return user
 
 class UserSerializer(serializers.ModelSerializer):
@@ -49,4 +52,9 @@ class UserLoginSerializer(serializers.Serializer):
             attrs['user'] = user
             return attrs
         else:
-            raise serializers.ValidationError('Must include email and password')
\ No newline at end of file
+            raise serializers.ValidationError('Must include email and password')
+
+
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+    """Rotates through authentication.tokens.RefreshToken and its blacklist store"""
+    token_class = RefreshToken
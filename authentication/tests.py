@@ -1,3 +1,198 @@
-from django.test import TestCase
+from io import StringIO
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .blacklist import DatabaseBlacklist, MigratingBlacklist, RedisBlacklist
+from .models import CustomUser
+from . import provisioning
+from .provisioning import hash_passwords, import_users, parse_rows
+from .tokens import RefreshToken
+from .user_cache import get_user
+
+
+class AuthTestCase(TestCase):
+    def setUp(self):
+        # Cached users and blacklist entries would outlive the rolled back rows
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            username='owner@example.com', email='owner@example.com', name='owner', password='owner-password'
+        )
+        self.client = APIClient()
+
+
+class UserCacheTests(AuthTestCase):
+    def test_cached_user_needs_no_query(self):
+        get_user(self.user.id)
+
+        with self.assertNumQueries(0):
+            user = get_user(self.user.id)
+        self.assertEqual((user.id, user.email), (self.user.id, self.user.email))
+
+    def test_password_is_not_cached(self):
+        get_user(self.user.id)
+
+        user = get_user(self.user.id)
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password('owner-password'))
+
+    def test_saved_user_is_reloaded(self):
+        get_user(self.user.id)
+        self.user.name = 'renamed'
+        self.user.save()
+
+        self.assertEqual(get_user(self.user.id).name, 'renamed')
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.assertEqual(self.client.get('/api/kt-sessions/').status_code, 200)
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.client.get('/api/kt-sessions/').status_code, 401)
+
+
+class BlacklistTests(AuthTestCase):
+    def refresh(self, token):
+        return self.client.post('/api/auth/token/refresh/', {'refresh': token}, format='json')
+
+    def test_logged_out_refresh_token_is_rejected(self):
+        refresh = str(RefreshToken.for_user(self.user))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+        response = self.client.post('/api/auth/logout/', {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+        self.assertEqual(self.refresh(refresh).status_code, 401)
+
+    def test_rotated_refresh_token_is_rejected(self):
+        refresh = str(RefreshToken.for_user(self.user))
+
+        response = self.refresh(refresh)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.refresh(response.json()['refresh']).status_code, 200)
+
+        self.assertEqual(self.refresh(refresh).status_code, 401)
+
+    def test_issuing_a_token_writes_nothing(self):
+        with self.assertNumQueries(0):
+            RefreshToken.for_user(self.user)
+        self.assertFalse(OutstandingToken.objects.exists())
+
+    def test_purge_moves_the_tables_to_redis(self):
+        token = RefreshToken.for_user(self.user)
+        DatabaseBlacklist().blacklist(token)
+        self.assertFalse(RedisBlacklist().is_blacklisted(token))
+        self.assertTrue(MigratingBlacklist().is_blacklisted(token))
+
+        call_command('purge_token_blacklist', stdout=StringIO())
+
+        self.assertFalse(OutstandingToken.objects.exists())
+        self.assertTrue(RedisBlacklist().is_blacklisted(token))
+
+    def test_tables_are_checked_until_purged(self):
+        token = RefreshToken.for_user(self.user)
+        with self.assertNumQueries(1):
+            self.assertFalse(MigratingBlacklist().is_blacklisted(token))
+
+        call_command('purge_token_blacklist', stdout=StringIO())
+
+        with self.assertNumQueries(0):
+            self.assertFalse(MigratingBlacklist().is_blacklisted(token))
+        # Writing to the tables again brings the check back
+        DatabaseBlacklist().blacklist(token)
+        self.assertTrue(MigratingBlacklist().is_blacklisted(token))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ImportTests(AuthTestCase):
+    CSV = (
+        'email,name,password\n'
+        'a@example.com,A,password-a\n'
+        'b@example.com,B,\n'
+        'a@example.com,A again,password-a\n'
+        'owner@example.com,Owner,password-o\n'
+        'not-an-email,C,password-c\n'
+    )
+
+    def test_import_creates_new_users_and_reports_the_rest(self):
+        result = import_users(parse_rows(self.CSV, 'csv'), workers=1)
+
+        self.assertEqual(result['created'], 2)
+        self.assertEqual([(error['row'], error['email']) for error in result['errors']], [
+            (3, 'a@example.com'), (4, 'owner@example.com'), (5, 'not-an-email'),
+        ])
+        self.assertTrue(CustomUser.objects.get(email='a@example.com').check_password('password-a'))
+        self.assertFalse(CustomUser.objects.get(email='b@example.com').has_usable_password())
+
+    def test_dry_run_creates_nothing(self):
+        result = import_users(parse_rows(self.CSV, 'csv'), dry_run=True)
+
+        self.assertEqual((result['created'], result['would_create']), (0, 2))
+        self.assertEqual(CustomUser.objects.count(), 1)
+
+    def test_pooled_hashes_verify(self):
+        passwords = [f'password-{n}' for n in range(16)] + [None]
+
+        hashed = hash_passwords(passwords, workers=2)
+
+        user = CustomUser(password=hashed[3])
+        self.assertTrue(user.check_password('password-3'))
+        self.assertFalse(CustomUser(password=hashed[-1]).has_usable_password())
+
+    def test_requests_share_one_pool(self):
+        passwords = [f'password-{n}' for n in range(16)]
+
+        hashed = hash_passwords(passwords)
+
+        self.assertTrue(CustomUser(password=hashed[0]).check_password('password-0'))
+        self.assertIs(provisioning._shared_pool(), provisioning._shared_pool())
+        self.assertLessEqual(provisioning._shared_pool()._max_workers, settings.KT_PASSWORD_HASH_WORKERS)
+
+    def test_email_taken_after_the_check_is_reported(self):
+        # As if owner@example.com registered between the existence check and the insert
+        users = [CustomUser(username=email, email=email, name='x') for email in ('c@example.com', 'owner@example.com')]
+        errors = []
+
+        created = provisioning._insert_users(users, {'c@example.com': 1, 'owner@example.com': 2}, errors)
+
+        self.assertEqual(created, 1)
+        self.assertEqual(errors, [{'row': 2, 'email': 'owner@example.com', 'error': 'User with this email already exists.'}])
+        self.assertTrue(CustomUser.objects.filter(email='c@example.com').exists())
+
+    def test_endpoint_is_staff_only(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        rows = [{'email': 'new@example.com', 'name': 'New'}]
+        self.assertEqual(self.client.post('/api/auth/users/import/', rows, format='json').status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.post('/api/auth/users/import/', rows, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json(), {'created': 1, 'errors': []})
+
+
+class RegisterTests(AuthTestCase):
+    def test_register_stores_hashed_password(self):
+        response = self.client.post('/api/auth/register/', {
+            'name': 'new', 'email': 'new@example.com', 'password': 'new-password',
+        }, format='json')
+
+        self.assertEqual(response.status_code, 201, response.content)
+        user = CustomUser.objects.get(email='new@example.com')
+        self.assertEqual(user.username, 'new@example.com')
+        self.assertTrue(user.check_password('new-password'))
+
+    def test_register_rejects_taken_email(self):
+        response = self.client.post('/api/auth/register/', {
+            'name': 'again', 'email': 'owner@example.com', 'password': 'new-password',
+        }, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['email'], ['User with this email already exists.'])
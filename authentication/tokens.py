@@ -0,0 +1,32 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.exceptions import TokenError
+
+from .blacklist import get_blacklist
+
+
+class RefreshToken(tokens.RefreshToken):
+    """
+    simplejwt's RefreshToken with the blacklist in the KT_TOKEN_BLACKLIST store.
+    Skips simplejwt's BlacklistMixin (token_blacklist tables) by calling past it.
+    """
+
+    def verify(self, *args, **kwargs):
+        self.check_blacklist()
+        super(tokens.BlacklistMixin, self).verify(*args, **kwargs)
+
+    def check_blacklist(self):
+        if get_blacklist().is_blacklisted(self):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        get_blacklist().blacklist(self)
+
+    def outstand(self):
+        get_blacklist().outstand(self)
+
+    @classmethod
+    def for_user(cls, user):
+        token = super(tokens.BlacklistMixin, cls).for_user(user)
+        get_blacklist().outstand(token)
+        return token
@@ -0,0 +1,110 @@
+"""
+Users resolved by id for JWT authentication, cached in two tiers.
+
+1. an in-process LRU, entries live KT_USER_CACHE_LOCAL_TTL seconds
+2. Redis (the default cache), entries live KT_USER_CACHE_TTL seconds
+
+A warm request therefore authenticates without touching Postgres or Redis. Saving
+or deleting a user drops both tiers in the process that made the change; other
+processes still hold their local copy for at most KT_USER_CACHE_LOCAL_TTL seconds,
+which bounds how long a deactivated user stays authenticated. Changes made with
+QuerySet.update() send no signal and are picked up once both tiers expire.
+
+Cached values are plain field dicts without the password hash. Every lookup builds
+a fresh instance from them, so requests never share a user object and reading the
+password loads it from the database.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+
+# Not cached: loaded on access through Django's deferred fields
+UNCACHED_FIELDS = ('password',)
+
+
+class LocalLRU:
+    """Thread-safe LRU with a per-entry time to live"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_local = LocalLRU(settings.KT_USER_CACHE_SIZE, settings.KT_USER_CACHE_LOCAL_TTL)
+
+
+def _user_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def _cached_fields(user_model):
+    return [field.attname for field in user_model._meta.concrete_fields if field.attname not in UNCACHED_FIELDS]
+
+
+def _load(user_model, user_id):
+    return user_model._default_manager.filter(pk=user_id).values(*_cached_fields(user_model)).first()
+
+
+def get_user(user_id):
+    """The user with this primary key, or None if there is none"""
+    user_model = get_user_model()
+    key = _user_key(user_id)
+    fields = _local.get(key)
+    if fields is None:
+        fields = cache.get(key)
+        if fields is None:
+            fields = _load(user_model, user_id)
+            if fields is None:
+                return None
+            cache.set(key, fields, settings.KT_USER_CACHE_TTL)
+        _local.set(key, fields)
+    return user_model.from_db(user_model._default_manager.db, list(fields), list(fields.values()))
+
+
+def invalidate_user(user_id):
+    """
+    Drop the user from both tiers, now and again once the transaction commits, so
+    a request racing with the write cannot keep the old row cached.
+    """
+    key = _user_key(user_id)
+
+    def drop():
+        _local.delete(key)
+        cache.delete(key)
+
+    drop()
+    transaction.on_commit(drop)
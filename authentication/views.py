@@ -1,11 +1,16 @@
+import csv
+
 from rest_framework import status, generics
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
+from django.conf import settings
 from django.contrib.auth import authenticate
+from django.db import IntegrityError
 from .models import CustomUser
+from .provisioning import detect_format, import_users, parse_rows
 from .serializers import UserRegistrationSerializer, UserSerializer, UserLoginSerializer
+from .tokens import RefreshToken
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -51,3 +56,40 @@ def logout(request):
             return Response({'error': 'Refresh token is required'}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response({'error': 'Invalid token'}, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def import_users_view(request):
+    """
+    Create users in bulk from a multipart `file` (.csv or .ndjson), a text/csv or
+    application/x-ndjson body, or a JSON list of {email, name, password} objects.
+    ?format= overrides the detected format, ?dry_run=true only validates.
+    """
+    try:
+        content_type = request.content_type or ''
+        if content_type.startswith('multipart/'):
+            upload = request.FILES.get('file')
+            if upload is None:
+                return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+            file_format = request.GET.get('format') or detect_format(upload.name, upload.content_type or '')
+            rows = parse_rows(upload.read(), file_format)
+        elif content_type.startswith('application/json'):
+            rows = request.data
+            if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+                raise ValueError('expected a list of objects')
+        else:
+            file_format = request.GET.get('format') or detect_format(content_type=content_type)
+            rows = parse_rows(request.body, file_format)
+
+        if len(rows) > settings.KT_USER_IMPORT_MAX_ROWS:
+            raise ValueError(f'at most {settings.KT_USER_IMPORT_MAX_ROWS} users per request, use the import_users command')
+
+        result = import_users(rows, dry_run=request.GET.get('dry_run') == 'true')
+        return Response(result, status=status.HTTP_201_CREATED if result['created'] else status.HTTP_200_OK)
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return Response({'error': f'Invalid import: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+    except IntegrityError:
+        # Emails taken again while the import retried without the first ones
+        return Response({'error': 'Users with these emails were created meanwhile, import again'},
+                        status=status.HTTP_400_BAD_REQUEST)
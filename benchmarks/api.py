@@ -0,0 +1,464 @@
+"""
+Load and latency benchmark for every route in ktsessions/urls.py and
+authentication/urls.py.
+
+Runs in-process with Django's test client under benchmarks.settings (SQLite or the
+local Postgres, fakeredis, eager Celery) against a freshly created database seeded
+with users, sessions and attachments. For every scenario it reports throughput,
+p50/p95/p99 latency and the SQL query count per request, as JSON on stdout (or
+--output). A scenario using more queries than its budget in BUDGETS, or answering
+with an unexpected status, fails the run with exit status 1.
+
+Usage:
+    python -m benchmarks.api --users 20 --sessions 50 --attachments 20 --iterations 200
+    BENCH_DATABASE=postgres python -m benchmarks.api --output bench.json
+"""
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.hashers import make_password  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import CaptureQueriesContext, setup_test_environment  # noqa: E402
+from django.urls import URLPattern, URLResolver, get_resolver  # noqa: E402
+from rest_framework_simplejwt.tokens import AccessToken  # noqa: E402
+
+from authentication.models import CustomUser  # noqa: E402
+from authentication.tokens import RefreshToken  # noqa: E402
+from ktsessions.models import Attachment, KTSession  # noqa: E402
+from ktsessions.sharing import get_or_create_share_token  # noqa: E402
+
+BENCH_PASSWORD = 'bench-password'
+BENCH_APPS = ('authentication', 'ktsessions')
+
+# Max SQL queries per request, per scenario, counting transaction statements: the queries
+# each endpoint is meant to make, not what it happens to make today. Lower these as
+# endpoints get cheaper; a budget that has to grow is a regression to look at first.
+# The user behind a JWT is cached (authentication/user_cache.py), so only the first
+# authenticated request, the logout scenario, pays the user query.
+USER = 1
+# BEGIN and COMMIT of a write (savepoints instead inside ATOMIC_REQUESTS on Postgres)
+TRANSACTION = 2
+# All transcripts and summaries of a response, one content store read (ktsessions/content_store.py)
+TEXTS = 1
+# Storing new texts, one or a batch: the digest lookup, the frames insert
+NEW_TEXT = 2
+# Session owner looked up after a counter write to drop their cached session list (session_list_cache.py)
+OWNER = 1
+# Search index refresh of changed attachments: refs, delete, their texts, insert
+REINDEX = 4
+# Revision lookup answering If-None-Match before the body is built
+ETAG = 1
+
+
+def export_chunks(ctx):
+    """Content store reads of an export: one per KT_EXPORT_CHUNK_SIZE attachments (ktsessions/backup.py)"""
+    exported = Attachment.objects.filter(session__created_by=ctx.user, session__deleted_at__isnull=True).count()
+    return max(1, math.ceil(exported / settings.KT_EXPORT_CHUNK_SIZE))
+
+
+# A callable budget is given the Context before the scenario runs
+BUDGETS = {
+    # validate_email, insert
+    'register': 2,
+    'login': 1,
+    'logout': USER,
+    # simplejwt's active user check
+    'token_refresh': 1,
+    # existing emails, insert of the 50 rows
+    'import_users': 1 + TRANSACTION + 1,
+    # The page, then served from the session list cache
+    'kt_session_list_create GET': 1,
+    'kt_session_list_create POST': 1,
+    # session, attachments
+    'kt_session_detail GET': ETAG + 2 + TEXTS,
+    # session, update with the revision bump, counters reread
+    'kt_session_detail PATCH': 3,
+    'get_sharing_url': 1,
+    # As detail GET on a cold share payload cache, then nothing
+    'kt_session_by_url': ETAG + 2 + TEXTS,
+    'get_attachments cursor': ETAG + 1 + TEXTS,
+    # count, page; no text fields requested
+    'get_attachments offset': 2,
+    'get_attachment': ETAG + 1 + TEXTS,
+    # refs, the frames covering the range
+    'get_attachment_transcript': 2,
+    # session, then attachment, counters and outbox message
+    'create_attachment': 1 + TRANSACTION + 3 + OWNER,
+    # Grows with N on SQLite only, which splits the 100-row INSERT in two for its parameter limit
+    'create_attachments_bulk': 1 + TRANSACTION + 4 + OWNER,
+    # row, new summary, attachment update, session revision
+    'update_attachment': TRANSACTION + 1 + NEW_TEXT + 2 + REINDEX + OWNER,
+    # rows, timings, attachments, index rows, counters; the same for one id or a hundred
+    'delete_attachment': TRANSACTION + 5 + OWNER,
+    'delete_attachments_bulk': TRANSACTION + 5 + OWNER,
+    # session, then hidden and its delete_session task queued
+    'kt_session_detail DELETE': 1 + TRANSACTION + 2,
+    # sessions, attachments, then texts per chunk: the scenarios before it add thousands of attachments
+    'export_sessions': lambda ctx: 2 + TEXTS * export_chunks(ctx),
+    # The sessions, the transcripts not stored yet in one transaction, then the attachments,
+    # counters, outbox messages and index rows
+    'import_sessions': (TRANSACTION + 1) + (TRANSACTION + NEW_TEXT) + (TRANSACTION + 5) + OWNER,
+    # attachment states, timings, outbox backlog
+    'processing_stats': 3,
+    # visible sessions, index match, attachments, session titles
+    'search': 4,
+}
+
+# Routes that cannot be driven through the sync test client
+SKIPPED_ROUTES = {
+    'session_events': 'endless Server-Sent Events stream, needs an ASGI server',
+}
+
+VOCABULARY = (
+    'deployment service kubernetes cluster database migration index query cache redis queue worker '
+    'celery retry latency throughput request response token session attachment transcript summary '
+    'pipeline release rollback incident alert dashboard metric owner handover runbook on-call schema'
+).split()
+
+
+@dataclass
+class Scenario:
+    name: str
+    route: str
+    method: str
+    path: Callable
+    expect: int = 200
+    data: Optional[Callable] = None
+    auth: bool = True
+    # Untimed per-request setup, returns a value passed to path/data
+    setup: Optional[Callable] = None
+    max_iterations: Optional[int] = None
+    # Data of other content types is sent as returned by data
+    content_type: str = 'application/json'
+
+
+@dataclass
+class Context:
+    user: CustomUser
+    token: str
+    session: KTSession
+    attachment: Attachment
+    share_token: str
+    search_term: str
+    counter: Counter = field(default_factory=Counter)
+
+    def next(self, name):
+        self.counter[name] += 1
+        return self.counter[name]
+
+
+def transcript(rng, size_kb):
+    words = []
+    length = 0
+    while length < size_kb * 1024:
+        word = rng.choice(VOCABULARY)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)
+
+
+def seed(users, sessions, attachments, transcript_kb, rng):
+    """Bulk-create the dataset; returns the Context the scenarios run against"""
+    password = make_password(BENCH_PASSWORD)
+    CustomUser.objects.bulk_create(
+        CustomUser(username=f'bench-{i}@example.com', email=f'bench-{i}@example.com', name=f'bench {i}',
+                   password=password)
+        for i in range(users)
+    )
+    owners = list(CustomUser.objects.filter(email__startswith='bench-').order_by('id'))
+    KTSession.objects.bulk_create(
+        KTSession(title=f'KT {i} of {owner.name}', description=transcript(rng, 0.5), created_by=owner)
+        for owner in owners for i in range(sessions)
+    )
+    texts = [transcript(rng, transcript_kb) for _ in range(32)]
+    file_types = [choice[0] for choice in Attachment.FILE_TYPE_CHOICES]
+    batch = []
+    for session_id in KTSession.objects.order_by('id').values_list('id', flat=True).iterator():
+        for i in range(attachments):
+            done = rng.random() < 0.9
+            batch.append(Attachment(
+                session_id=session_id, file_type=rng.choice(file_types),
+                file_url=f'https://example.com/media/{session_id}/{i}.mp4',
+                status='done' if done else 'pending',
+                transcript=rng.choice(texts) if done else '', summary=rng.choice(texts)[:300] if done else '',
+            ))
+        if len(batch) >= 5000:
+            Attachment.objects.bulk_create(batch)
+            batch = []
+    Attachment.objects.bulk_create(batch)
+
+    call_command('repair_attachment_counts', stdout=open(os.devnull, 'w'))
+    call_command('rebuild_search_index', stdout=open(os.devnull, 'w'))
+    # As after a deploy: refreshes stop checking the token_blacklist tables
+    call_command('purge_token_blacklist', stdout=open(os.devnull, 'w'))
+
+    user = owners[0]
+    # processing_stats is admin only
+    CustomUser.objects.filter(id=user.id).update(is_staff=True)
+    session = KTSession.objects.filter(created_by=user).order_by('id').first()
+    return Context(
+        user=user,
+        token=str(AccessToken.for_user(user)),
+        session=session,
+        attachment=Attachment.objects.filter(session=session, status='done').order_by('id').first(),
+        share_token=get_or_create_share_token(session),
+        search_term=VOCABULARY[0],
+    )
+
+
+def scenarios(ctx):
+    def new_attachment(ctx):
+        return Attachment.objects.create(
+            session=ctx.session, file_type='pdf', file_url='https://example.com/media/delete-me.pdf'
+        ).id
+
+    def new_attachments(ctx):
+        return [attachment.id for attachment in Attachment.objects.bulk_create(
+            Attachment(session=ctx.session, file_type='pdf', file_url=f'https://example.com/media/delete-{i}.pdf')
+            for i in range(100)
+        )]
+
+    def new_session(ctx):
+        session = KTSession.objects.create(title='delete me', description='deleted by the benchmark', created_by=ctx.user)
+        Attachment.objects.bulk_create(
+            Attachment(session=session, file_type='text', file_url=f'https://example.com/media/{i}.txt',
+                       transcript='transcript ' * 1000)
+            for i in range(100)
+        )
+        return session.id
+
+    def export_file(ctx):
+        lines = [{'type': 'export', 'version': 1},
+                 {'type': 'session', 'id': 1, 'title': 'imported', 'description': 'imported by the benchmark'}]
+        lines += [
+            {'type': 'attachment', 'session': 1, 'file_type': 'text', 'file_url': f'https://example.com/media/import-{i}.txt',
+             'status': 'done' if i % 2 else 'pending', 'transcript': f'imported transcript {i}' if i % 2 else None}
+            for i in range(10)
+        ]
+        return b''.join(json.dumps(line).encode() + b'\n' for line in lines)
+
+    return [
+        Scenario('register', 'register', 'POST', lambda ctx, _: '/api/auth/register/', expect=201, auth=False,
+                 data=lambda ctx, _: {'name': 'new user', 'email': f'new-{ctx.next("register")}@example.com',
+                                      'password': BENCH_PASSWORD}, max_iterations=20),
+        Scenario('login', 'login', 'POST', lambda ctx, _: '/api/auth/login/', auth=False,
+                 data=lambda ctx, _: {'email': ctx.user.email, 'password': BENCH_PASSWORD}, max_iterations=20),
+        Scenario('logout', 'logout', 'POST', lambda ctx, _: '/api/auth/logout/',
+                 setup=lambda ctx: str(RefreshToken.for_user(ctx.user)), data=lambda ctx, refresh: {'refresh': refresh}),
+        Scenario('token_refresh', 'token_refresh', 'POST', lambda ctx, _: '/api/auth/token/refresh/', auth=False,
+                 setup=lambda ctx: str(RefreshToken.for_user(ctx.user)), data=lambda ctx, refresh: {'refresh': refresh}),
+        Scenario('import_users', 'import_users', 'POST', lambda ctx, _: '/api/auth/users/import/', expect=201,
+                 data=lambda ctx, _: [
+                     # No passwords: measures the import path, not PBKDF2
+                     {'email': f'import-{ctx.next("import")}@example.com', 'name': 'imported'} for _ in range(50)
+                 ]),
+        Scenario('kt_session_list_create GET', 'kt_session_list_create', 'GET', lambda ctx, _: '/api/kt-sessions/'),
+        Scenario('kt_session_list_create POST', 'kt_session_list_create', 'POST', lambda ctx, _: '/api/kt-sessions/',
+                 expect=201, data=lambda ctx, _: {'title': 'benchmark session', 'description': 'created by the benchmark'}),
+        Scenario('kt_session_detail GET', 'kt_session_detail', 'GET',
+                 lambda ctx, _: f'/api/kt-sessions/{ctx.session.id}/'),
+        Scenario('kt_session_detail PATCH', 'kt_session_detail', 'PATCH',
+                 lambda ctx, _: f'/api/kt-sessions/{ctx.session.id}/',
+                 data=lambda ctx, _: {'description': f'revision {ctx.next("session_patch")}'}),
+        Scenario('get_sharing_url', 'get_sharing_url', 'GET',
+                 lambda ctx, _: f'/api/kt-sessions/get_sharing_url/{ctx.session.id}/'),
+        Scenario('kt_session_by_url', 'kt_session_by_url', 'GET',
+                 lambda ctx, _: f'/api/kt-sessions/get_by_url/{ctx.share_token}/', auth=False),
+        Scenario('get_attachments cursor', 'get_attachments', 'GET',
+                 lambda ctx, _: f'/api/attachments/?session_id={ctx.session.id}&cursor=&exclude=transcript'),
+        Scenario('get_attachments offset', 'get_attachments', 'GET',
+                 lambda ctx, _: '/api/attachments/?page=2&per_page=20&fields=id,session,file_type,status'),
+        Scenario('get_attachment', 'get_attachment', 'GET', lambda ctx, _: f'/api/attachments/{ctx.attachment.id}/'),
+        Scenario('get_attachment_transcript', 'get_attachment_transcript', 'GET',
+                 lambda ctx, _: f'/api/attachments/{ctx.attachment.id}/transcript/'),
+        Scenario('create_attachment', 'create_attachment', 'POST', lambda ctx, _: '/api/attachments/create/',
+                 expect=201, data=lambda ctx, _: {'session_id': ctx.session.id, 'file_type': 'video',
+                                                  'file_url': 'https://example.com/media/new.mp4'}),
+        Scenario('create_attachments_bulk', 'create_attachments_bulk', 'POST', lambda ctx, _: '/api/attachments/bulk/',
+                 expect=201, data=lambda ctx, _: [
+                     {'session_id': ctx.session.id, 'file_type': 'audio', 'file_url': f'https://example.com/media/bulk-{i}.mp3'}
+                     for i in range(100)
+                 ], max_iterations=50),
+        Scenario('update_attachment', 'update_attachment', 'PATCH',
+                 lambda ctx, _: f'/api/attachments/{ctx.attachment.id}/update/?fields=id,status',
+                 data=lambda ctx, _: {'summary': f'edited summary {ctx.next("summary")}'}),
+        Scenario('delete_attachment', 'delete_attachment', 'DELETE',
+                 lambda ctx, attachment_id: f'/api/attachments/{attachment_id}/delete/', setup=new_attachment),
+        Scenario('delete_attachments_bulk', 'delete_attachments_bulk', 'POST',
+                 lambda ctx, _: '/api/attachments/bulk/delete/', setup=new_attachments,
+                 data=lambda ctx, ids: ids, max_iterations=50),
+        Scenario('kt_session_detail DELETE', 'kt_session_detail', 'DELETE',
+                 lambda ctx, session_id: f'/api/kt-sessions/{session_id}/', expect=202, setup=new_session,
+                 max_iterations=50),
+        Scenario('export_sessions', 'export_sessions', 'GET', lambda ctx, _: '/api/kt-sessions/export/'),
+        Scenario('import_sessions', 'import_sessions', 'POST', lambda ctx, _: '/api/kt-sessions/import/',
+                 expect=201, data=lambda ctx, _: export_file(ctx), content_type='application/x-ndjson',
+                 max_iterations=50),
+        Scenario('processing_stats', 'processing_stats', 'GET', lambda ctx, _: '/api/attachments/stats/?window=3600'),
+        Scenario('search', 'search', 'GET', lambda ctx, _: f'/api/search/?q={ctx.search_term}&limit=20'),
+    ]
+
+
+def benchmarked_routes():
+    """URL names of every route under the benchmarked apps"""
+    names = set()
+
+    def walk(patterns):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                if getattr(pattern.urlconf_module, '__name__', '').split('.')[0] in BENCH_APPS:
+                    names.update(p.name for p in pattern.url_patterns if isinstance(p, URLPattern) and p.name)
+                else:
+                    walk(pattern.url_patterns)
+
+    walk(get_resolver().url_patterns)
+    return names
+
+
+def percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def request(client, ctx, scenario, headers):
+    value = scenario.setup(ctx) if scenario.setup else None
+    path = scenario.path(ctx, value)
+    kwargs = {}
+    if scenario.data:
+        data = scenario.data(ctx, value)
+        if scenario.content_type == 'application/json':
+            data = json.dumps(data)
+        kwargs = {'data': data, 'content_type': scenario.content_type}
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        response = getattr(client, scenario.method.lower())(path, headers=headers if scenario.auth else None, **kwargs)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        elapsed = time.perf_counter() - start
+    return response.status_code, elapsed, len(queries.captured_queries)
+
+
+def run_scenario(client, ctx, scenario, iterations, warmup):
+    headers = {'Authorization': f'Bearer {ctx.token}'}
+    iterations = min(iterations, scenario.max_iterations or iterations)
+    budget = BUDGETS.get(scenario.name)
+    if callable(budget):
+        budget = budget(ctx)
+    statuses, latencies, query_counts = Counter(), [], []
+    for i in range(warmup + iterations):
+        status, elapsed, queries = request(client, ctx, scenario, headers)
+        # Cold requests count against the query budget but not the latency figures
+        statuses[status] += 1
+        query_counts.append(queries)
+        if i >= warmup:
+            latencies.append(elapsed)
+
+    latencies.sort()
+    return {
+        'route': scenario.route,
+        'method': scenario.method,
+        'iterations': iterations,
+        'rps': round(len(latencies) / sum(latencies), 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'queries': {'min': min(query_counts), 'median': statistics.median(query_counts), 'max': max(query_counts)},
+        'query_budget': budget,
+        'statuses': {str(code): count for code, count in sorted(statuses.items())},
+        'expected_status': scenario.expect,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--sessions', type=int, default=20, help='sessions per user')
+    parser.add_argument('--attachments', type=int, default=10, help='attachments per session')
+    parser.add_argument('--transcript-kb', type=float, default=20)
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--only', nargs='+', help='scenario names to run')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        started = time.perf_counter()
+        ctx = seed(args.users, args.sessions, args.attachments, args.transcript_kb, random.Random(args.seed))
+        seed_seconds = time.perf_counter() - started
+
+        client = Client()
+        results = {}
+        for scenario in scenarios(ctx):
+            if args.only and scenario.name not in args.only:
+                continue
+            results[scenario.name] = run_scenario(client, ctx, scenario, args.iterations, args.warmup)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    covered = {result['route'] for result in results.values()}
+    failures = []
+    for name, result in results.items():
+        if result['query_budget'] is not None and result['queries']['max'] > result['query_budget']:
+            failures.append(f"{name}: {result['queries']['max']} queries, budget {result['query_budget']}")
+        unexpected = set(result['statuses']) - {str(result['expected_status'])}
+        if unexpected:
+            failures.append(f"{name}: unexpected statuses {sorted(unexpected)}")
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'database': connection.vendor,
+            'users': args.users,
+            'sessions_per_user': args.sessions,
+            'attachments_per_session': args.attachments,
+            'transcript_kb': args.transcript_kb,
+            'iterations': args.iterations,
+            'seed_seconds': round(seed_seconds, 2),
+        },
+        'results': results,
+        'skipped_routes': SKIPPED_ROUTES,
+        'uncovered_routes': sorted(benchmarked_routes() - covered - set(SKIPPED_ROUTES)) if not args.only else [],
+        'failures': failures,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    for failure in failures:
+        print(f'FAIL {failure}', file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Compare the sync WSGI read path (gunicorn + KTFlow.wsgi) with the async ASGI one
+(uvicorn + KTFlow.asgi with KT_ASYNC_READS=True) at high concurrency.
+
+Seeds a user, a shared session and some attachments in the configured database,
+starts each server in turn and drives kt_session_by_url, get_attachment and
+get_attachments with a keep-alive asyncio load generator.
+
+Usage (needs the Redis/Postgres configured in settings):
+    python -m benchmarks.async_reads --concurrency 256 --requests 20000 --workers 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'KTFlow.settings')
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from rest_framework_simplejwt.tokens import AccessToken  # noqa: E402
+
+from ktsessions.models import Attachment, KTSession  # noqa: E402
+from ktsessions.sharing import get_or_create_share_token  # noqa: E402
+
+SERVERS = {
+    'wsgi': lambda port, workers: (
+        ['gunicorn', 'KTFlow.wsgi', '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+         '--threads', '8', '--log-level', 'warning'],
+        {'KT_ASYNC_READS': 'False'},
+    ),
+    'asgi': lambda port, workers: (
+        ['uvicorn', 'KTFlow.asgi:application', '--host', '127.0.0.1', '--port', str(port),
+         '--workers', str(workers), '--log-level', 'warning', '--no-access-log'],
+        {'KT_ASYNC_READS': 'True'},
+    ),
+}
+
+
+def seed(attachments):
+    user, _ = get_user_model().objects.get_or_create(
+        email='async-bench@example.com', defaults={'username': 'async-bench@example.com', 'name': 'bench'}
+    )
+    session = KTSession.objects.create(title='async bench', description='bench', created_by=user)
+    Attachment.objects.bulk_create(
+        Attachment(session=session, file_type='video', file_url='https://example.com/bench.mp4',
+                   status='done', transcript='lorem ipsum ' * 500, summary='summary')
+        for _ in range(attachments)
+    )
+    attachment_id = Attachment.objects.filter(session=session).values_list('id', flat=True).first()
+    return user, session, attachment_id
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(('127.0.0.1', port)) == 0:
+                return
+        time.sleep(0.2)
+    raise RuntimeError(f'server did not start on port {port}')
+
+
+async def _worker(host, port, paths, headers, counter, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while counter[0] > 0:
+            counter[0] -= 1
+            path = paths[counter[0] % len(paths)]
+            request = f'GET {path} HTTP/1.1\r\nHost: {host}\r\n{headers}Connection: keep-alive\r\n\r\n'
+            start = time.perf_counter()
+            writer.write(request.encode())
+            await writer.drain()
+            status_line = await reader.readline()
+            length = 0
+            chunked = False
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                name, _, value = line.decode().partition(':')
+                if name.lower() == 'content-length':
+                    length = int(value)
+                elif name.lower() == 'transfer-encoding' and 'chunked' in value:
+                    chunked = True
+            if chunked:
+                while True:
+                    size = int((await reader.readline()).strip(), 16)
+                    await reader.readexactly(size + 2)
+                    if size == 0:
+                        break
+            else:
+                await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            if not status_line.split()[1].startswith(b'2'):
+                errors.append(status_line)
+    finally:
+        writer.close()
+
+
+async def load(base_url, paths, token, concurrency, requests):
+    url = urlsplit(base_url)
+    headers = f'Authorization: Bearer {token}\r\n'
+    counter, latencies, errors = [requests], [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        _worker(url.hostname, url.port, paths, headers, counter, latencies, errors)
+        for _ in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 2),
+        'p99_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--servers', nargs='+', default=['wsgi', 'asgi'], choices=SERVERS)
+    parser.add_argument('--concurrency', type=int, default=256)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--attachments', type=int, default=50)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    user, session, attachment_id = seed(args.attachments)
+    share_token = get_or_create_share_token(session)
+    token = str(AccessToken.for_user(user))
+    endpoints = {
+        'kt_session_by_url': [f'/api/kt-sessions/get_by_url/{share_token}/'],
+        'get_attachment': [f'/api/attachments/{attachment_id}/'],
+        'get_attachments': [f'/api/attachments/?session_id={session.id}&cursor=&fields=id,status,file_type'],
+    }
+
+    results = {}
+    try:
+        for name in args.servers:
+            command, env = SERVERS[name](args.port, args.workers)
+            server = subprocess.Popen(command, env={**os.environ, **env})
+            try:
+                wait_for_port(args.port)
+                base_url = f'http://127.0.0.1:{args.port}'
+                results[name] = {
+                    endpoint: asyncio.run(load(base_url, paths, token, args.concurrency, args.requests))
+                    for endpoint, paths in endpoints.items()
+                }
+            finally:
+                server.send_signal(signal.SIGTERM)
+                server.wait(timeout=30)
+    finally:
+        session.delete()
+
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
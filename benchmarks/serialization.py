@@ -0,0 +1,122 @@
+"""
+Per-row cost of serializing attachments for get_attachments.
+
+Compares the previous path (model instances with their texts preloaded, a dict
+built per attribute access, DRF's stdlib JSONRenderer) with the current one
+(values_list rows joined to the session, texts read from the content store in one
+go, the compiled attachment_serializer and orjson) for 1, 100 and 10,000
+attachments. Times both fetch + serialize + render and serialize + render alone.
+
+Usage (needs the Postgres configured in settings):
+    python -m benchmarks.serialization --sizes 1 100 10000 --repeat 20
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'KTFlow.settings')
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from ktsessions.attachment_fields import ATTACHMENT_FIELDS, attachment_queryset, serialize_attachments  # noqa: E402
+from ktsessions.content_store import preload_texts  # noqa: E402
+from ktsessions.models import Attachment, KTSession  # noqa: E402
+from ktsessions.renderers import render_json  # noqa: E402
+
+FIELDS = list(ATTACHMENT_FIELDS)
+
+
+def legacy_to_dict(attachment):
+    # The dict previously built in each attachment view
+    return {
+        'id': attachment.id,
+        'session': {
+            'id': attachment.session.id,
+            'title': attachment.session.title
+        },
+        'file_type': attachment.file_type,
+        'file_url': attachment.file_url,
+        'status': attachment.status,
+        'transcript': attachment.transcript,
+        'summary': attachment.summary,
+        'created_at': attachment.created_at.isoformat()
+    }
+
+
+def legacy_fetch(session, size):
+    attachments = Attachment.objects.filter(session=session).select_related('session').order_by('-created_at', '-id')
+    # The texts used to be columns of the row: load them with one store read, not one per attribute access
+    return preload_texts(attachments[:size])
+
+
+def legacy_render(attachments):
+    return JSONRenderer().render({'attachments': [legacy_to_dict(attachment) for attachment in attachments]})
+
+
+def fast_fetch(session, size):
+    return list(attachment_queryset(FIELDS).filter(session=session).order_by('-created_at', '-id')[:size])
+
+
+def fast_render(rows):
+    return render_json({'attachments': serialize_attachments(rows, FIELDS)})
+
+
+def per_row_us(fn, size, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return round(statistics.median(samples) / size * 1_000_000, 2)
+
+
+def seed(size):
+    user, _ = get_user_model().objects.get_or_create(
+        email='serialization-bench@example.com',
+        defaults={'username': 'serialization-bench@example.com', 'name': 'bench'}
+    )
+    session = KTSession.objects.create(title='serialization bench', description='bench', created_by=user)
+    Attachment.objects.bulk_create(
+        Attachment(session=session, file_type='video', file_url=f'https://example.com/bench-{i}.mp4',
+                   status='done', transcript='lorem ipsum dolor sit amet ' * 40, summary='a short summary')
+        for i in range(size)
+    )
+    return session
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', type=int, default=[1, 100, 10000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    session = seed(max(args.sizes))
+    results = {}
+    try:
+        for size in args.sizes:
+            instances, rows = legacy_fetch(session, size), fast_fetch(session, size)
+            assert json.loads(legacy_render(instances)) == json.loads(fast_render(rows))
+            results[size] = {
+                'legacy_fetch_and_render_us_per_row': per_row_us(
+                    lambda: legacy_render(legacy_fetch(session, size)), size, args.repeat),
+                'fast_fetch_and_render_us_per_row': per_row_us(
+                    lambda: fast_render(fast_fetch(session, size)), size, args.repeat),
+                'legacy_render_us_per_row': per_row_us(lambda: legacy_render(instances), size, args.repeat),
+                'fast_render_us_per_row': per_row_us(lambda: fast_render(rows), size, args.repeat),
+            }
+    finally:
+        session.delete()
+
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
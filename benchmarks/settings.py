@@ -0,0 +1,46 @@
+"""
+Settings profile for benchmarks.api: runs with no external services.
+
+SQLite by default (BENCH_DATABASE=postgres uses the Postgres configured in
+KTFlow.settings), Redis replaced by fakeredis behind django-redis, Celery eager
+with an in-memory broker. The harness creates and drops its own test database.
+"""
+import os
+
+import fakeredis
+
+from KTFlow.settings import *  # noqa: F401,F403
+from KTFlow.settings import DATABASES, LOGGING
+
+if os.environ.get('BENCH_DATABASE', 'sqlite') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': ':memory:',
+        }
+    }
+else:
+    DATABASES['default']['TEST'] = {'NAME': 'ktflow_bench'}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': 'redis://localhost:6379/1',
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'CONNECTION_POOL_KWARGS': {'connection_class': fakeredis.FakeConnection},
+        },
+    }
+}
+
+CELERY_TASK_ALWAYS_EAGER = True
+CELERY_TASK_EAGER_PROPAGATES = True
+CELERY_BROKER_URL = 'memory://'
+CELERY_RESULT_BACKEND = 'cache+memory://'
+CELERY_BEAT_SCHEDULE = {}
+
+KT_ASYNC_READS = False
+# Per-attachment progress lines would drown the report
+LOGGING['loggers']['ktsessions']['level'] = 'WARNING'
+KT_LOCAL_TRANSCRIBER_DELAY = 0
+DEBUG = False
@@ -0,0 +1,100 @@
+"""
+Benchmark share-token lookups with a large number of unrelated keys in Redis.
+
+Compares the old full-keyspace scan in get_sharing_url against the
+session->token index in ktsessions.sharing.
+
+Usage (needs the Redis/Postgres configured in settings):
+    python -m benchmarks.share_index --filler 1000000 --iterations 1000
+"""
+import argparse
+import os
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'KTFlow.settings')
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django_redis import get_redis_connection  # noqa: E402
+
+from ktsessions.models import KTSession  # noqa: E402
+from ktsessions.sharing import get_or_create_share_token, resolve_share_token  # noqa: E402
+
+FILLER_PREFIX = 'bench:filler:'
+
+
+def load_filler(redis, count, batch=10_000):
+    pipe = redis.pipeline(transaction=False)
+    for i in range(count):
+        pipe.set(cache.make_key(f'{FILLER_PREFIX}{i}'), i, ex=3600)
+        if i % batch == batch - 1:
+            pipe.execute()
+    pipe.execute()
+
+
+def drop_filler(redis):
+    batch = []
+    for key in redis.scan_iter(match=cache.make_key(f'{FILLER_PREFIX}*'), count=10_000):
+        batch.append(key)
+        if len(batch) >= 10_000:
+            redis.unlink(*batch)
+            batch = []
+    if batch:
+        redis.unlink(*batch)
+
+
+def legacy_lookup(session_id):
+    # The previous get_sharing_url implementation
+    for key in cache.iter_keys('*'):
+        if cache.get(key) == session_id:
+            return key
+    return None
+
+
+def timed(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        'mean_ms': sum(samples) / len(samples) * 1000,
+        'p99_ms': samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--filler', type=int, default=1_000_000, help='unrelated keys to load')
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--legacy-iterations', type=int, default=1,
+                        help='runs of the old scan (0 to skip, it is slow)')
+    args = parser.parse_args()
+
+    redis = get_redis_connection('default')
+    user = get_user_model().objects.create_user(
+        username='share-bench@example.com', email='share-bench@example.com', name='bench'
+    )
+    session = KTSession.objects.create(title='bench', description='bench', created_by=user)
+    try:
+        for filler in (0, args.filler):
+            drop_filler(redis)
+            load_filler(redis, filler)
+            token = get_or_create_share_token(session)
+            print(f'--- {filler} unrelated keys (dbsize={redis.dbsize()})')
+            print('get_or_create_share_token', timed(lambda: get_or_create_share_token(session), args.iterations))
+            print('resolve_share_token      ', timed(lambda: resolve_share_token(token), args.iterations))
+            if args.legacy_iterations:
+                print('legacy scan              ', timed(lambda: legacy_lookup(session.id), args.legacy_iterations))
+    finally:
+        drop_filler(redis)
+        session.delete()
+        user.delete()
+
+
+if __name__ == '__main__':
+    main()
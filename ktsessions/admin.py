@@ -1,3 +1,27 @@
 from django.contrib import admin
+from .models import AttachmentTiming, ProcessingResult
 
-# Register your models here.
+
+@admin.register(ProcessingResult)
+class ProcessingResultAdmin(admin.ModelAdmin):
+    list_display = ('content_hash', 'hit_count', 'created_at', 'last_hit_at')
+    search_fields = ('content_hash',)
+    ordering = ('-hit_count',)
+    readonly_fields = ('content_hash', 'hit_count', 'created_at', 'last_hit_at')
+
+
+@admin.register(AttachmentTiming)
+class AttachmentTimingAdmin(admin.ModelAdmin):
+    list_display = (
+        'attachment_id', 'file_type', 'outcome', 'cached', 'queue_wait_ms', 'processing_time',
+        'segments', 'retries', 'finished_at'
+    )
+    list_filter = ('file_type', 'outcome', 'cached')
+    ordering = ('-started_at',)
+    raw_id_fields = ('attachment',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
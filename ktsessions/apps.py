@@ -1,5 +1,19 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 class KtsessionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ktsessions'
+
+    def ready(self):
+        from . import signals, telemetry  # noqa: F401
+        post_migrate.connect(create_search_index, sender=self)
+
+
+def create_search_index(using, **kwargs):
+    """GIN index (PostgreSQL) or FTS5 table (SQLite) backing ktsessions.search"""
+    from django.db import connections
+    from .search import get_search_backend
+
+    with connections[using].cursor() as cursor:
+        get_search_backend().create_index(cursor)
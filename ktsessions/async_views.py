@@ -0,0 +1,210 @@
+"""
+Async views for the read-heavy endpoints, served when running under ASGI with
+KT_ASYNC_READS enabled (see README). They use the async ORM and redis.asyncio so a
+waiting request holds no thread; responses match the sync views in views.py.
+"""
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+
+from authentication.authentication import CachedJWTAuthentication
+
+from .attachment_fields import aserialize_attachments, attachment_queryset, requested_attachment_fields
+from .conditional import (
+    attachment_list_validators,
+    attachment_validators,
+    attachment_version,
+    not_modified,
+    representation,
+    session_validators,
+    session_version,
+    with_validators
+)
+from .events import stream_status_events
+from .models import KTSession
+from .pagination import apaginate_by_cursor, cursor_link
+from .renderers import render_json
+from .serializers import SessionPublicSerializer
+from .sharing import afetch_share_payload, astore_share_payload, resolve_share_token
+
+
+def _json(data, status=status.HTTP_200_OK):
+    return HttpResponse(render_json(data), status=status, content_type='application/json')
+
+
+async def _authenticate(request):
+    """
+    Run the JWT authenticator off the event loop.
+    Returns (user, None) or (None, error response).
+    """
+    try:
+        auth = await sync_to_async(CachedJWTAuthentication().authenticate)(request)
+    except AuthenticationFailed as e:
+        return None, _json({'detail': str(e.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+    if auth is None:
+        return None, _json({'detail': 'Authentication credentials were not provided.'},
+                           status=status.HTTP_401_UNAUTHORIZED)
+    return auth[0], None
+
+
+@require_GET
+async def session_events(request, pk):
+    """
+    GET: Server-Sent Events stream of attachment status changes for a KT session.
+    Needs an ASGI server. EventSource cannot send headers, so the access token may
+    also be passed as ?token=.
+    """
+    if not isinstance(request, ASGIRequest):
+        # WSGI would buffer the endless stream in a worker thread and never answer
+        return _json({'error': 'The event stream needs the app served over ASGI'},
+                     status=status.HTTP_501_NOT_IMPLEMENTED)
+    token = request.GET.get('token')
+    if token:
+        request.META['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    user, error = await _authenticate(request)
+    if error:
+        return error
+
+    if not await KTSession.objects.filter(pk=pk, created_by=user).aexists():
+        return _json({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+    response = StreamingHttpResponse(stream_status_events(pk), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # disable proxy buffering (nginx)
+    return response
+
+
+@require_GET
+async def kt_session_by_url(request, share_token):
+    """
+    GET: Retrieve a KT session by share token (public access)
+    """
+    try:
+        # Warm path: token index, rendered payload and its ETag come back in one Redis call
+        session_id, payload, version, etag = await afetch_share_payload(share_token)
+        if session_id is None:
+            session_id = await sync_to_async(resolve_share_token)(share_token)
+            if not session_id:
+                return _json({'error': 'Invalid or expired token'}, status=status.HTTP_404_NOT_FOUND)
+
+        if payload is None or etag is None:
+            payload = None
+            row = await session_version(id=session_id).afirst()
+            if row is None:
+                return _json({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+            etag, _ = session_validators(row, 'share')
+        response = not_modified(request, etag)
+        if response is None:
+            if payload is None:
+                session = await KTSession.objects.prefetch_related('attachments').filter(id=session_id).afirst()
+                if session is None:
+                    return _json({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+                # The attachment texts come from the content store
+                payload = await sync_to_async(lambda: render_json(SessionPublicSerializer(session).data))()
+                await astore_share_payload(session_id, payload, version, etag)
+            response = HttpResponse(payload, content_type='application/json')
+        return with_validators(response, etag)
+    except Exception as e:
+        return _json({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@require_GET
+async def get_attachment(request, attachment_id):
+    """Get a single attachment by ID"""
+    user, error = await _authenticate(request)
+    if error:
+        return error
+    try:
+        fields = requested_attachment_fields(request)
+        row = await attachment_version(attachment_id).afirst()
+        if row is None:
+            return _json({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        etag, last_modified = attachment_validators(row, representation(request), fields)
+        response = not_modified(request, etag, last_modified)
+        if response is None:
+            row = await attachment_queryset(fields).filter(id=attachment_id).afirst()
+            if row is None:
+                return _json({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+            response = _json((await aserialize_attachments([row], fields))[0])
+        return with_validators(response, etag, last_modified)
+
+    except ValueError as e:
+        return _json({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return _json({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@require_GET
+async def get_attachments(request):
+    """Get all attachments with optional filtering and pagination"""
+    user, error = await _authenticate(request)
+    if error:
+        return error
+    try:
+        session_id = request.GET.get('session_id')
+        file_type = request.GET.get('file_type')
+        requested_page = int(request.GET.get('page', 1))
+        page = max(requested_page, 1)
+        per_page = int(request.GET.get('per_page', 10))
+        # Cursor mode is selected by passing `cursor` (empty for the first page)
+        cursor = request.GET.get('cursor')
+        default_count = 'false' if cursor is not None else 'true'
+        include_count = request.GET.get('include_count', default_count).lower() == 'true'
+        if per_page < 1:
+            raise ValueError('per_page must be positive')
+        fields = requested_attachment_fields(request)
+
+        queryset = attachment_queryset(fields)
+        if session_id:
+            queryset = queryset.filter(session_id=session_id)
+        if file_type:
+            queryset = queryset.filter(file_type=file_type)
+        queryset = queryset.order_by('-created_at', '-id')
+
+        etag = last_modified = None
+        if session_id:
+            version = await session_version(id=session_id).afirst()
+            if version is not None:
+                etag, last_modified = attachment_list_validators(version, representation(request))
+                response = not_modified(request, etag, last_modified)
+                if response is not None:
+                    return with_validators(response, etag, last_modified)
+
+        if cursor is not None:
+            cursor_page = await apaginate_by_cursor(queryset, cursor, per_page)
+            rows = cursor_page.items
+            pagination = {
+                'per_page': per_page,
+                'next': cursor_link(request, cursor_page.next_cursor),
+                'previous': cursor_link(request, cursor_page.previous_cursor),
+                'has_next': cursor_page.next_cursor is not None,
+                'has_previous': cursor_page.previous_cursor is not None
+            }
+            if include_count:
+                pagination['total_count'] = await queryset.acount()
+        else:
+            pagination = {'page': requested_page, 'per_page': per_page}
+            if include_count:
+                # Same clamping as Paginator.get_page: out of range pages show the last one
+                total_count = await queryset.acount()
+                total_pages = max((total_count + per_page - 1) // per_page, 1)
+                page = min(page, total_pages)
+                pagination.update({'total_pages': total_pages, 'total_count': total_count})
+            offset = (page - 1) * per_page
+            rows = [row async for row in queryset[offset:offset + per_page + 1]]
+            pagination.update({'has_next': len(rows) > per_page, 'has_previous': page > 1})
+            rows = rows[:per_page]
+
+        return with_validators(_json({
+            'attachments': await aserialize_attachments(rows, fields),
+            'pagination': pagination
+        }), etag, last_modified)
+
+    except ValueError as e:
+        return _json({'error': f'Invalid page, per_page, cursor or fields parameter: {e}'},
+                     status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return _json({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -0,0 +1,129 @@
+from functools import lru_cache
+from operator import itemgetter
+
+from asgiref.sync import sync_to_async
+
+from .content_store import get_texts
+from .models import Attachment
+
+ATTACHMENT_FIELDS = (
+    'id', 'session', 'file_type', 'file_url', 'status', 'transcript', 'summary', 'created_at'
+)
+LARGE_ATTACHMENT_FIELDS = ('transcript', 'summary')
+
+
+def requested_attachment_fields(request):
+    """
+    Parse the `fields` / `exclude` query parameters into the attachment keys to return.
+    `id` is always included.
+    """
+    fields = request.GET.get('fields')
+    exclude = request.GET.get('exclude')
+    selected = [f.strip() for f in fields.split(',') if f.strip()] if fields else list(ATTACHMENT_FIELDS)
+    excluded = [f.strip() for f in exclude.split(',') if f.strip()] if exclude else []
+
+    unknown = set(selected + excluded) - set(ATTACHMENT_FIELDS)
+    if unknown:
+        raise ValueError(f'Unknown attachment fields: {sorted(unknown)}. Must be among: {list(ATTACHMENT_FIELDS)}')
+
+    return ['id'] + [f for f in ATTACHMENT_FIELDS if f != 'id' and f in selected and f not in excluded]
+
+
+def attachment_columns(fields):
+    """
+    values_list() columns backing `fields`; the session comes from the join and
+    the large texts from the content store, through their ref columns.
+    created_at is always read since cursor pagination keys on it.
+    """
+    columns = []
+    for field in fields:
+        if field == 'session':
+            columns += ['session_id', 'session__title']
+        elif field in LARGE_ATTACHMENT_FIELDS:
+            columns.append(f'{field}_ref')
+        else:
+            columns.append(field)
+    if 'created_at' not in columns:
+        columns.append('created_at')
+    return columns
+
+
+def attachment_queryset(fields):
+    """
+    Attachment rows (named tuples, no model instances) holding only the columns
+    backing `fields`; serialize them with serialize_attachments(rows, fields).
+    Attachments of sessions hidden for deletion are left out.
+    """
+    return Attachment.objects.filter(session__deleted_at__isnull=True).values_list(
+        *attachment_columns(fields), named=True
+    )
+
+
+@lru_cache(maxsize=128)
+def _compile_serializer(fields):
+    index = {column: i for i, column in enumerate(attachment_columns(fields))}
+    getters = []
+    for field in fields:
+        if field == 'session':
+            session_id, title = index['session_id'], index['session__title']
+            getters.append((field, lambda row, texts, i=session_id, j=title: {'id': row[i], 'title': row[j]}))
+        elif field == 'created_at':
+            created_at = index['created_at']
+            getters.append((field, lambda row, texts, i=created_at: row[i].isoformat()))
+        elif field in LARGE_ATTACHMENT_FIELDS:
+            ref = index[f'{field}_ref']
+            getters.append((field, lambda row, texts, i=ref: texts.get(row[i])))
+        else:
+            getters.append((field, lambda row, texts, get=itemgetter(index[field]): get(row)))
+    return lambda row, texts: {field: get(row, texts) for field, get in getters}
+
+
+def attachment_serializer(fields):
+    """
+    (row, texts) -> dict function for rows of attachment_queryset(fields), built once
+    per distinct field list so serializing a page is one dict per row and no lookups.
+    `texts` maps the refs of the row to their text, see attachment_texts.
+    """
+    return _compile_serializer(tuple(fields))
+
+
+def attachment_texts(rows, fields):
+    """{ref: text} for the large texts of rows, fetched from the content store at once"""
+    text_fields = [field for field in fields if field in LARGE_ATTACHMENT_FIELDS]
+    if not text_fields:
+        return {}
+    columns = [f'{field}_ref' for field in text_fields]
+    return get_texts(getattr(row, column) for row in rows for column in columns)
+
+
+def serialize_attachments(rows, fields):
+    """Serialized rows of attachment_queryset(fields)"""
+    serialize = attachment_serializer(fields)
+    texts = attachment_texts(rows, fields)
+    return [serialize(row, texts) for row in rows]
+
+
+async def aserialize_attachments(rows, fields):
+    """serialize_attachments for async views, the content store is read off the event loop"""
+    serialize = attachment_serializer(fields)
+    texts = {}
+    if any(field in LARGE_ATTACHMENT_FIELDS for field in fields):
+        texts = await sync_to_async(attachment_texts)(rows, fields)
+    return [serialize(row, texts) for row in rows]
+
+
+def attachment_row(attachment, fields):
+    """The attachment_queryset(fields) row of a model instance already in memory"""
+    values = {'session__title': attachment.session.title} if 'session' in fields else {}
+    return tuple(values[column] if column in values else getattr(attachment, column)
+                 for column in attachment_columns(fields))
+
+
+def attachment_to_dict(attachment, fields):
+    """Serialize a model instance the same way as a row, e.g. right after a write"""
+    # Texts just written are still on the instance, others are read from the store
+    texts = {
+        getattr(attachment, f'{field}_ref'): getattr(attachment, field)
+        for field in fields if field in LARGE_ATTACHMENT_FIELDS
+    }
+    return attachment_serializer(fields)(attachment_row(attachment, fields), texts)
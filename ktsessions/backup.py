@@ -0,0 +1,273 @@
+"""
+NDJSON export and import of KT sessions with their attachments, for backups and for
+moving users between deployments.
+
+An export is one JSON object per line: an `export` header, every `session`, then
+every `attachment` (referring to its session by the exported id):
+    {"type": "export", "version": 1, "exported_at": "..."}
+    {"type": "session", "id": 7, "owner": "a@example.com", "title": "...", "description": "...", "created_at": "..."}
+    {"type": "attachment", "session": 7, "file_type": "audio", "file_url": "...", "status": "done",
+     "transcript": "...", "summary": "...", "content_hash": "...", "created_at": "..."}
+
+Exports read rows with .iterator(chunk_size=KT_EXPORT_CHUNK_SIZE), a server-side
+cursor on PostgreSQL, and fetch texts from the content store one chunk at a time,
+so memory does not grow with the number of sessions or attachments. Imports read
+line by line and write KT_IMPORT_BATCH_SIZE rows per bulk_create; only the map from
+exported to new session ids is kept for the whole file.
+"""
+import json
+from collections import Counter
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .content_store import get_texts, set_texts
+from .counters import attachments_added
+from .models import Attachment, KTSession
+from .outbox import enqueue_processing
+from .renderers import render_json
+from .search import index_attachments
+from .serializers import KTSessionCreateSerializer
+from .session_list_cache import bump_generation_on_commit
+
+EXPORT_VERSION = 1
+
+
+def _line(record):
+    return render_json(record) + b'\n'
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def export_lines(users=None, chunk_size=None):
+    """
+    NDJSON lines (bytes) of the sessions of `users`, every user's for None, and of
+    their attachments. Hidden (deleted) sessions are left out.
+    """
+    chunk_size = chunk_size or settings.KT_EXPORT_CHUNK_SIZE
+    sessions = KTSession.objects.order_by('id')
+    attachments = Attachment.objects.filter(session__deleted_at__isnull=True).order_by('id')
+    if users is not None:
+        sessions = sessions.filter(created_by__in=users)
+        attachments = attachments.filter(session__created_by__in=users)
+
+    yield _line({'type': 'export', 'version': EXPORT_VERSION, 'exported_at': timezone.now()})
+    for row in sessions.values(
+        'id', 'created_by__email', 'title', 'description', 'created_at'
+    ).iterator(chunk_size=chunk_size):
+        yield _line({
+            'type': 'session',
+            'id': row['id'],
+            'owner': row['created_by__email'],
+            'title': row['title'],
+            'description': row['description'],
+            'created_at': row['created_at'],
+        })
+
+    rows = attachments.values(
+        'session_id', 'file_type', 'file_url', 'status', 'transcript_ref', 'summary_ref', 'content_hash', 'created_at'
+    ).iterator(chunk_size=chunk_size)
+    for chunk in _chunks(rows, chunk_size):
+        texts = get_texts(ref for row in chunk for ref in (row['transcript_ref'], row['summary_ref']))
+        for row in chunk:
+            yield _line({
+                'type': 'attachment',
+                'session': row['session_id'],
+                'file_type': row['file_type'],
+                'file_url': row['file_url'],
+                'status': row['status'],
+                'transcript': texts.get(row['transcript_ref']),
+                'summary': texts.get(row['summary_ref']),
+                'content_hash': row['content_hash'],
+                'created_at': row['created_at'],
+            })
+
+
+def _created_at(record):
+    value = record.get('created_at')
+    if value is None:
+        return None
+    created_at = parse_datetime(value) if isinstance(value, str) else None
+    if created_at is None:
+        raise ValueError(f'invalid created_at {value!r}')
+    return created_at
+
+
+def _keep_created_at(model, instances, created_ats):
+    # auto_now_add overwrites created_at on insert, put the exported one back
+    restored = []
+    for instance, created_at in zip(instances, created_ats):
+        if created_at is not None:
+            instance.created_at = created_at
+            restored.append(instance)
+    if restored:
+        model.objects.bulk_update(restored, ['created_at'])
+
+
+class SessionImporter:
+    """
+    Feed it the lines of an export, then call finish(). Sessions go to `owner`,
+    or with owner None to the existing user with the exported owner's email.
+    Attachments exported as done with a transcript keep their result and are not
+    processed again; the others are created pending and queued.
+    """
+
+    def __init__(self, owner=None, batch_size=None):
+        self.owner = owner
+        self.batch_size = batch_size or settings.KT_IMPORT_BATCH_SIZE
+        self.session_ids = {}
+        self.owner_ids = {}
+        self.sessions = []
+        self.attachments = []
+        self.counts = Counter()
+        self.errors = []
+
+    def feed(self, number, line):
+        if not line.strip():
+            return
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            self.errors.append({'line': number, 'error': f'invalid JSON: {e}'})
+            return
+        kind = record.get('type') if isinstance(record, dict) else None
+        if kind == 'export':
+            if record.get('version') != EXPORT_VERSION:
+                raise ValueError(f'unsupported export version {record.get("version")!r}')
+        elif kind == 'session':
+            self.sessions.append((number, record))
+            if len(self.sessions) >= self.batch_size:
+                self._flush_sessions()
+        elif kind == 'attachment':
+            # The attachment's session may still be buffered
+            if self.sessions:
+                self._flush_sessions()
+            self.attachments.append((number, record))
+            if len(self.attachments) >= self.batch_size:
+                self._flush_attachments()
+        else:
+            self.errors.append({'line': number, 'error': 'expected an object with type export, session or attachment'})
+
+    def finish(self):
+        """Write what is still buffered; returns the counts and the errors per line"""
+        self._flush_sessions()
+        self._flush_attachments()
+        return {
+            'sessions': self.counts['sessions'],
+            'attachments': self.counts['attachments'],
+            'queued': self.counts['queued'],
+            'errors': self.errors,
+        }
+
+    def _owner_id(self, email):
+        if self.owner is not None:
+            return self.owner.id
+        return self.owner_ids.get(email) if isinstance(email, str) else None
+
+    def _flush_sessions(self):
+        batch, self.sessions = self.sessions, []
+        if not batch:
+            return
+        if self.owner is None:
+            emails = {
+                record['owner'] for _, record in batch if isinstance(record.get('owner'), str)
+            } - self.owner_ids.keys()
+            self.owner_ids.update(dict.fromkeys(emails))
+            self.owner_ids.update(
+                get_user_model().objects.filter(email__in=emails).values_list('email', 'id')
+            )
+
+        exported_ids, sessions, created_ats = [], [], []
+        for number, record in batch:
+            owner_id = self._owner_id(record.get('owner'))
+            if owner_id is None:
+                self.errors.append({'line': number, 'error': f'unknown owner {record.get("owner")!r}'})
+                continue
+            if not isinstance(record.get('id'), int):
+                self.errors.append({'line': number, 'error': 'id is required'})
+                continue
+            serializer = KTSessionCreateSerializer(data=record)
+            if not serializer.is_valid():
+                self.errors.append({'line': number, 'error': serializer.errors})
+                continue
+            try:
+                created_ats.append(_created_at(record))
+            except ValueError as e:
+                self.errors.append({'line': number, 'error': str(e)})
+                continue
+            exported_ids.append(record['id'])
+            sessions.append(KTSession(created_by_id=owner_id, **serializer.validated_data))
+
+        with transaction.atomic():
+            sessions = KTSession.objects.bulk_create(sessions)
+            _keep_created_at(KTSession, sessions, created_ats)
+            # bulk_create skips post_save, the owners' cached list pages go here
+            for owner_id in {session.created_by_id for session in sessions}:
+                bump_generation_on_commit(owner_id)
+        self.session_ids.update(zip(exported_ids, (session.id for session in sessions)))
+        self.counts['sessions'] += len(sessions)
+
+    def _flush_attachments(self):
+        batch, self.attachments = self.attachments, []
+        if not batch:
+            return
+        valid_file_types = [choice[0] for choice in Attachment.FILE_TYPE_CHOICES]
+        file_url_field = Attachment._meta.get_field('file_url')
+
+        attachments, texts, created_ats = [], [], []
+        for number, record in batch:
+            session_id = self.session_ids.get(record.get('session'))
+            if session_id is None:
+                self.errors.append({'line': number, 'error': f'session {record.get("session")!r} is not in this import'})
+                continue
+            if record.get('file_type') not in valid_file_types:
+                self.errors.append({'line': number, 'error': f'Invalid file_type. Must be one of: {valid_file_types}'})
+                continue
+            try:
+                file_url_field.clean(record.get('file_url'), None)
+                created_ats.append(_created_at(record))
+            except ValidationError as e:
+                self.errors.append({'line': number, 'error': f'Invalid file_url: {" ".join(e.messages)}'})
+                continue
+            except ValueError as e:
+                self.errors.append({'line': number, 'error': str(e)})
+                continue
+
+            processed = record.get('status') == 'done' and bool(record.get('transcript'))
+            attachments.append(Attachment(
+                session_id=session_id,
+                file_type=record['file_type'],
+                file_url=record['file_url'],
+                status='done' if processed else 'pending',
+                content_hash=record.get('content_hash') if processed else None,
+            ))
+            texts.append({'transcript': record.get('transcript'), 'summary': record.get('summary')})
+
+        # One content store lookup and write for the batch's texts
+        set_texts(attachments, texts)
+        with transaction.atomic():
+            attachments = Attachment.objects.bulk_create(attachments)
+            _keep_created_at(Attachment, attachments, created_ats)
+            attachments_added(attachments)
+            pending = [attachment.id for attachment in attachments if attachment.status == 'pending']
+            enqueue_processing(pending)
+            index_attachments(attachment for attachment in attachments if attachment.status == 'done')
+        self.counts['attachments'] += len(attachments)
+        self.counts['queued'] += len(pending)
+
+
+def import_lines(lines, owner=None, batch_size=None):
+    """Import an export given as an iterable of lines (str or bytes); see SessionImporter"""
+    importer = SessionImporter(owner, batch_size)
+    for number, line in enumerate(lines, start=1):
+        importer.feed(number, line)
+    return importer.finish()
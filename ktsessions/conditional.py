@@ -0,0 +1,82 @@
+"""
+ETag / Last-Modified validators for conditional GETs.
+
+Validators are built from KTSession.revision and the updated_at columns, which every
+write path keeps current (see ktsessions.counters and ktsessions.signals). A view
+reads them with one small version query and answers If-None-Match /
+If-Modified-Since with a 304 before loading or serializing the body.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .models import Attachment, KTSession
+
+
+def make_etag(*parts):
+    """Strong ETag over the version parts and the representation (see representation())"""
+    return quote_etag(hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest())
+
+
+def representation(request):
+    """
+    Path, query and media type of the response: DRF views render what the Accept
+    header negotiated (JSON or the browsable API), the async views always JSON
+    """
+    media_type = getattr(request, 'accepted_media_type', None) or 'application/json'
+    return f'{request.get_full_path()} {media_type}'
+
+
+def not_modified(request, etag, last_modified=None):
+    """The 304 response when the client's copy is current, otherwise None"""
+    return get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified.timestamp()) if last_modified else None
+    )
+
+
+def with_validators(response, etag, last_modified=None):
+    # The body, and so the ETag, depends on the negotiated media type
+    patch_vary_headers(response, ['Accept'])
+    if etag:
+        response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
+
+
+def session_version(**filters):
+    """Queryset of the (id, revision, updated_at) row of a session"""
+    return KTSession.objects.filter(**filters).values_list('id', 'revision', 'updated_at')
+
+
+def session_validators(row, representation):
+    session_id, revision, updated_at = row
+    return make_etag('session', session_id, revision, representation), updated_at
+
+
+def attachment_version(attachment_id):
+    """Queryset of the version row of an attachment and its session, empty if the session is hidden"""
+    return Attachment.objects.filter(id=attachment_id, session__deleted_at__isnull=True).values_list(
+        'id', 'updated_at', 'session__revision', 'session__updated_at'
+    )
+
+
+def attachment_validators(row, representation, fields):
+    attachment_id, updated_at, session_revision, session_updated_at = row
+    if 'session' not in fields:
+        return make_etag('attachment', attachment_id, updated_at.isoformat(), representation), updated_at
+    # The session title is part of the body, so its changes count too
+    return (
+        make_etag('attachment', attachment_id, updated_at.isoformat(), session_revision, representation),
+        max(updated_at, session_updated_at),
+    )
+
+
+def attachment_list_validators(row, representation):
+    """
+    Validators of a session's attachment list. Every attachment write, including
+    deletions, bumps the session revision, so the session row versions the list.
+    """
+    session_id, revision, updated_at = row
+    return make_etag('attachments', session_id, revision, representation), updated_at
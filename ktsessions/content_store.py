@@ -0,0 +1,345 @@
+"""
+Content-addressed store for attachment transcripts and summaries, kept out of the
+attachment row.
+
+A text is UTF-8 encoded, cut into KT_CONTENT_FRAME_SIZE byte frames and every frame
+is compressed on its own (zstd when the zstandard package is installed, gzip
+otherwise). It is stored under the SHA-256 of the encoded text, so identical texts
+are stored once, and the attachment row keeps only that digest and the byte length.
+Independent frames let a byte range be served by decompressing just the frames it
+overlaps.
+
+Backends, selected by KT_CONTENT_STORE:
+- DatabaseContentStore: one ContentFrame row per frame in a side table
+- FileSystemContentStore: one file per text under KT_CONTENT_STORE_ROOT, read
+  through mmap so only the pages of the requested frames are touched
+
+Content is never updated in place and attachments only drop their reference, so
+`python manage.py collect_content` deletes what is no longer referenced.
+"""
+import gzip
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+try:
+    import zstandard
+except ImportError:  # optional dependency, texts are gzipped without it
+    zstandard = None
+
+TEXT_FIELDS = ('transcript', 'summary')
+CODECS = ('zstd', 'gzip')
+
+
+@lru_cache(maxsize=None)
+def get_content_store():
+    """The store configured by KT_CONTENT_STORE"""
+    return import_string(settings.KT_CONTENT_STORE)()
+
+
+def _codec():
+    codec = settings.KT_CONTENT_CODEC
+    if codec == 'zstd' and zstandard is None:
+        return 'gzip'
+    return codec
+
+
+def compress(codec, data):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor().compress(data)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def decompress(codec, data):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('zstd compressed content needs the zstandard package')
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def _frames(data, frame_size, codec):
+    """(offset, size, compressed) for every frame of data"""
+    frames = []
+    for offset in range(0, len(data), frame_size):
+        frame = data[offset:offset + frame_size]
+        frames.append((offset, len(frame), compress(codec, frame)))
+    return frames
+
+
+def _slice(frames, start, end):
+    """Decompress (offset, codec, compressed) frames and cut them to [start, end)"""
+    for offset, codec, compressed in frames:
+        data = decompress(codec, compressed)
+        yield data[max(start - offset, 0):end - offset]
+
+
+class DatabaseContentStore:
+    def exists(self, digest):
+        from .models import ContentFrame
+
+        return ContentFrame.objects.filter(digest=digest).exists()
+
+    def existing(self, digests):
+        """The given digests that are stored"""
+        from .models import ContentFrame
+
+        return set(ContentFrame.objects.filter(digest__in=digests).values_list('digest', flat=True).distinct())
+
+    def write(self, digest, codec, frames):
+        self.write_many([(digest, codec, frames)])
+
+    def write_many(self, texts):
+        """Write (digest, codec, frames) texts with one INSERT"""
+        from .models import ContentFrame
+
+        # A concurrent writer of the same text writes the same rows
+        ContentFrame.objects.bulk_create([
+            ContentFrame(digest=digest, offset=offset, size=size, codec=codec, data=compressed)
+            for digest, codec, frames in texts for offset, size, compressed in frames
+        ], ignore_conflicts=True)
+
+    def read_range(self, digest, start, end):
+        from django.db.models import F
+
+        from .models import ContentFrame
+
+        frames = (
+            ContentFrame.objects.filter(digest=digest, offset__lt=end)
+            .alias(frame_end=F('offset') + F('size')).filter(frame_end__gt=start)
+            .order_by('offset').values_list('offset', 'codec', 'data')
+        )
+        return _slice(((offset, codec, bytes(data)) for offset, codec, data in frames.iterator()), start, end)
+
+    def read_many(self, digests):
+        from .models import ContentFrame
+
+        parts = {}
+        for digest, codec, data in (
+            ContentFrame.objects.filter(digest__in=digests).order_by('digest', 'offset')
+            .values_list('digest', 'codec', 'data')
+        ):
+            parts.setdefault(digest, []).append(decompress(codec, bytes(data)))
+        return {digest: b''.join(chunks) for digest, chunks in parts.items()}
+
+    def collect(self, referenced, min_age):
+        """
+        Delete texts older than min_age seconds that are in none of the `referenced`
+        digest querysets; returns the number of frames deleted.
+        """
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from .models import ContentFrame
+
+        frames = ContentFrame.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=min_age))
+        for digests in referenced:
+            frames = frames.exclude(digest__in=digests)
+        deleted, _ = frames.delete()
+        return deleted
+
+
+class FileSystemContentStore:
+    """
+    File layout: header (magic, codec, frame size, frame count, text length), then
+    frame count + 1 offsets of the compressed frames, then the frames.
+    """
+    MAGIC = b'KTC1'
+    HEADER = struct.Struct('<4sBIIQ')
+    OFFSET = struct.Struct('<Q')
+
+    def __init__(self, root=None):
+        self.root = root or settings.KT_CONTENT_STORE_ROOT
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def existing(self, digests):
+        return {digest for digest in digests if self.exists(digest)}
+
+    def write_many(self, texts):
+        for digest, codec, frames in texts:
+            self.write(digest, codec, frames)
+
+    def write(self, digest, codec, frames):
+        path = self.path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        frame_size = frames[0][1] if frames else 0
+        offsets, position = [], 0
+        for _, _, compressed in frames:
+            offsets.append(position)
+            position += len(compressed)
+        offsets.append(position)
+        # Written aside and renamed, readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self.HEADER.pack(
+                    self.MAGIC, CODECS.index(codec), frame_size, len(frames), sum(size for _, size, _ in frames)
+                ))
+                f.write(b''.join(self.OFFSET.pack(offset) for offset in offsets))
+                f.writelines(compressed for _, _, compressed in frames)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def read_range(self, digest, start, end):
+        try:
+            f = open(self.path(digest), 'rb')
+        except FileNotFoundError:
+            return
+        with f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            magic, codec, frame_size, count, _ = self.HEADER.unpack_from(mapped)
+            if magic != self.MAGIC:
+                raise ValueError(f'{self.path(digest)} is not a content file')
+            codec = CODECS[codec]
+            data_start = self.HEADER.size + self.OFFSET.size * (count + 1)
+
+            def frames():
+                for index in range(start // frame_size if frame_size else 0, count):
+                    offset = index * frame_size
+                    if offset >= end:
+                        return
+                    begin, stop = (
+                        self.OFFSET.unpack_from(mapped, self.HEADER.size + self.OFFSET.size * i)[0]
+                        for i in (index, index + 1)
+                    )
+                    yield offset, codec, mapped[data_start + begin:data_start + stop]
+
+            yield from _slice(frames(), start, end)
+
+    def read_many(self, digests):
+        texts = {}
+        for digest in digests:
+            if self.exists(digest):
+                texts[digest] = b''.join(self.read_range(digest, 0, 2 ** 63))
+        return texts
+
+    def collect(self, referenced, min_age):
+        """Same as DatabaseContentStore.collect, returns the number of files deleted"""
+        referenced = {digest for digests in referenced for digest in digests}
+        cutoff = time.time() - min_age
+        deleted = 0
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                if name not in referenced and os.path.getmtime(path) < cutoff:
+                    os.unlink(path)
+                    deleted += 1
+        return deleted
+
+
+def put_texts(texts):
+    """
+    Store texts with one existence check and one write for all of them;
+    returns {text: (digest, byte length)}, where None is left out
+    """
+    encoded = {}
+    for text in texts:
+        if text is not None and text not in encoded:
+            data = text.encode()
+            encoded[text] = (hashlib.sha256(data).hexdigest(), data)
+    # The empty text has no frames and nothing to write
+    new = {digest: data for digest, data in encoded.values() if data}
+    if new:
+        store = get_content_store()
+        codec = _codec()
+        store.write_many([
+            (digest, codec, _frames(new[digest], settings.KT_CONTENT_FRAME_SIZE, codec))
+            for digest in new.keys() - store.existing(new)
+        ])
+    return {text: (digest, len(data)) for text, (digest, data) in encoded.items()}
+
+
+def put_text(text):
+    """Store a text; returns (digest, byte length), (None, 0) for None"""
+    return put_texts([text]).get(text, (None, 0))
+
+
+def get_texts(digests):
+    """{digest: text} for the given digests, missing content is left out"""
+    digests = {digest for digest in digests if digest}
+    if not digests:
+        return {}
+    texts = {digest: data.decode() for digest, data in get_content_store().read_many(digests).items()}
+    empty = hashlib.sha256(b'').hexdigest()
+    if empty in digests:
+        texts[empty] = ''
+    return texts
+
+
+def get_text(digest):
+    return get_texts([digest]).get(digest) if digest else None
+
+
+def read_range(digest, start, end):
+    """Bytes [start, end) of a stored text, as decompressed chunks of at most a frame"""
+    return get_content_store().read_range(digest, start, end)
+
+
+def text_columns(**texts):
+    """Row columns for the given texts, e.g. for update(**text_columns(transcript=...))"""
+    stored = put_texts(texts.values())
+    columns = {}
+    for name, text in texts.items():
+        columns[f'{name}_ref'], columns[f'{name}_length'] = stored.get(text, (None, 0))
+    return columns
+
+
+def stored_text(name):
+    """
+    Attachment property for a text kept in the store. Reading loads it once per
+    instance, assigning stores it at once and points the row at it.
+    """
+    cache_name = f'_{name}_text'
+
+    def get(instance):
+        if cache_name not in instance.__dict__:
+            instance.__dict__[cache_name] = get_text(getattr(instance, f'{name}_ref'))
+        return instance.__dict__[cache_name]
+
+    def set(instance, text):
+        for column, value in text_columns(**{name: text}).items():
+            setattr(instance, column, value)
+        instance.__dict__[cache_name] = text
+
+    return property(get, set)
+
+
+def set_texts(instances, texts):
+    """
+    Give each instance its {name: text} like assigning the stored_text properties
+    does, but store all the texts with put_texts, e.g. before a bulk_create
+    """
+    stored = put_texts(text for by_name in texts for text in by_name.values())
+    for instance, by_name in zip(instances, texts):
+        for name, text in by_name.items():
+            ref, length = stored.get(text, (None, 0))
+            setattr(instance, f'{name}_ref', ref)
+            setattr(instance, f'{name}_length', length)
+            instance.__dict__[f'_{name}_text'] = text
+
+
+def preload_texts(instances, names=TEXT_FIELDS):
+    """Load the texts of many attachments with one store read instead of one each"""
+    instances = list(instances)
+    pending = [
+        (instance, name) for instance in instances for name in names
+        if f'_{name}_text' not in instance.__dict__
+    ]
+    texts = get_texts(getattr(instance, f'{name}_ref') for instance, name in pending)
+    for instance, name in pending:
+        instance.__dict__[f'_{name}_text'] = texts.get(getattr(instance, f'{name}_ref'))
+    return instances
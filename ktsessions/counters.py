@@ -0,0 +1,83 @@
+"""
+Denormalized per-session attachment counters and revision on KTSession.
+Every change is a single UPDATE with F() expressions so concurrent writers never
+lose increments; call these in the same transaction as the attachment change.
+Single creations and deletions are counted by the post_save/post_delete signals,
+bulk writes and update() calls by their callers.
+The same UPDATE bumps the session revision that the ETags are built from.
+`python manage.py repair_attachment_counts` recomputes the counters from scratch.
+"""
+from collections import Counter
+
+from django.db.models import F
+from django.db.models.functions import Greatest, Now
+
+from .models import KTSession
+from .session_list_cache import bump_session_owner_on_commit
+
+STATUS_COUNT_FIELDS = {
+    'pending': 'pending_count',
+    'processing': 'processing_count',
+    'done': 'done_count',
+    'failed': 'failed_count',
+}
+COUNT_FIELDS = ('attachment_count',) + tuple(STATUS_COUNT_FIELDS.values())
+
+
+def adjust_counts(session_id, total=0, statuses=None):
+    """
+    Apply deltas to a session's counters.
+    `statuses` maps an attachment status to its delta, e.g. {'pending': 1}.
+    """
+    deltas = {}
+    if total:
+        deltas['attachment_count'] = total
+    for attachment_status, delta in (statuses or {}).items():
+        if delta:
+            field = STATUS_COUNT_FIELDS[attachment_status]
+            deltas[field] = deltas.get(field, 0) + delta
+    if deltas:
+        # Never below zero: drift (e.g. rows changed by raw SQL) must not fail the
+        # write being counted; repair_attachment_counts corrects it
+        touch_session(session_id, **{
+            field: F(field) + delta if delta > 0 else Greatest(F(field) + delta, 0)
+            for field, delta in deltas.items()
+        })
+
+
+def touch_session(session_id, **updates):
+    """Bump the revision of a session whose attachments changed"""
+    KTSession.objects.filter(id=session_id).update(revision=F('revision') + 1, updated_at=Now(), **updates)
+    # The counters and revision are part of the cached session list pages
+    bump_session_owner_on_commit(session_id)
+
+
+def attachment_added(session_id, attachment_status, count=1):
+    adjust_counts(session_id, total=count, statuses={attachment_status: count})
+
+
+def attachment_removed(session_id, attachment_status, count=1):
+    adjust_counts(session_id, total=-count, statuses={attachment_status: -count})
+
+
+def status_changed(session_id, old_status, new_status):
+    if old_status != new_status:
+        adjust_counts(session_id, statuses={old_status: -1, new_status: 1})
+
+
+def attachments_added(attachments):
+    """Counters for a batch of new attachments, one UPDATE per session"""
+    _adjust_per_session(((attachment.session_id, attachment.status) for attachment in attachments), 1)
+
+
+def attachments_removed(rows):
+    """Counters for a batch of deleted attachments given as (session_id, status) pairs"""
+    _adjust_per_session(rows, -1)
+
+
+def _adjust_per_session(rows, sign):
+    sessions = {}
+    for (session_id, attachment_status), count in Counter(rows).items():
+        sessions.setdefault(session_id, {})[attachment_status] = sign * count
+    for session_id, statuses in sessions.items():
+        adjust_counts(session_id, total=sum(statuses.values()), statuses=statuses)
@@ -0,0 +1,99 @@
+"""
+Deleting attachments without loading them.
+
+Model.delete() and QuerySet.delete() run Django's cascade collector, which fetches
+every attachment to send its signals and then deletes them all in one transaction.
+For a session with many attachments that is a memory spike in the web worker and
+row locks held for the whole delete.
+
+Here attachments are deleted by primary key in batches of KT_DELETE_BATCH_SIZE with
+raw DELETE statements, one short transaction per batch. The post_delete work is done
+per batch instead: timing rows and search documents are removed with the
+attachments, then the counters and share payloads of their sessions are updated.
+
+Deleting a session only hides it (KTSession.deleted_at, left out by the default
+manager) and queues the delete_session task, which removes its attachments batch
+by batch and finally the session row.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .counters import attachments_removed
+from .models import Attachment, AttachmentTiming, KTSession
+from .outbox import enqueue_session_deletion
+from .search import remove_attachments
+from .sharing import invalidate_share_payload
+
+
+def _delete_rows(model, column, ids):
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(model._meta.db_table)} WHERE {quote(column)} IN ({placeholders})',
+            list(ids)
+        )
+
+
+def _delete_batch(attachment_ids, count):
+    with transaction.atomic():
+        # Row locks keep the statuses stable until the counters have moved
+        rows = list(
+            Attachment.objects.select_for_update().filter(id__in=attachment_ids)
+            .order_by('id').values_list('id', 'session_id', 'status')
+        )
+        if not rows:
+            return []
+        ids = [attachment_id for attachment_id, _, _ in rows]
+        # Timing rows reference the attachments, so they go first
+        _delete_rows(AttachmentTiming, 'attachment_id', ids)
+        _delete_rows(Attachment, 'id', ids)
+        remove_attachments(ids)
+        if count:
+            attachments_removed((session_id, attachment_status) for _, session_id, attachment_status in rows)
+            for session_id in {session_id for _, session_id, _ in rows}:
+                transaction.on_commit(lambda session_id=session_id: invalidate_share_payload(session_id))
+    return ids
+
+
+def delete_attachments(attachment_ids, count=True):
+    """
+    Delete attachments by id, KT_DELETE_BATCH_SIZE per transaction.
+    Returns the ids that were deleted; unknown ids are ignored.
+    count=False leaves the session counters alone, for sessions being deleted themselves.
+    """
+    attachment_ids = list(attachment_ids)
+    batch_size = settings.KT_DELETE_BATCH_SIZE
+    deleted = []
+    for start in range(0, len(attachment_ids), batch_size):
+        deleted += _delete_batch(attachment_ids[start:start + batch_size], count)
+    return deleted
+
+
+def hide_session(session):
+    """Hide a session at once and queue the removal of its rows"""
+    with transaction.atomic():
+        session.deleted_at = timezone.now()
+        # post_save drops the cached share payload and session list pages
+        session.save(update_fields=['deleted_at'])
+        enqueue_session_deletion(session.id)
+
+
+def purge_session(session_id):
+    """
+    Delete the attachments of a hidden session batch by batch, then the session.
+    Returns the number of attachments deleted.
+    """
+    deleted = 0
+    while True:
+        ids = list(
+            Attachment.objects.filter(session_id=session_id)
+            .order_by('id').values_list('id', flat=True)[:settings.KT_DELETE_BATCH_SIZE]
+        )
+        if not ids:
+            break
+        deleted += len(_delete_batch(ids, count=False))
+    # Nothing is left for the cascade to load
+    KTSession.all_objects.filter(id=session_id, deleted_at__isnull=False).delete()
+    return deleted
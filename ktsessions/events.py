@@ -0,0 +1,122 @@
+import asyncio
+import json
+import logging
+import weakref
+
+from django_redis import get_redis_connection
+
+from .redis_async import get_async_redis
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = 15
+
+
+def _channel(session_id):
+    return f'kt:session:{session_id}:attachments'
+
+
+def publish_status(session_id, attachment_id, status):
+    """Announce an attachment status transition to the session's event stream"""
+    message = json.dumps({'attachment_id': attachment_id, 'status': status})
+    try:
+        get_redis_connection('default').publish(_channel(session_id), message)
+    except Exception:
+        # Subscribers are best effort, never fail processing because of them
+        logger.warning('Attachment %s: could not publish status %s', attachment_id, status, exc_info=True,
+                       extra={'attachment_id': attachment_id, 'session_id': session_id, 'status': status})
+
+
+class StatusHub:
+    """
+    Fans one Redis pub/sub connection out to every subscriber in this process,
+    so idle SSE clients cost an asyncio.Queue each instead of a connection or thread.
+    The listener waits while nobody is subscribed and is only stopped, closing the
+    pub/sub connection, when the event loop shuts down.
+    """
+
+    def __init__(self, redis):
+        self.loop = asyncio.get_running_loop()
+        self.pubsub = redis.pubsub()
+        self.subscribers = {}  # channel -> set of queues
+        self.listener = None
+        self.lock = asyncio.Lock()
+        self.active = asyncio.Event()
+
+    async def subscribe(self, session_id):
+        channel = _channel(session_id)
+        queue = asyncio.Queue(maxsize=100)
+        async with self.lock:
+            if channel not in self.subscribers:
+                self.subscribers[channel] = set()
+                await self.pubsub.subscribe(channel)
+            self.subscribers[channel].add(queue)
+            self.active.set()
+            if self.listener is None or self.listener.done():
+                self.listener = asyncio.create_task(self._listen())
+        return queue
+
+    async def unsubscribe(self, session_id, queue):
+        channel = _channel(session_id)
+        async with self.lock:
+            queues = self.subscribers.get(channel)
+            if queues is None:
+                return
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[channel]
+                await self.pubsub.unsubscribe(channel)
+            if not self.subscribers:
+                self.active.clear()
+
+    async def _listen(self):
+        try:
+            while True:
+                await self.active.wait()
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is None:
+                    continue
+                channel = message['channel'].decode()
+                for queue in list(self.subscribers.get(channel, ())):
+                    if queue.full():
+                        # Slow consumer: drop the oldest event rather than block everyone
+                        queue.get_nowait()
+                    queue.put_nowait(message['data'].decode())
+        finally:
+            # Cancelled with the other pending tasks when the loop shuts down (asyncio.run)
+            await self.close()
+
+    async def close(self):
+        if _hubs.get(self.loop) is self:
+            del _hubs[self.loop]
+        await self.pubsub.aclose()
+
+
+# Keyed by event loop: a hub must not keep a finished loop alive
+_hubs = weakref.WeakKeyDictionary()
+
+
+def get_hub():
+    """The StatusHub of the running event loop"""
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = _hubs[loop] = StatusHub(get_async_redis())
+    return hub
+
+
+async def stream_status_events(session_id):
+    """Server-Sent Events for one session, with a heartbeat comment while idle"""
+    hub = get_hub()
+    queue = await hub.subscribe(session_id)
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            try:
+                data = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': heartbeat\n\n'
+                continue
+            yield f'event: status\ndata: {data}\n\n'
+    finally:
+        await hub.unsubscribe(session_id, queue)
@@ -0,0 +1,238 @@
+"""
+Per-request performance instrumentation, exported as Prometheus histograms.
+
+While a request is being served (see ktsessions.middleware) its RequestMetrics sit
+in a context variable. Hooks installed once per process add to them:
+- SQL: an execute wrapper on every database connection
+- Redis: wrappers around redis-py's (sync and asyncio) execute_command and pipeline execute
+- Celery: before/after_task_publish signals time broker publishes
+Context variables follow sync_to_async, so async views are measured too.
+
+With gunicorn/uvicorn workers set PROMETHEUS_MULTIPROC_DIR so /metrics aggregates
+every worker process.
+"""
+import contextvars
+import functools
+import hmac
+import os
+import time
+
+from celery.signals import after_task_publish, before_task_publish
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+
+from authentication.authentication import CachedJWTAuthentication
+
+try:
+    import prometheus_client
+    from prometheus_client import CollectorRegistry, Histogram, multiprocess
+except ImportError:  # optional dependency, /metrics answers 503 without it
+    prometheus_client = None
+
+_current = contextvars.ContextVar('kt_request_metrics', default=None)
+_installed = False
+
+# Buckets in seconds for durations, plain numbers for counts
+DURATION_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+if prometheus_client is not None:
+    REQUEST_SECONDS = Histogram(
+        'kt_request_duration_seconds', 'Wall time of a request', ['view', 'method'], buckets=DURATION_BUCKETS
+    )
+    DB_QUERIES = Histogram(
+        'kt_request_db_queries', 'SQL queries per request', ['view'], buckets=COUNT_BUCKETS
+    )
+    DB_SECONDS = Histogram(
+        'kt_request_db_seconds', 'Time in SQL per request', ['view'], buckets=DURATION_BUCKETS
+    )
+    REDIS_COMMANDS = Histogram(
+        'kt_request_redis_commands', 'Redis commands per request', ['view'], buckets=COUNT_BUCKETS
+    )
+    REDIS_SECONDS = Histogram(
+        'kt_request_redis_seconds', 'Time in Redis per request', ['view'], buckets=DURATION_BUCKETS
+    )
+    PUBLISH_SECONDS = Histogram(
+        'kt_request_broker_publish_seconds', 'Time publishing Celery tasks per request', ['view'],
+        buckets=DURATION_BUCKETS
+    )
+    RENDER_SECONDS = Histogram(
+        'kt_request_render_seconds', 'Time rendering the response body per request', ['view'],
+        buckets=DURATION_BUCKETS
+    )
+
+
+class RequestMetrics:
+    __slots__ = (
+        'started', 'db_queries', 'db_seconds', 'redis_commands', 'redis_seconds',
+        'publishes', 'publish_seconds', 'publish_started', 'render_seconds',
+    )
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = self.redis_commands = self.publishes = 0
+        self.db_seconds = self.redis_seconds = self.publish_seconds = self.render_seconds = 0.0
+        self.publish_started = None
+
+    def server_timing(self, total):
+        """Server-Timing header value, durations in milliseconds"""
+        return ', '.join([
+            f'db;dur={self.db_seconds * 1000:.2f};desc="{self.db_queries} queries"',
+            f'redis;dur={self.redis_seconds * 1000:.2f};desc="{self.redis_commands} commands"',
+            f'broker;dur={self.publish_seconds * 1000:.2f};desc="{self.publishes} publishes"',
+            f'render;dur={self.render_seconds * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+
+
+def start_request():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def current():
+    """RequestMetrics of the request being served, or None"""
+    return _current.get()
+
+
+def finish_request(token):
+    _current.reset(token)
+
+
+def observe(metrics, view, method, total):
+    if prometheus_client is None:
+        return
+    REQUEST_SECONDS.labels(view, method).observe(total)
+    DB_QUERIES.labels(view).observe(metrics.db_queries)
+    DB_SECONDS.labels(view).observe(metrics.db_seconds)
+    REDIS_COMMANDS.labels(view).observe(metrics.redis_commands)
+    REDIS_SECONDS.labels(view).observe(metrics.redis_seconds)
+    PUBLISH_SECONDS.labels(view).observe(metrics.publish_seconds)
+    RENDER_SECONDS.labels(view).observe(metrics.render_seconds)
+
+
+def _sql_wrapper(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_queries += 1
+        metrics.db_seconds += time.perf_counter() - start
+
+
+def _install_sql_wrapper(sender, connection, **kwargs):
+    if _sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_sql_wrapper)
+
+
+def _timed_redis(method, commands=lambda self, args: 1):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        metrics = _current.get()
+        if metrics is None:
+            return method(self, *args, **kwargs)
+        count = commands(self, args)
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            metrics.redis_commands += count
+            metrics.redis_seconds += time.perf_counter() - start
+    return wrapper
+
+
+def _timed_async_redis(method, commands=lambda self, args: 1):
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        metrics = _current.get()
+        if metrics is None:
+            return await method(self, *args, **kwargs)
+        count = commands(self, args)
+        start = time.perf_counter()
+        try:
+            return await method(self, *args, **kwargs)
+        finally:
+            metrics.redis_commands += count
+            metrics.redis_seconds += time.perf_counter() - start
+    return wrapper
+
+
+def _pipeline_size(pipeline, args):
+    return len(pipeline.command_stack)
+
+
+def _publish_started(**kwargs):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.publish_started = time.perf_counter()
+
+
+def _publish_finished(**kwargs):
+    metrics = _current.get()
+    if metrics is not None and metrics.publish_started is not None:
+        metrics.publishes += 1
+        metrics.publish_seconds += time.perf_counter() - metrics.publish_started
+        metrics.publish_started = None
+
+
+def install():
+    """Install the SQL, Redis and Celery hooks; safe to call more than once"""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    from django.db import connections
+    from redis import asyncio as redis_asyncio
+    from redis import client as redis_client
+
+    connection_created.connect(_install_sql_wrapper, dispatch_uid='kt_instrumentation_sql')
+    for connection in connections.all(initialized_only=True):
+        _install_sql_wrapper(None, connection)
+
+    redis_client.Redis.execute_command = _timed_redis(redis_client.Redis.execute_command)
+    redis_client.Pipeline.execute = _timed_redis(redis_client.Pipeline.execute, _pipeline_size)
+    redis_asyncio.Redis.execute_command = _timed_async_redis(redis_asyncio.Redis.execute_command)
+    redis_asyncio.client.Pipeline.execute = _timed_async_redis(redis_asyncio.client.Pipeline.execute, _pipeline_size)
+
+    before_task_publish.connect(_publish_started, dispatch_uid='kt_instrumentation_publish_started', weak=False)
+    after_task_publish.connect(_publish_finished, dispatch_uid='kt_instrumentation_publish_finished', weak=False)
+
+
+def metrics_registry():
+    """Registry to expose: every process' samples in multiprocess mode, else this process'"""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return prometheus_client.REGISTRY
+
+
+def _may_read_metrics(request):
+    """Bearer KT_METRICS_TOKEN (for the scraper) or the access token of a staff user"""
+    scheme, _, credentials = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    if scheme.lower() != 'bearer' or not credentials:
+        return False
+    if settings.KT_METRICS_TOKEN and hmac.compare_digest(credentials.encode(), settings.KT_METRICS_TOKEN.encode()):
+        return True
+    try:
+        auth = CachedJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return auth is not None and auth[0].is_staff
+
+
+def metrics_view(request):
+    """Prometheus text exposition of the request and task metrics"""
+    if not _may_read_metrics(request):
+        return HttpResponse('Forbidden\n', status=403, content_type='text/plain')
+    if prometheus_client is None:
+        return HttpResponse('prometheus_client is not installed\n', status=503, content_type='text/plain')
+    return HttpResponse(
+        prometheus_client.generate_latest(metrics_registry()), content_type=prometheus_client.CONTENT_TYPE_LATEST
+    )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from ktsessions.content_store import TEXT_FIELDS, get_content_store
+from ktsessions.models import Attachment
+
+
+class Command(BaseCommand):
+    help = 'Delete transcripts and summaries in the content store that no attachment refers to any more'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=int, default=24 * 60 * 60,
+            help='seconds; newer content is kept, its attachment may not be committed yet'
+        )
+
+    def handle(self, *args, **options):
+        referenced = [
+            Attachment.objects.filter(**{f'{field}_ref__isnull': False}).values_list(f'{field}_ref', flat=True)
+            for field in TEXT_FIELDS
+        ]
+        deleted = get_content_store().collect(referenced, options['min_age'])
+        self.stdout.write(self.style.SUCCESS(f'Done, {deleted} unreferenced content objects deleted'))
@@ -0,0 +1,35 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from ktsessions.backup import export_lines
+
+
+class Command(BaseCommand):
+    help = 'Write KT sessions and their attachments as NDJSON, for every user or the given ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', metavar='EMAIL', help='export this user, can be repeated')
+        parser.add_argument('--output', default='-', help='file to write, - for stdout')
+        parser.add_argument('--chunk-size', type=int, help='rows per cursor fetch, defaults to KT_EXPORT_CHUNK_SIZE')
+
+    def handle(self, *args, **options):
+        users = None
+        if options['user']:
+            users = list(get_user_model().objects.filter(email__in=options['user']))
+            missing = set(options['user']) - {user.email for user in users}
+            if missing:
+                raise CommandError(f'Unknown users: {", ".join(sorted(missing))}')
+
+        lines = 0
+        output = sys.stdout.buffer if options['output'] == '-' else open(options['output'], 'wb')
+        try:
+            for line in export_lines(users, chunk_size=options['chunk_size']):
+                output.write(line)
+                lines += 1
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+        # stdout may be the export itself
+        self.stderr.write(self.style.SUCCESS(f'Done, {lines - 1} records exported'))
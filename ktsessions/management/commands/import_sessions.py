@@ -0,0 +1,39 @@
+import json
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from ktsessions.backup import import_lines
+
+
+class Command(BaseCommand):
+    help = 'Import an NDJSON export of KT sessions; attachments that have a transcript are not processed again'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='file to import, - for stdin')
+        parser.add_argument('--owner', metavar='EMAIL', help='give every session to this user instead of the exported owners')
+        parser.add_argument('--batch-size', type=int, help='rows per bulk insert, defaults to KT_IMPORT_BATCH_SIZE')
+
+    def handle(self, *args, **options):
+        owner = None
+        if options['owner']:
+            owner = get_user_model().objects.filter(email=options['owner']).first()
+            if owner is None:
+                raise CommandError(f'Unknown user {options["owner"]}')
+
+        try:
+            if options['path'] == '-':
+                result = import_lines(sys.stdin.buffer, owner, options['batch_size'])
+            else:
+                with open(options['path'], 'rb') as f:
+                    result = import_lines(f, owner, options['batch_size'])
+        except ValueError as e:
+            raise CommandError(f'Invalid import: {e}')
+
+        for error in result['errors']:
+            self.stderr.write(f"line {error['line']}: {json.dumps(error['error'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Done, {result['sessions']} sessions and {result['attachments']} attachments imported, "
+            f"{result['queued']} queued for processing, {len(result['errors'])} lines skipped"
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from ktsessions.models import Attachment
+from ktsessions.search import index_attachments
+
+
+class Command(BaseCommand):
+    help = 'Build the full-text search documents of finished attachments, e.g. after enabling search'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        indexed = 0
+        last_id = 0
+        while True:
+            attachments = list(
+                Attachment.objects.filter(id__gt=last_id, status='done')
+                .order_by('id').only('id', 'session_id', 'transcript_ref', 'summary_ref')[:options['batch_size']]
+            )
+            if not attachments:
+                break
+            # One content store read and one write to the index per page
+            index_attachments(attachments)
+            indexed += len(attachments)
+            last_id = attachments[-1].id
+            self.stdout.write(f'Indexed {indexed} attachments')
+        self.stdout.write(self.style.SUCCESS(f'Done, {indexed} attachments indexed'))
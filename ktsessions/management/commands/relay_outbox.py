@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ktsessions.outbox import drain
+
+
+class Command(BaseCommand):
+    help = 'Publish queued outbox messages to Celery, polling until interrupted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--interval', type=float, default=0.5,
+                            help='seconds to sleep when the outbox is empty')
+        parser.add_argument('--once', action='store_true', help='drain the outbox once and exit')
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                published = drain(options['batch_size'])
+            except Exception as e:
+                # Broker or database hiccup: messages stay in the outbox
+                self.stderr.write(f'Outbox relay failed: {e}')
+                published = 0
+            if published:
+                self.stdout.write(f'Published {published} outbox messages')
+            if options['once']:
+                return
+            time.sleep(options['interval'])
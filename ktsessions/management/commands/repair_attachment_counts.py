@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from ktsessions.counters import COUNT_FIELDS, STATUS_COUNT_FIELDS
+from ktsessions.models import Attachment, KTSession
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized attachment counters of every session, e.g. after a backfill'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        repaired = 0
+        last_id = 0
+        while True:
+            sessions = list(
+                KTSession.objects.filter(id__gt=last_id).order_by('id')
+                .only('id', *COUNT_FIELDS)[:options['batch_size']]
+            )
+            if not sessions:
+                break
+            counts = {}
+            rows = (
+                Attachment.objects.filter(session_id__in=[session.id for session in sessions])
+                .values('session_id', 'status').annotate(count=Count('id')).order_by()
+            )
+            for row in rows:
+                counts.setdefault(row['session_id'], {})[row['status']] = row['count']
+
+            changed = []
+            for session in sessions:
+                statuses = counts.get(session.id, {})
+                expected = {field: statuses.get(status, 0) for status, field in STATUS_COUNT_FIELDS.items()}
+                expected['attachment_count'] = sum(statuses.values())
+                if any(getattr(session, field) != value for field, value in expected.items()):
+                    for field, value in expected.items():
+                        setattr(session, field, value)
+                    changed.append(session)
+            KTSession.objects.bulk_update(changed, COUNT_FIELDS)
+            repaired += len(changed)
+            last_id = sessions[-1].id
+        self.stdout.write(self.style.SUCCESS(f'Done, {repaired} sessions repaired'))
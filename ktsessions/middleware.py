@@ -0,0 +1,67 @@
+"""
+RequestMetricsMiddleware: per request SQL, Redis, broker publish, render and wall
+time, observed into the histograms in ktsessions.instrumentation under the resolved
+URL name. Place it first in MIDDLEWARE so the wall time covers the whole stack.
+
+Debugging: with KT_TIMING_HEADER enabled, a request sending `X-Debug-Timing: 1`
+gets its own breakdown back in a Server-Timing header.
+"""
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import instrumentation
+
+DEBUG_HEADER = 'HTTP_X_DEBUG_TIMING'
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        instrumentation.install()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics, token = instrumentation.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            instrumentation.finish_request(token)
+        return self._finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics, token = instrumentation.start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            instrumentation.finish_request(token)
+        return self._finish(request, response, metrics)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time that step too
+        metrics = instrumentation.current()
+        if metrics is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                metrics.render_seconds += time.perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def _finish(self, request, response, metrics):
+        total = time.perf_counter() - metrics.started
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unresolved'
+        instrumentation.observe(metrics, view, request.method, total)
+        if settings.KT_TIMING_HEADER and request.META.get(DEBUG_HEADER) == '1':
+            response['Server-Timing'] = metrics.server_timing(total)
+        return response
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ktsessions', '0002_ktsession_share_token_expires_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attachment',
+            index=models.Index(fields=['created_at', 'id'], name='attachment_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attachment',
+            index=models.Index(fields=['session', 'created_at', 'id'], name='attachment_session_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attachment',
+            index=models.Index(fields=['file_type', 'created_at', 'id'], name='attachment_type_created_idx'),
+        ),
+    ]
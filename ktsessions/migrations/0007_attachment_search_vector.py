@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:10
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ktsessions', '0006_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attachment',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+    ]
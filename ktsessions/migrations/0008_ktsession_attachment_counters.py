@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:11
+
+from django.db import migrations, models
+from django.db.models import Count
+
+STATUS_COUNT_FIELDS = {
+    'pending': 'pending_count',
+    'processing': 'processing_count',
+    'done': 'done_count',
+    'failed': 'failed_count',
+}
+BATCH_SIZE = 1000
+
+
+def fill_counts(apps, schema_editor):
+    """Counters of the sessions that already have attachments, in batches of sessions"""
+    KTSession = apps.get_model('ktsessions', 'KTSession')
+    Attachment = apps.get_model('ktsessions', 'Attachment')
+    count_fields = ['attachment_count', *STATUS_COUNT_FIELDS.values()]
+    last_id = 0
+    while True:
+        sessions = list(KTSession.objects.filter(id__gt=last_id).order_by('id').only('id')[:BATCH_SIZE])
+        if not sessions:
+            break
+        counts = {}
+        rows = (
+            Attachment.objects.filter(session_id__in=[session.id for session in sessions])
+            .values('session_id', 'status').annotate(count=Count('id')).order_by()
+        )
+        for row in rows:
+            counts.setdefault(row['session_id'], {})[row['status']] = row['count']
+        for session in sessions:
+            statuses = counts.get(session.id, {})
+            for status, field in STATUS_COUNT_FIELDS.items():
+                setattr(session, field, statuses.get(status, 0))
+            session.attachment_count = sum(statuses.values())
+        KTSession.objects.bulk_update(sessions, count_fields)
+        last_id = sessions[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ktsessions', '0007_attachment_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ktsession',
+            name='attachment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='ktsession',
+            name='done_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='ktsession',
+            name='failed_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='ktsession',
+            name='pending_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='ktsession',
+            name='processing_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        # The columns start at 0; count what is already there
+        migrations.RunPython(fill_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ktsessions', '0008_ktsession_attachment_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attachment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='ktsession',
+            name='revision',
+            field=models.PositiveBigIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='ktsession',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
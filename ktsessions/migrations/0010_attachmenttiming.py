@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ktsessions', '0009_ktsession_revision_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttachmentTiming',
+            fields=[
+                ('attachment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='timing', serialize=False, to='ktsessions.attachment')),
+                ('file_type', models.CharField(max_length=10)),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('processing_time', models.DurationField(blank=True, null=True)),
+                ('queue_wait_ms', models.PositiveIntegerField(default=0)),
+                ('hash_ms', models.PositiveIntegerField(default=0)),
+                ('lookup_ms', models.PositiveIntegerField(default=0)),
+                ('probe_ms', models.PositiveIntegerField(default=0)),
+                ('dispatch_ms', models.PositiveIntegerField(default=0)),
+                ('transcribe_ms', models.PositiveIntegerField(default=0)),
+                ('summarize_ms', models.PositiveIntegerField(default=0)),
+                ('segments', models.PositiveIntegerField(default=0)),
+                ('retries', models.PositiveIntegerField(default=0)),
+                ('cached', models.BooleanField(default=False)),
+                ('outcome', models.CharField(blank=True, choices=[('done', 'Done'), ('failed', 'Failed')], max_length=10)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['finished_at', 'file_type'], name='timing_finished_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ktsessions', '0010_attachmenttiming'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ktsession',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ktsessions', '0011_ktsession_deleted_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentFrame',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('digest', models.CharField(max_length=64)),
+                ('offset', models.PositiveBigIntegerField()),
+                ('size', models.PositiveIntegerField()),
+                ('codec', models.CharField(max_length=8)),
+                ('data', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('digest', 'offset'), name='content_frame_unique')],
+            },
+        ),
+        migrations.AddField(
+            model_name='attachment',
+            name='summary_length',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='attachment',
+            name='summary_ref',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='attachment',
+            name='transcript_length',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='attachment',
+            name='transcript_ref',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
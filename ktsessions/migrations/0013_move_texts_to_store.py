@@ -0,0 +1,61 @@
+"""
+Copy attachment transcripts and summaries from their old columns into the content
+store (ktsessions.content_store), before 0014 drops the columns.
+
+Runs outside a single transaction so every batch commits on its own; it can be
+re-run after an interruption, texts are stored under their digest.
+"""
+from django.db import migrations
+
+TEXT_FIELDS = ('transcript', 'summary')
+BATCH_SIZE = 500
+
+
+def _batches(Attachment, *fields):
+    last_id = 0
+    while True:
+        rows = list(
+            Attachment.objects.filter(id__gt=last_id).order_by('id').values_list('id', *fields)[:BATCH_SIZE]
+        )
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def move_texts_to_store(apps, schema_editor):
+    # Written through the current ContentFrame model, its table exists since 0012
+    from ktsessions.content_store import text_columns
+
+    Attachment = apps.get_model('ktsessions', 'Attachment')
+    columns = [column for field in TEXT_FIELDS for column in (f'{field}_ref', f'{field}_length')]
+    for rows in _batches(Attachment, *TEXT_FIELDS):
+        Attachment.objects.bulk_update([
+            Attachment(id=row[0], **text_columns(**dict(zip(TEXT_FIELDS, row[1:]))))
+            for row in rows
+        ], columns)
+
+
+def restore_texts(apps, schema_editor):
+    from ktsessions.content_store import get_texts
+
+    Attachment = apps.get_model('ktsessions', 'Attachment')
+    refs = [f'{field}_ref' for field in TEXT_FIELDS]
+    for rows in _batches(Attachment, *refs):
+        texts = get_texts(ref for row in rows for ref in row[1:])
+        Attachment.objects.bulk_update([
+            Attachment(id=row[0], **{field: texts.get(ref) for field, ref in zip(TEXT_FIELDS, row[1:])})
+            for row in rows
+        ], list(TEXT_FIELDS))
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('ktsessions', '0012_content_store'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_texts_to_store, restore_texts),
+    ]
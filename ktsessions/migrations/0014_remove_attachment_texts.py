@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ktsessions', '0013_move_texts_to_store'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='attachment',
+            name='summary',
+        ),
+        migrations.RemoveField(
+            model_name='attachment',
+            name='transcript',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ktsessions', '0014_remove_attachment_texts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attachment',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -1,7 +1,27 @@
 import uuid
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import F
 from django.conf import settings
 
+from .content_store import TEXT_FIELDS, stored_text
+
+
+# Moved by concurrent F() updates (ktsessions.counters), so a save only writes them when named
+SESSION_COUNTER_FIELDS = (
+    'attachment_count', 'pending_count', 'processing_count', 'done_count', 'failed_count', 'revision'
+)
+# Saving only the share token does not change the session's content
+SHARE_TOKEN_FIELDS = {'share_token', 'share_token_expires_at'}
+
+
+class VisibleSessionManager(models.Manager):
+    """Sessions not waiting for background deletion (see ktsessions.deletion)"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class KTSession(models.Model):
     id = models.AutoField(primary_key=True)
     title = models.CharField(max_length=255)
@@ -10,11 +30,48 @@ class KTSession(models.Model):
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='kt_sessions'
     )
     share_token = models.UUIDField(null=True, blank=True, unique=True, editable=True)
+    share_token_expires_at = models.DateTimeField(null=True, blank=True)
+    # Attachment counters, maintained incrementally by ktsessions.counters
+    attachment_count = models.PositiveIntegerField(default=0)
+    pending_count = models.PositiveIntegerField(default=0)
+    processing_count = models.PositiveIntegerField(default=0)
+    done_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    # Bumped on every change to the session or its attachments, backs the ETags
+    revision = models.PositiveBigIntegerField(default=1)
+    # Set when the session is deleted; its rows are removed in the background
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Hidden sessions are left out of every lookup, including related managers
+    objects = VisibleSessionManager()
+    all_objects = models.Manager()
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, update_fields=None, **kwargs):
+        bumped = False
+        if not self._state.adding:
+            if update_fields is None:
+                # Writing back the counters read with this instance would undo concurrent updates
+                deferred = self.get_deferred_fields()
+                update_fields = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and field.name not in SESSION_COUNTER_FIELDS
+                    and field.attname not in deferred
+                ]
+            if 'revision' not in update_fields and not set(update_fields) <= SHARE_TOKEN_FIELDS:
+                # Bumped in the UPDATE that writes the change, so no revision is served for two bodies
+                self.revision = F('revision') + 1
+                update_fields = [*update_fields, 'revision']
+                bumped = True
+        super().save(*args, update_fields=update_fields, **kwargs)
+        if bumped:
+            # Deferred, the new value is read from the row when accessed
+            del self.__dict__['revision']
+
 
 class Attachment(models.Model):
     FILE_TYPE_CHOICES = [
@@ -28,6 +85,7 @@ class Attachment(models.Model):
         ('pending', 'Pending'),
         ('processing', 'Processing'),
         ('done', 'Done'),
+        ('failed', 'Failed'),
     ]
 
 
@@ -38,12 +96,133 @@ class Attachment(models.Model):
     file_type = models.CharField(max_length=10, choices=FILE_TYPE_CHOICES)
     file_url = models.URLField()
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
-    transcript = models.TextField(null=True, blank=True)
-    summary = models.TextField(null=True, blank=True)
+    # Transcript and summary live in ktsessions.content_store; the row keeps their
+    # digest and UTF-8 length, the `transcript` and `summary` properties read and write them
+    transcript_ref = models.CharField(max_length=64, null=True, blank=True)
+    transcript_length = models.PositiveBigIntegerField(default=0)
+    summary_ref = models.CharField(max_length=64, null=True, blank=True)
+    summary_length = models.PositiveBigIntegerField(default=0)
+    # Set by process_attachment when it claims the attachment and renewed as segments finish;
+    # a 'processing' claim older than KT_PROCESSING_LEASE seconds belongs to a dead worker
+    claimed_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # SHA-256 of the fetched media, links to ProcessingResult
+    content_hash = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+    # Weighted summary + transcript tsvector, maintained by ktsessions.search (PostgreSQL only)
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Back the (-created_at, -id) ordering of get_attachments for every filter combination
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='attachment_created_idx'),
+            models.Index(fields=['session', 'created_at', 'id'], name='attachment_session_created_idx'),
+            models.Index(fields=['file_type', 'created_at', 'id'], name='attachment_type_created_idx'),
+        ]
+
+    transcript = stored_text('transcript')
+    summary = stored_text('summary')
 
     def __str__(self):
         return f"{self.file_type} for session {self.session.title}"
+
+    def save(self, *args, update_fields=None, **kwargs):
+        if update_fields is not None:
+            # A stored text is written as its ref and length columns
+            update_fields = [
+                column for field in update_fields
+                for column in ((f'{field}_ref', f'{field}_length') if field in TEXT_FIELDS else (field,))
+            ]
+        super().save(*args, update_fields=update_fields, **kwargs)
 from django.db import models
 
 # Create your models here.
+
+
+class ProcessingResult(models.Model):
+    """Transcript and summary of processed media, shared by attachments with the same content"""
+    content_hash = models.CharField(max_length=64, unique=True)
+    transcript = models.TextField()
+    summary = models.TextField()
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_hit_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.content_hash
+
+
+class ContentFrame(models.Model):
+    """One compressed frame of a text in ktsessions.content_store.DatabaseContentStore"""
+    id = models.BigAutoField(primary_key=True)
+    # SHA-256 of the whole UTF-8 text
+    digest = models.CharField(max_length=64)
+    # Position and length of the frame in the uncompressed text, in bytes
+    offset = models.PositiveBigIntegerField()
+    size = models.PositiveIntegerField()
+    codec = models.CharField(max_length=8)
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['digest', 'offset'], name='content_frame_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.digest}@{self.offset}"
+
+
+class OutboxMessage(models.Model):
+    """
+    Celery task waiting to be published, written in the same transaction as the
+    rows it refers to. The outbox relay publishes and deletes these in batches.
+    """
+    id = models.BigAutoField(primary_key=True)
+    task = models.CharField(max_length=255)
+    args = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.task}{tuple(self.args)}"
+
+
+class AttachmentTiming(models.Model):
+    """
+    Compact processing timeline of an attachment, written by ktsessions.telemetry.
+    Stage columns are accumulated across retries and segments in milliseconds.
+    """
+    OUTCOME_CHOICES = [
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    attachment = models.OneToOneField(
+        'Attachment', on_delete=models.CASCADE, primary_key=True, related_name='timing'
+    )
+    file_type = models.CharField(max_length=10)
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # started_at -> finished_at, including the segment fan-out
+    processing_time = models.DurationField(null=True, blank=True)
+    queue_wait_ms = models.PositiveIntegerField(default=0)
+    hash_ms = models.PositiveIntegerField(default=0)
+    lookup_ms = models.PositiveIntegerField(default=0)
+    probe_ms = models.PositiveIntegerField(default=0)
+    dispatch_ms = models.PositiveIntegerField(default=0)
+    # Sum over segments, which run in parallel
+    transcribe_ms = models.PositiveIntegerField(default=0)
+    summarize_ms = models.PositiveIntegerField(default=0)
+    segments = models.PositiveIntegerField(default=0)
+    retries = models.PositiveIntegerField(default=0)
+    cached = models.BooleanField(default=False)
+    outcome = models.CharField(max_length=10, choices=OUTCOME_CHOICES, blank=True)
+
+    class Meta:
+        # Throughput per file type over a recent window
+        indexes = [
+            models.Index(fields=['finished_at', 'file_type'], name='timing_finished_idx'),
+        ]
+
+    def __str__(self):
+        return f"timing of attachment {self.attachment_id}"
@@ -0,0 +1,61 @@
+from celery import current_app
+from django.conf import settings
+from django.db import transaction
+
+from .models import OutboxMessage
+
+PROCESS_ATTACHMENT_TASK = 'ktsessions.tasks.process_attachment'
+DELETE_SESSION_TASK = 'ktsessions.tasks.delete_session'
+
+
+def enqueue_processing(attachment_ids):
+    """
+    Queue process_attachment for the given attachments through the outbox.
+    Call inside the transaction that creates the attachments: it only touches the
+    database, and the jobs become visible to the relay exactly when the rows commit.
+    """
+    OutboxMessage.objects.bulk_create(
+        OutboxMessage(task=PROCESS_ATTACHMENT_TASK, args=[attachment_id])
+        for attachment_id in attachment_ids
+    )
+
+
+def enqueue_session_deletion(session_id):
+    """Queue delete_session through the outbox, in the transaction that hides the session"""
+    OutboxMessage.objects.create(task=DELETE_SESSION_TASK, args=[session_id])
+
+
+def relay_batch(batch_size=None):
+    """
+    Publish up to batch_size outbox messages over a single broker connection and
+    delete them. Returns the number of messages published.
+    Rows are locked with SKIP LOCKED so several relays can run side by side; if
+    the broker fails the transaction rolls back and the batch is retried later.
+    Tasks must be idempotent, a crash between publish and commit republishes.
+    """
+    batch_size = batch_size or settings.KT_OUTBOX_BATCH_SIZE
+    with transaction.atomic():
+        messages = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .order_by('id')
+            .values_list('id', 'task', 'args')[:batch_size]
+        )
+        if not messages:
+            return 0
+
+        with current_app.producer_or_acquire() as producer:
+            for _, task, args in messages:
+                current_app.send_task(task, args=args, producer=producer)
+
+        OutboxMessage.objects.filter(id__in=[message_id for message_id, _, _ in messages]).delete()
+    return len(messages)
+
+
+def drain(batch_size=None):
+    """Relay batches until the outbox is empty; returns the total published"""
+    total = 0
+    while True:
+        published = relay_batch(batch_size)
+        total += published
+        if not published:
+            return total
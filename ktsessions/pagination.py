@@ -0,0 +1,90 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class CursorPage:
+    def __init__(self, items, next_cursor=None, previous_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+
+def cursor_link(request, cursor):
+    """Absolute URL of the current request with its cursor replaced, or None"""
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    return request.build_absolute_uri('?' + query.urlencode())
+
+
+def encode_cursor(row, direction):
+    """Opaque cursor pointing just past `row` in the given direction ('next' or 'prev')"""
+    payload = {'c': row.created_at.isoformat(), 'i': row.id, 'd': direction}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_cursor(value):
+    """Return (created_at, id, direction); raises ValueError for a malformed cursor"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(value.encode()))
+        created_at, row_id, direction = datetime.fromisoformat(payload['c']), int(payload['i']), payload['d']
+    except (TypeError, KeyError, json.JSONDecodeError, UnicodeError, binascii.Error) as e:
+        raise ValueError(f'Invalid cursor: {e}')
+    if direction not in ('next', 'prev'):
+        raise ValueError('Invalid cursor direction')
+    return created_at, row_id, direction
+
+
+def paginate_by_cursor(queryset, cursor, per_page):
+    """
+    Keyset pagination over a queryset ordered by ('-created_at', '-id').
+    Every page is a single index range scan of per_page + 1 rows, no matter how deep.
+    An empty cursor returns the first page.
+    """
+    page_queryset, direction = _cursor_queryset(queryset, cursor, per_page)
+    return _cursor_page(list(page_queryset), direction, per_page)
+
+
+async def apaginate_by_cursor(queryset, cursor, per_page):
+    """paginate_by_cursor for async views"""
+    page_queryset, direction = _cursor_queryset(queryset, cursor, per_page)
+    return _cursor_page([row async for row in page_queryset], direction, per_page)
+
+
+def _cursor_queryset(queryset, cursor, per_page):
+    if not cursor:
+        return queryset[:per_page + 1], None
+
+    created_at, row_id, direction = decode_cursor(cursor)
+    if direction == 'next':
+        return queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=row_id)
+        )[:per_page + 1], direction
+    return queryset.filter(
+        Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=row_id)
+    ).reverse()[:per_page + 1], direction
+
+
+def _cursor_page(rows, direction, per_page):
+    if direction is None:
+        items = rows[:per_page]
+        has_next, has_previous = len(rows) > per_page, False
+    elif direction == 'next':
+        items = rows[:per_page]
+        has_next, has_previous = len(rows) > per_page, True
+    else:
+        items = rows[:per_page][::-1]
+        has_next, has_previous = True, len(rows) > per_page
+
+    if not items:
+        return CursorPage(items)
+    return CursorPage(
+        items,
+        next_cursor=encode_cursor(items[-1], 'next') if has_next else None,
+        previous_cursor=encode_cursor(items[0], 'prev') if has_previous else None,
+    )
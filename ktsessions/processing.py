@@ -0,0 +1,97 @@
+import hashlib
+import io
+import time
+import urllib.request
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+def get_transcriber():
+    """Instantiate the transcriber configured by KT_TRANSCRIBER"""
+    return import_string(settings.KT_TRANSCRIBER)()
+
+
+def content_hash(transcriber, file_url, chunk_size=64 * 1024):
+    """Streamed SHA-256 of the media behind file_url"""
+    digest = hashlib.sha256()
+    with transcriber.open_media(file_url) as media:
+        for chunk in iter(lambda: media.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def split_segments(duration, segment_seconds):
+    """
+    Split a media duration (seconds) into [(start, end), ...] time segments.
+    Non time-based media (duration None) is a single segment.
+    """
+    if not duration:
+        return [(0, None)]
+    return [
+        (start, min(start + segment_seconds, duration))
+        for start in range(0, int(duration), segment_seconds)
+    ]
+
+
+def format_offset(seconds):
+    seconds = int(seconds)
+    return f'{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}'
+
+
+def merge_segments(segments):
+    """Join transcribed segments in time order, prefixing each with its start offset"""
+    ordered = sorted(segments, key=lambda segment: segment['start'])
+    if len(ordered) == 1 and ordered[0]['end'] is None:
+        return ordered[0]['text']
+    return '\n'.join(f"[{format_offset(segment['start'])}] {segment['text']}" for segment in ordered)
+
+
+class BaseTranscriber:
+    """Interface the processing tasks expect from KT_TRANSCRIBER"""
+    FETCH_TIMEOUT = 30
+
+    def open_media(self, file_url):
+        """Binary file-like object streaming the media"""
+        return urllib.request.urlopen(file_url, timeout=self.FETCH_TIMEOUT)
+
+    def probe(self, file_url, file_type):
+        raise NotImplementedError
+
+    def transcribe(self, file_url, file_type, start, end):
+        raise NotImplementedError
+
+    def summarize(self, transcript):
+        raise NotImplementedError
+
+
+class LocalTranscriber(BaseTranscriber):
+    """
+    Stand-in transcriber that needs no external services.
+    Produces deterministic text so the whole pipeline can run locally and in CI.
+    """
+    TIMED_FILE_TYPES = ('audio', 'video')
+
+    def __init__(self):
+        self.delay = getattr(settings, 'KT_LOCAL_TRANSCRIBER_DELAY', 0)
+
+    def open_media(self, file_url):
+        # The URL stands in for the media bytes, so equal URLs deduplicate
+        return io.BytesIO(file_url.encode())
+
+    def probe(self, file_url, file_type):
+        """Return the media duration in seconds, or None for documents"""
+        if file_type not in self.TIMED_FILE_TYPES:
+            return None
+        return settings.KT_LOCAL_MEDIA_DURATION
+
+    def transcribe(self, file_url, file_type, start, end):
+        if self.delay:
+            time.sleep(self.delay)
+        digest = hashlib.sha256(f'{file_url}:{start}'.encode()).hexdigest()[:8]
+        if end is None:
+            return f'demo transcript of {file_url} ({digest})'
+        return f'demo transcript of {file_url} {format_offset(start)}-{format_offset(end)} ({digest})'
+
+    def summarize(self, transcript):
+        return f'demo summary ({len(transcript)} characters)'
@@ -0,0 +1,18 @@
+import asyncio
+
+import redis.asyncio as aioredis
+from django.conf import settings
+
+_clients = {}
+
+
+def get_async_redis():
+    """
+    redis.asyncio client for the cache database, one per event loop since
+    connections cannot be shared across loops.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = aioredis.from_url(settings.CACHES['default']['LOCATION'])
+    return client
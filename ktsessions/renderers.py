@@ -0,0 +1,35 @@
+"""
+JSON rendering through orjson when it is installed, with the standard library
+encoder as the fallback. ORJSONRenderer replaces DRF's JSONRenderer for every API
+view when KT_FAST_JSON is enabled (see settings).
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+# Same output as DRF's encoder: UTC datetimes end in Z, non-string keys are stringified
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+# Lazy strings, Decimal, QuerySet, ... are handled like DRF does
+_default = JSONEncoder().default
+
+
+def render_json(data):
+    """Serialize data to JSON bytes, e.g. for payloads cached outside a response"""
+    if orjson is None:
+        return JSONRenderer().render(data)
+    return orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # orjson cannot indent arbitrarily, leave pretty printing to the standard encoder
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
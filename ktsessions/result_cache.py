@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.core.cache import cache  # Redis cache
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ProcessingResult
+
+HITS_KEY = 'processing:dedup:hits'
+MISSES_KEY = 'processing:dedup:misses'
+
+
+def _result_key(content_hash):
+    return f'processing:result:{content_hash}'
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # incr fails on a missing key with non-Redis backends
+        cache.set(key, 1, timeout=None)
+
+
+def lookup_result(content_hash):
+    """
+    Return (transcript, summary) already computed for this content, or None.
+    Checks Redis first when KT_RESULT_CACHE_REDIS is on, then the ProcessingResult table.
+    """
+    result = None
+    if settings.KT_RESULT_CACHE_REDIS:
+        result = cache.get(_result_key(content_hash))
+
+    if result is None:
+        result = ProcessingResult.objects.filter(
+            content_hash=content_hash
+        ).values_list('transcript', 'summary').first()
+        if result is not None and settings.KT_RESULT_CACHE_REDIS:
+            cache.set(_result_key(content_hash), result, timeout=settings.KT_RESULT_CACHE_TTL)
+
+    if result is None:
+        _count(MISSES_KEY)
+        return None
+
+    _count(HITS_KEY)
+    ProcessingResult.objects.filter(content_hash=content_hash).update(
+        hit_count=F('hit_count') + 1, last_hit_at=timezone.now()
+    )
+    return tuple(result)
+
+
+def store_result(content_hash, transcript, summary):
+    ProcessingResult.objects.update_or_create(
+        content_hash=content_hash,
+        defaults={'transcript': transcript, 'summary': summary},
+    )
+    if settings.KT_RESULT_CACHE_REDIS:
+        cache.set(_result_key(content_hash), (transcript, summary), timeout=settings.KT_RESULT_CACHE_TTL)
+
+
+def dedup_stats():
+    """Hit/miss counters since the cache was last cleared"""
+    hits = cache.get(HITS_KEY) or 0
+    misses = cache.get(MISSES_KEY) or 0
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_ratio': hits / total if total else 0.0}
@@ -0,0 +1,221 @@
+"""
+Full-text search over attachment transcripts and summaries.
+
+PostgreSQL keeps a weighted tsvector in Attachment.search_vector behind a GIN
+index; SQLite (local development) keeps an FTS5 table with the same contents.
+Both are updated one attachment at a time when its text changes, or a batch at a time
+for imported attachments, never at query time.
+The texts themselves come from ktsessions.content_store.
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, Value
+
+from .content_store import get_texts, preload_texts
+from .models import Attachment
+
+SEARCH_CONFIG = 'english'
+HIGHLIGHT_START, HIGHLIGHT_STOP = '<mark>', '</mark>'
+GIN_INDEX_NAME = 'attachment_search_vector_gin'
+FTS_TABLE = 'ktsessions_attachment_fts'
+
+
+class PostgresSearchBackend:
+    def create_index(self, cursor):
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {GIN_INDEX_NAME} '
+            f'ON {Attachment._meta.db_table} USING GIN (search_vector)'
+        )
+
+    def index_attachment(self, attachment_id):
+        refs = Attachment.objects.filter(id=attachment_id).values_list('summary_ref', 'transcript_ref').first()
+        if refs is None:
+            return
+        summary, transcript = _texts(refs)
+        Attachment.objects.filter(id=attachment_id).update(search_vector=(
+            SearchVector(Value(summary), weight='A', config=SEARCH_CONFIG)
+            + SearchVector(Value(transcript), weight='B', config=SEARCH_CONFIG)
+        ))
+
+    def index_documents(self, documents):
+        ids, summaries, transcripts = zip(*((attachment_id, summary, transcript)
+                                            for attachment_id, _, summary, transcript in documents))
+        table = Attachment._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} SET search_vector = '
+                f"setweight(to_tsvector(%s::regconfig, document.summary), 'A') || "
+                f"setweight(to_tsvector(%s::regconfig, document.transcript), 'B') "
+                f'FROM unnest(%s::bigint[], %s::text[], %s::text[]) AS document(id, summary, transcript) '
+                f'WHERE {table}.id = document.id',
+                [SEARCH_CONFIG, SEARCH_CONFIG, list(ids), list(summaries), list(transcripts)]
+            )
+
+    def remove_attachments(self, attachment_ids):
+        # The vector lives on the attachment row and goes away with it
+        pass
+
+    def search(self, user, query, limit, offset):
+        search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+        rows = list(
+            Attachment.objects
+            .filter(session__created_by=user, session__deleted_at__isnull=True, search_vector=search_query)
+            .annotate(rank=SearchRank(F('search_vector'), search_query))
+            .order_by('-rank', '-id')
+            .values('id', 'session_id', 'session__title', 'file_type', 'rank',
+                    'transcript_ref', 'summary_ref')[offset:offset + limit]
+        )
+        if not rows:
+            return []
+        # The texts live in the content store: highlight the page's texts in one query
+        texts = get_texts(ref for row in rows for ref in (row['transcript_ref'], row['summary_ref']))
+        headlines = iter(self._headlines(query, [
+            texts.get(row[column]) or '' for row in rows for column in ('transcript_ref', 'summary_ref')
+        ]))
+        for row in rows:
+            row['transcript_highlight'], row['summary_highlight'] = next(headlines), next(headlines)
+        return [_result(row) for row in rows]
+
+    def _headlines(self, query, bodies):
+        options = f'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, MaxFragments=3'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT ts_headline(%s::regconfig, body.text, query, %s) '
+                'FROM unnest(%s::text[]) WITH ORDINALITY AS body(text, n), '
+                'websearch_to_tsquery(%s::regconfig, %s) AS query ORDER BY body.n',
+                [SEARCH_CONFIG, options, bodies, SEARCH_CONFIG, query]
+            )
+            return [headline for headline, in cursor.fetchall()]
+
+
+class SQLiteSearchBackend:
+    def create_index(self, cursor):
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+            f'summary, transcript, attachment_id UNINDEXED, session_id UNINDEXED)'
+        )
+
+    def index_attachment(self, attachment_id):
+        row = Attachment.objects.filter(id=attachment_id).values_list('session_id', 'summary_ref', 'transcript_ref').first()
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE attachment_id = %s', [attachment_id])
+            if row is not None:
+                session_id, *refs = row
+                summary, transcript = _texts(refs)
+                cursor.execute(
+                    f'INSERT INTO {FTS_TABLE} (summary, transcript, attachment_id, session_id) '
+                    f'VALUES (%s, %s, %s, %s)',
+                    [summary, transcript, attachment_id, session_id]
+                )
+
+    def index_documents(self, documents):
+        self.remove_attachments([attachment_id for attachment_id, _, _, _ in documents])
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (summary, transcript, attachment_id, session_id) VALUES (%s, %s, %s, %s)',
+                [(summary, transcript, attachment_id, session_id)
+                 for attachment_id, session_id, summary, transcript in documents]
+            )
+
+    def remove_attachments(self, attachment_ids):
+        placeholders = ', '.join(['%s'] * len(attachment_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE attachment_id IN ({placeholders})', list(attachment_ids))
+
+    def search(self, user, query, limit, offset):
+        # Quote every term so user input cannot inject FTS5 query syntax
+        match = ' '.join('"' + term.replace('"', '""') + '"' for term in query.split())
+        if not match:
+            return []
+        session_ids = list(user.kt_sessions.values_list('id', flat=True))
+        if not session_ids:
+            return []
+        placeholders = ', '.join(['%s'] * len(session_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT attachment_id, -bm25({FTS_TABLE}, 2.0, 1.0), '
+                f"snippet({FTS_TABLE}, 1, %s, %s, '…', 32), snippet({FTS_TABLE}, 0, %s, %s, '…', 32) "
+                f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND session_id IN ({placeholders}) '
+                f'ORDER BY bm25({FTS_TABLE}, 2.0, 1.0) LIMIT %s OFFSET %s',
+                [HIGHLIGHT_START, HIGHLIGHT_STOP, HIGHLIGHT_START, HIGHLIGHT_STOP, match,
+                 *session_ids, limit, offset]
+            )
+            hits = cursor.fetchall()
+
+        attachments = Attachment.objects.in_bulk([hit[0] for hit in hits])
+        titles = dict(user.kt_sessions.filter(id__in={a.session_id for a in attachments.values()})
+                      .values_list('id', 'title'))
+        results = []
+        for attachment_id, rank, transcript_highlight, summary_highlight in hits:
+            attachment = attachments.get(attachment_id)
+            if attachment is None:
+                continue
+            results.append(_result({
+                'id': attachment_id,
+                'session_id': attachment.session_id,
+                'session__title': titles.get(attachment.session_id),
+                'file_type': attachment.file_type,
+                'rank': rank,
+                'transcript_highlight': transcript_highlight,
+                'summary_highlight': summary_highlight,
+            }))
+        return results
+
+
+def _texts(refs):
+    """Texts behind content store refs, '' for missing ones"""
+    texts = get_texts(refs)
+    return [texts.get(ref) or '' for ref in refs]
+
+
+def _result(row):
+    return {
+        'attachment_id': row['id'],
+        'session': {'id': row['session_id'], 'title': row['session__title']},
+        'file_type': row['file_type'],
+        'rank': row['rank'],
+        'highlights': {
+            'summary': row['summary_highlight'],
+            'transcript': row['transcript_highlight'],
+        },
+    }
+
+
+_BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteSearchBackend,
+}
+
+
+def get_search_backend():
+    return _BACKENDS[connection.vendor]()
+
+
+def index_attachment(attachment_id):
+    """Refresh the search document of one attachment"""
+    get_search_backend().index_attachment(attachment_id)
+
+
+def index_attachments(attachments):
+    """Refresh the search documents of many attachments at once, e.g. just created ones"""
+    documents = [
+        (attachment.id, attachment.session_id, attachment.summary or '', attachment.transcript or '')
+        for attachment in preload_texts(attachments)
+    ]
+    if documents:
+        get_search_backend().index_documents(documents)
+
+
+def remove_attachment(attachment_id):
+    get_search_backend().remove_attachments([attachment_id])
+
+
+def remove_attachments(attachment_ids):
+    """Drop the search documents of deleted attachments"""
+    if attachment_ids:
+        get_search_backend().remove_attachments(attachment_ids)
+
+
+def search_attachments(user, query, limit=20, offset=0):
+    """Ranked, highlighted matches among the attachments of the user's sessions"""
+    return get_search_backend().search(user, query, limit, offset)
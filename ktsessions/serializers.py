@@ -1,4 +1,6 @@
 from rest_framework import serializers
+from .content_store import preload_texts
+from .counters import COUNT_FIELDS
 from .models import KTSession, Attachment
 
 
@@ -8,8 +10,8 @@ class KTSessionSerializer(serializers.ModelSerializer):
     class Meta:
         model = KTSession
         fields = ('id', 'title', 'description', 'created_by', 'created_by_name',
-                  'share_token', 'created_at')
-        read_only_fields = ('id', 'created_by', 'created_at', 'created_by_name')
+                  'share_token', 'created_at') + COUNT_FIELDS
+        read_only_fields = ('id', 'created_by', 'created_at', 'created_by_name') + COUNT_FIELDS
 
 
 class KTSessionCreateSerializer(serializers.ModelSerializer):
@@ -28,11 +30,27 @@ class KTSessionUpdateSerializer(serializers.ModelSerializer):
         model = KTSession
         fields = ('title', 'description')
 
+    def update(self, instance, validated_data):
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        # Only the edited columns; the save bumps the revision in the same UPDATE
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        # The counters may have moved since the instance was read
+        instance.refresh_from_db(fields=COUNT_FIELDS + ('revision',))
+        return instance
+
+
+class AttachmentListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # One content store read for the texts of every attachment
+        return super().to_representation(preload_texts(data.all() if hasattr(data, 'all') else data))
+
 
 class AttachmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Attachment
         fields = ['file_type', 'file_url', 'summary', 'transcript']
+        list_serializer_class = AttachmentListSerializer
 
 class SessionPublicSerializer(serializers.ModelSerializer):
     attachments = AttachmentSerializer(many=True, read_only=True)
@@ -0,0 +1,72 @@
+"""
+Rendered pages of a user's KT session list, cached under a per-user generation.
+
+Every page key embeds the user's current generation number. Any change to one of
+the user's sessions (or to their attachment counters) increments the generation,
+so all cached pages of that user become unreachable at once and simply expire;
+there is never a key scan or a delete per page.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import KTSession
+
+
+def _generation_key(user_id):
+    return f'sessions:generation:{user_id}'
+
+
+def _page_key(user_id, generation, url):
+    # The page URL carries cursor and per_page, and the host the links are built from
+    digest = hashlib.md5(url.encode()).hexdigest()
+    return f'sessions:page:{user_id}:{generation}:{digest}'
+
+
+def current_generation(user_id):
+    """
+    The user's generation number. A missing (evicted) generation restarts from the
+    clock rather than from 1, so it can never match pages cached before the eviction.
+    """
+    key = _generation_key(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(user_id):
+    try:
+        cache.incr(_generation_key(user_id))
+    except ValueError:
+        # No generation yet, nothing can be cached under it
+        pass
+
+
+def bump_generation_on_commit(user_id):
+    transaction.on_commit(lambda: bump_generation(user_id))
+
+
+def bump_session_owner_on_commit(session_id):
+    """For changes that only know the session, e.g. the attachment counters"""
+    def bump():
+        user_id = KTSession.objects.filter(id=session_id).values_list('created_by_id', flat=True).first()
+        if user_id is not None:
+            bump_generation(user_id)
+    transaction.on_commit(bump)
+
+
+def get_page(user_id, generation, url):
+    return cache.get(_page_key(user_id, generation, url))
+
+
+def store_page(user_id, generation, url, payload):
+    """
+    Cache a rendered page under the generation read before the page was queried,
+    so a page racing with a write is stored under an already outdated generation.
+    """
+    cache.set(_page_key(user_id, generation, url), payload, settings.KT_SESSION_LIST_CACHE_TTL)
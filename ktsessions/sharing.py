@@ -0,0 +1,266 @@
+import uuid
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache  # Redis cache
+from django.utils import timezone
+
+from .models import KTSession
+from .redis_async import get_async_redis
+
+SHARE_TOKEN_TTL = 60 * 10  # 10 minutes
+
+# Sets the session->token key only if it does not exist yet and, when it wins,
+# writes the token->session key with the same TTL in the same step.
+# Returns the token that ended up owning the session.
+_CLAIM_SCRIPT = """
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'EX', ARGV[3]) then
+    redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+    return ARGV[1]
+end
+return redis.call('GET', KEYS[1])
+"""
+
+# Resolves token -> session -> rendered payload in a single round trip.
+# Returns nil for an unknown token, otherwise {session_id, payload, version, etag}.
+_FETCH_PAYLOAD_SCRIPT = """
+local session_id = redis.call('GET', KEYS[1])
+if not session_id then
+    return nil
+end
+return {
+    session_id,
+    redis.call('GET', ARGV[1] .. session_id),
+    redis.call('GET', ARGV[2] .. session_id),
+    redis.call('GET', ARGV[3] .. session_id)
+}
+"""
+
+# Stores a rendered payload only if no invalidation happened since it was read
+_STORE_PAYLOAD_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '') == ARGV[2] then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+    redis.call('SET', KEYS[3], ARGV[4], 'EX', ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+def _redis_client():
+    """Return the django-redis client behind the cache, or None for other backends"""
+    client = getattr(cache, 'client', None)
+    if client is None or not hasattr(client, 'get_client'):
+        return None
+    return client
+
+
+def _session_key(session_id):
+    return f'share:session:{session_id}'
+
+
+def _token_key(token):
+    return f'share:token:{token}'
+
+
+def _payload_key(session_id):
+    return f'share:payload:{session_id}'
+
+
+def _version_key(session_id):
+    return f'share:version:{session_id}'
+
+
+def _etag_key(session_id):
+    return f'share:etag:{session_id}'
+
+
+def _claim(session_id, token, ttl):
+    """
+    Atomically publish `token` as the share token of `session_id`.
+    If another request got there first, its token is returned instead.
+    """
+    client = _redis_client()
+    if client is None:
+        # Non-Redis cache backend (e.g. locmem in local development)
+        if cache.add(_session_key(session_id), token, timeout=ttl):
+            cache.set(_token_key(token), session_id, timeout=ttl)
+            return token
+        return cache.get(_session_key(session_id))
+
+    redis = client.get_client(write=True)
+    winner = redis.eval(
+        _CLAIM_SCRIPT, 2,
+        cache.make_and_validate_key(_session_key(session_id)),
+        cache.make_and_validate_key(_token_key(token)),
+        client.encode(token), client.encode(session_id), ttl,
+    )
+    return client.decode(winner) if winner is not None else None
+
+
+def get_or_create_share_token(session):
+    """
+    Return the live share token for a session, minting one if needed.
+    Costs a single cache GET when the session already has a token.
+    """
+    token = cache.get(_session_key(session.id))
+    if token:
+        return token
+
+    # Reuse the token stored on the session while it is still valid, so the
+    # link survives the index being evicted from Redis.
+    now = timezone.now()
+    expires_at = session.share_token_expires_at
+    if session.share_token and expires_at and expires_at > now:
+        candidate = str(session.share_token)
+        ttl = max(int((expires_at - now).total_seconds()), 1)
+    else:
+        candidate = str(uuid.uuid4())
+        ttl = SHARE_TOKEN_TTL
+
+    token = _claim(session.id, candidate, ttl)
+    if token is None:
+        # Key expired between SET NX and GET; retry once with a fresh claim
+        token = _claim(session.id, candidate, ttl)
+
+    if token == candidate and str(session.share_token) != candidate:
+        session.share_token = candidate
+        session.share_token_expires_at = now + timedelta(seconds=ttl)
+        session.save(update_fields=['share_token', 'share_token_expires_at'])
+    return token
+
+
+def resolve_share_token(token):
+    """
+    Return the session id a share token points to, or None if it is invalid or expired.
+    """
+    session_id = cache.get(_token_key(token))
+    if session_id:
+        return session_id
+
+    # Durable fallback: the index may have been evicted while the token is still valid
+    try:
+        uuid.UUID(str(token))
+    except ValueError:
+        return None
+
+    now = timezone.now()
+    row = KTSession.objects.filter(
+        share_token=token, share_token_expires_at__gt=now
+    ).values_list('id', 'share_token_expires_at').first()
+    if not row:
+        return None
+
+    session_id, expires_at = row
+    ttl = max(int((expires_at - now).total_seconds()), 1)
+    _claim(session_id, str(token), ttl)
+    return session_id
+
+
+def fetch_share_payload(token):
+    """
+    Look up the session and its cached public payload for a share token.
+    Returns (session_id, payload, version, etag); session_id is None when the token
+    is not in the index and payload is None when nothing is cached yet.
+    """
+    client = _redis_client()
+    if client is None:
+        session_id = cache.get(_token_key(token))
+        if not session_id:
+            return None, None, None, None
+        cached = cache.get_many([_payload_key(session_id), _etag_key(session_id)])
+        return (
+            session_id, cached.get(_payload_key(session_id)), cache.get(_version_key(session_id), ''),
+            cached.get(_etag_key(session_id)),
+        )
+
+    result = client.get_client(write=False).eval(_FETCH_PAYLOAD_SCRIPT, 1, *_fetch_payload_keys(token))
+    return _decode_fetched_payload(client, result)
+
+
+async def afetch_share_payload(token):
+    """fetch_share_payload over the async Redis client"""
+    client = _redis_client()
+    if client is None:
+        return await sync_to_async(fetch_share_payload)(token)
+    result = await get_async_redis().eval(_FETCH_PAYLOAD_SCRIPT, 1, *_fetch_payload_keys(token))
+    return _decode_fetched_payload(client, result)
+
+
+def _fetch_payload_keys(token):
+    return (
+        cache.make_and_validate_key(_token_key(token)),
+        cache.make_and_validate_key(_payload_key('')),
+        cache.make_and_validate_key(_version_key('')),
+        cache.make_and_validate_key(_etag_key('')),
+    )
+
+
+def _decode_fetched_payload(client, result):
+    if not result:
+        return None, None, None, None
+    session_id, payload, version, etag = result
+    return (
+        client.decode(session_id),
+        client.decode(payload) if payload is not None else None,
+        version.decode() if version is not None else '',
+        client.decode(etag) if etag is not None else None,
+    )
+
+
+def store_share_payload(session_id, payload, version, etag):
+    """
+    Cache the rendered public payload of a session together with its ETag.
+    `version` is the value returned by fetch_share_payload before the payload
+    was built; the write is dropped if the session was invalidated since.
+    """
+    client = _redis_client()
+    if client is None:
+        if cache.get(_version_key(session_id), '') == version:
+            cache.set_many({_payload_key(session_id): payload, _etag_key(session_id): etag}, timeout=SHARE_TOKEN_TTL)
+        return
+
+    client.get_client(write=True).eval(
+        _STORE_PAYLOAD_SCRIPT, 3, *_store_payload_args(client, session_id, payload, version, etag)
+    )
+
+
+async def astore_share_payload(session_id, payload, version, etag):
+    """store_share_payload over the async Redis client"""
+    client = _redis_client()
+    if client is None:
+        return await sync_to_async(store_share_payload)(session_id, payload, version, etag)
+    await get_async_redis().eval(
+        _STORE_PAYLOAD_SCRIPT, 3, *_store_payload_args(client, session_id, payload, version, etag)
+    )
+
+
+def _store_payload_args(client, session_id, payload, version, etag):
+    return (
+        cache.make_and_validate_key(_payload_key(session_id)),
+        cache.make_and_validate_key(_version_key(session_id)),
+        cache.make_and_validate_key(_etag_key(session_id)),
+        client.encode(payload), version or '', SHARE_TOKEN_TTL, client.encode(etag),
+    )
+
+
+def invalidate_share_payload(session_id):
+    """Drop the cached public payload and ETag of a session and bump its version"""
+    client = _redis_client()
+    if client is None:
+        try:
+            cache.incr(_version_key(session_id))
+        except ValueError:
+            cache.set(_version_key(session_id), 1, timeout=SHARE_TOKEN_TTL * 2)
+        cache.delete_many([_payload_key(session_id), _etag_key(session_id)])
+        return
+
+    version_key = cache.make_and_validate_key(_version_key(session_id))
+    pipe = client.get_client(write=True).pipeline()
+    pipe.incr(version_key)
+    pipe.expire(version_key, SHARE_TOKEN_TTL * 2)
+    pipe.delete(
+        cache.make_and_validate_key(_payload_key(session_id)),
+        cache.make_and_validate_key(_etag_key(session_id)),
+    )
+    pipe.execute()
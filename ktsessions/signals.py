@@ -0,0 +1,61 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .counters import attachment_added, attachment_removed, touch_session
+from .models import SHARE_TOKEN_FIELDS, Attachment, KTSession
+from .search import remove_attachment
+from .session_list_cache import bump_generation_on_commit
+from .sharing import invalidate_share_payload
+
+# Attachment columns that are never part of an API response
+INTERNAL_ATTACHMENT_FIELDS = {'claimed_at', 'content_hash', 'search_vector'}
+
+
+def _invalidate_on_commit(session_id):
+    transaction.on_commit(lambda: invalidate_share_payload(session_id))
+
+
+@receiver(post_save, sender=KTSession)
+@receiver(post_delete, sender=KTSession)
+def invalidate_session_payload(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= SHARE_TOKEN_FIELDS:
+        return
+    _invalidate_on_commit(instance.id)
+
+
+@receiver(post_save, sender=KTSession)
+@receiver(post_delete, sender=KTSession)
+def bump_session_list_generation(sender, instance, **kwargs):
+    # Every listed field, including share_token, can change here
+    bump_generation_on_commit(instance.created_by_id)
+
+
+@receiver(post_save, sender=Attachment)
+def count_created_attachment(sender, instance, created, **kwargs):
+    if created:
+        attachment_added(instance.session_id, instance.status)
+
+
+@receiver(post_delete, sender=Attachment)
+def count_deleted_attachment(sender, instance, **kwargs):
+    attachment_removed(instance.session_id, instance.status)
+
+
+@receiver(post_save, sender=Attachment)
+def bump_attachment_session_revision(sender, instance, created, update_fields=None, **kwargs):
+    # Creations and deletions bump it with the counters
+    if created or (update_fields and set(update_fields) <= INTERNAL_ATTACHMENT_FIELDS):
+        return
+    touch_session(instance.session_id)
+
+
+@receiver(post_save, sender=Attachment)
+@receiver(post_delete, sender=Attachment)
+def invalidate_attachment_payload(sender, instance, **kwargs):
+    _invalidate_on_commit(instance.session_id)
+
+
+@receiver(post_delete, sender=Attachment)
+def remove_attachment_search_document(sender, instance, **kwargs):
+    remove_attachment(instance.id)
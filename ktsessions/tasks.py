@@ -1,42 +1,241 @@
-from celery import shared_task
-import time
+import logging
+from datetime import timedelta
+
+from celery import chord, shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Now
+from django.utils import timezone
+from .content_store import text_columns
+from .counters import status_changed
+from .deletion import purge_session
+from .events import publish_status
 from .models import Attachment
+from .outbox import drain, enqueue_processing
+from .processing import content_hash, get_transcriber, merge_segments, split_segments
+from .result_cache import lookup_result, store_result
+from .search import index_attachment
+from .sharing import invalidate_share_payload
+from .telemetry import AttachmentTimer, finished, start_timing
 
+logger = logging.getLogger(__name__)
 
-@shared_task
-def process_attachment(attachment_id):
+MAX_RETRIES = 3
+RETRY_BACKOFF = 30  # seconds, doubled on every retry
+RETRY_BACKOFF_MAX = 600
+
+
+def _transition(attachment_id, from_status, to_status, **fields):
+    """
+    Move an attachment from one status to another with a conditional UPDATE and
+    adjust the session counters in the same transaction.
+    Returns the session id, or None if the attachment was not in from_status.
+    """
+    with transaction.atomic():
+        moved = Attachment.objects.filter(id=attachment_id, status=from_status).update(
+            status=to_status, updated_at=Now(), **fields
+        )
+        if not moved:
+            return None
+        session_id = Attachment.objects.filter(id=attachment_id).values_list('session_id', flat=True).first()
+        status_changed(session_id, from_status, to_status)
+    return session_id
+
+
+def _stale_claims():
+    """Attachments left in 'processing' by a worker that stopped renewing its claim"""
+    expired = timezone.now() - timedelta(seconds=settings.KT_PROCESSING_LEASE)
+    # Rows claimed before claimed_at existed have no lease at all
+    return Attachment.objects.filter(Q(claimed_at__lt=expired) | Q(claimed_at__isnull=True), status='processing')
+
+
+def _claim(attachment_id):
+    """
+    Move pending -> processing, or take over a processing attachment whose claim has
+    expired: acks_late redelivers the job of a worker that died after claiming it.
+    Returns the session id, or None if the attachment cannot be claimed.
+    """
+    session_id = _transition(attachment_id, 'pending', 'processing', claimed_at=Now())
+    if session_id is None and _stale_claims().filter(id=attachment_id).update(claimed_at=Now(), updated_at=Now()):
+        # Already counted as processing
+        session_id = Attachment.objects.filter(id=attachment_id).values_list('session_id', flat=True).first()
+        logger.warning('Attachment %s: took over an expired processing claim', attachment_id,
+                       extra={'attachment_id': attachment_id})
+    return session_id
+
+
+def _renew_claim(attachment_id):
+    Attachment.objects.filter(id=attachment_id, status='processing').update(claimed_at=Now())
+
+
+def _finish_attachment(attachment_id, transcript, summary):
+    """
+    Store the result and move processing -> done.
+    Returns False if the attachment was no longer being processed.
+    """
+    session_id = _transition(
+        attachment_id, 'processing', 'done', **text_columns(transcript=transcript, summary=summary)
+    )
+    if session_id is None:
+        return False
+    index_attachment(attachment_id)
+    # update() skips post_save, so drop the cached share payload explicitly
+    invalidate_share_payload(session_id)
+    publish_status(session_id, attachment_id, 'done')
+    return True
+
+
+def _fail_attachment(attachment_id):
+    """
+    Move processing -> failed and announce it.
+    Returns False if the attachment was no longer being processed.
     """
-    Process attachment: change status to processing, wait, then mark as finished
+    session_id = _transition(attachment_id, 'processing', 'failed')
+    if session_id is None:
+        return False
+    publish_status(session_id, attachment_id, 'failed')
+    return True
+
+
+@shared_task(bind=True, acks_late=True, max_retries=MAX_RETRIES)
+def process_attachment(self, attachment_id):
+    """
+    Process attachment: reuse the result of identical media if there is one,
+    otherwise probe the media, split it into time segments and fan the segments
+    out to transcribe_segment; merge_transcript runs once all are done
     """
+    # Claim the job: only one delivery can move pending -> processing, so a
+    # duplicate costs a conditional UPDATE or two; an expired claim is taken over
+    session_id = _claim(attachment_id)
+    if session_id is None:
+        return f"Attachment {attachment_id} not pending, skipping"
+    logger.info('Attachment %s: processing', attachment_id, extra={'attachment_id': attachment_id})
+    publish_status(session_id, attachment_id, 'processing')
+
+    timer = AttachmentTimer(attachment_id)
     try:
-        attachment = Attachment.objects.get(id=attachment_id)
+        attachment = Attachment.objects.only('id', 'session_id', 'file_type', 'file_url').get(id=attachment_id)
+        start_timing(attachment_id, attachment.file_type, self.request)
+        timer.file_type = attachment.file_type
 
-        # Update status to processing
-        print(f"Processing attachment {attachment_id}", flush=True)
-        attachment.status = 'processing'
+        transcriber = get_transcriber()
+        with timer.stage('hash'):
+            attachment.content_hash = content_hash(transcriber, attachment.file_url)
+        attachment.save(update_fields=['content_hash'])
+        with timer.stage('lookup'):
+            cached = lookup_result(attachment.content_hash)
+        if cached is not None:
+            # Same media was processed before: reuse its transcript and summary
+            _finish_attachment(attachment_id, *cached)
+            timer.flush(cached=True, **finished('done'))
+            logger.info('Attachment %s: done from a cached result', attachment_id,
+                        extra={'attachment_id': attachment_id, 'cached': True})
+            return f"Attachment {attachment_id} processed from cache"
 
-        attachment.save()
-        print(f"Attachment {attachment_id} updated to processing", flush=True)
+        with timer.stage('probe'):
+            duration = transcriber.probe(attachment.file_url, attachment.file_type)
+        segments = split_segments(duration, settings.KT_SEGMENT_SECONDS)
+        logger.info('Attachment %s: split into %d segments', attachment_id, len(segments),
+                    extra={'attachment_id': attachment_id, 'segments': len(segments)})
 
-        # Simulate processing time (1 minute)
-        time.sleep(10)
-        attachment.transcript = 'demo transcript'
-        attachment.summary = 'demo summary'
-        # Update status to finished
-        attachment.status = 'done'
-        attachment.save()
-        print(f"Attachment {attachment_id} updated to done")
+        with timer.stage('dispatch'):
+            # Hashing and probing took part of the lease, the segments start with all of it
+            _renew_claim(attachment_id)
+            chord(
+                transcribe_segment.s(attachment_id, attachment.file_url, attachment.file_type, start, end)
+                for start, end in segments
+            )(merge_transcript.s(attachment_id).on_error(mark_attachment_failed.si(attachment_id)))
+        timer.flush(segments=len(segments))
 
-        return f"Attachment {attachment_id} processed successfully"
+        return f"Attachment {attachment_id} dispatched in {len(segments)} segments"
 
     except Attachment.DoesNotExist:
         return f"Attachment {attachment_id} not found"
     except Exception as e:
-        # If something goes wrong, you might want to set status to 'failed'
-        try:
-            attachment = Attachment.objects.get(id=attachment_id)
-            attachment.status = 'failed'
-            attachment.save()
-        except:
-            pass
-        return f"Error processing attachment {attachment_id}: {str(e)}"
\ No newline at end of file
+        if self.request.retries < self.max_retries:
+            # Release the claim so the retried delivery can take it again
+            _transition(attachment_id, 'processing', 'pending')
+            timer.flush()
+            countdown = min(RETRY_BACKOFF * 2 ** self.request.retries, RETRY_BACKOFF_MAX)
+            logger.warning('Attachment %s: failed, retrying in %ss', attachment_id, countdown, exc_info=True,
+                           extra={'attachment_id': attachment_id, 'retry': self.request.retries + 1})
+            raise self.retry(exc=e, countdown=countdown)
+
+        logger.error('Attachment %s: failed after %d retries', attachment_id, self.request.retries, exc_info=True,
+                     extra={'attachment_id': attachment_id})
+        if _fail_attachment(attachment_id):
+            timer.flush(**finished('failed'))
+        return f"Error processing attachment {attachment_id}: {str(e)}"
+
+
+@shared_task(acks_late=True)
+def transcribe_segment(attachment_id, file_url, file_type, start, end):
+    """Transcribe one time segment of an attachment"""
+    timer = AttachmentTimer(attachment_id, file_type)
+    with timer.stage('transcribe'):
+        text = get_transcriber().transcribe(file_url, file_type, start, end)
+    timer.flush()
+    # Progress keeps the claim of process_attachment alive
+    _renew_claim(attachment_id)
+    return {'start': start, 'end': end, 'text': text}
+
+
+@shared_task(acks_late=True)
+def merge_transcript(segments, attachment_id):
+    """Merge the transcribed segments, summarize and mark the attachment as done"""
+    file_type = Attachment.objects.filter(id=attachment_id).values_list('file_type', flat=True).first()
+    if file_type is None:
+        return f"Attachment {attachment_id} not found"
+
+    timer = AttachmentTimer(attachment_id, file_type)
+    # Segments may have waited in the queue; keep the claim through the summary
+    _renew_claim(attachment_id)
+    transcript = merge_segments(segments)
+    with timer.stage('summarize'):
+        summary = get_transcriber().summarize(transcript)
+    # Update status to finished
+    if not _finish_attachment(attachment_id, transcript, summary):
+        return f"Attachment {attachment_id} not processing, skipping"
+    timer.flush(**finished('done'))
+    digest = Attachment.objects.filter(id=attachment_id).values_list('content_hash', flat=True).first()
+    if digest:
+        store_result(digest, transcript, summary)
+    logger.info('Attachment %s: done', attachment_id, extra={'attachment_id': attachment_id})
+
+    return f"Attachment {attachment_id} processed successfully"
+
+
+@shared_task
+def mark_attachment_failed(attachment_id):
+    """Errback for the segment chord"""
+    if _fail_attachment(attachment_id):
+        AttachmentTimer(attachment_id).flush(**finished('failed'))
+    logger.error('Attachment %s: a segment failed', attachment_id, extra={'attachment_id': attachment_id})
+
+
+@shared_task(ignore_result=True, acks_late=True)
+def delete_session(session_id):
+    """Remove a session hidden by kt_session_detail DELETE, with its attachments"""
+    deleted = purge_session(session_id)
+    return f"Session {session_id} deleted with {deleted} attachments"
+
+
+@shared_task(ignore_result=True)
+def requeue_stale_attachments():
+    """Periodic: put attachments whose processing claim expired back to pending and queue them again"""
+    requeued = []
+    for attachment_id in _stale_claims().values_list('id', flat=True)[:settings.KT_OUTBOX_BATCH_SIZE]:
+        with transaction.atomic():
+            if _transition(attachment_id, 'processing', 'pending', claimed_at=None) is not None:
+                enqueue_processing([attachment_id])
+                requeued.append(attachment_id)
+                logger.warning('Attachment %s: processing claim expired, requeued', attachment_id,
+                               extra={'attachment_id': attachment_id})
+    return f"Requeued {len(requeued)} attachments"
+
+
+@shared_task(ignore_result=True)
+def drain_outbox():
+    """Periodic fallback for the relay_outbox command"""
+    return drain()
@@ -0,0 +1,210 @@
+"""
+Celery task telemetry.
+
+- every published task carries an `enqueued_at` header (epoch seconds), so the
+  worker can tell how long it sat in the queue
+- task_prerun/postrun/retry feed Prometheus: queue wait, run time by outcome, retries
+- AttachmentTimer measures the stages of the attachment pipeline and accumulates
+  them, with the outcome, into the attachment's AttachmentTiming row
+- processing_stats() reports backlog depth and throughput per file_type
+
+Worker metrics: start the worker with KT_WORKER_METRICS_PORT set to serve them over
+HTTP; with the prefork pool also set PROMETHEUS_MULTIPROC_DIR so the pool processes'
+samples are aggregated.
+"""
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from celery import current_app
+from celery.signals import before_task_publish, task_postrun, task_prerun, task_retry, worker_init
+from django.conf import settings
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Q
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from .instrumentation import metrics_registry, prometheus_client
+from .models import Attachment, AttachmentTiming, OutboxMessage
+
+ENQUEUED_AT_HEADER = 'enqueued_at'
+
+# Transcription and summaries take minutes, not milliseconds
+TASK_BUCKETS = (.01, .05, .1, .5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+if prometheus_client is not None:
+    from prometheus_client import Counter, Histogram
+
+    TASK_QUEUE_WAIT = Histogram(
+        'kt_task_queue_wait_seconds', 'Time between publishing a task and a worker starting it', ['task'],
+        buckets=TASK_BUCKETS
+    )
+    TASK_SECONDS = Histogram(
+        'kt_task_duration_seconds', 'Run time of a task', ['task', 'state'], buckets=TASK_BUCKETS
+    )
+    TASK_RETRIES = Counter('kt_task_retries', 'Task retries', ['task'])
+    STAGE_SECONDS = Histogram(
+        'kt_attachment_stage_seconds', 'Duration of an attachment processing stage', ['stage', 'file_type'],
+        buckets=TASK_BUCKETS
+    )
+
+# perf_counter at task_prerun, by task id
+_started = {}
+
+
+def queue_wait(request):
+    """Seconds the task waited in the queue, None if unknown (eager or unstamped)"""
+    enqueued_at = request.get(ENQUEUED_AT_HEADER)
+    if enqueued_at is None or request.is_eager:
+        return None
+    ready_at = enqueued_at
+    if request.eta:
+        # A retry countdown or ETA is not waiting on a worker
+        ready_at = max(ready_at, datetime.fromisoformat(request.eta).timestamp())
+    return max(time.time() - ready_at, 0.0)
+
+
+@before_task_publish.connect(weak=False, dispatch_uid='kt_telemetry_enqueued_at')
+def stamp_enqueued_at(headers=None, **kwargs):
+    if headers is not None:
+        headers[ENQUEUED_AT_HEADER] = time.time()
+
+
+@task_prerun.connect(weak=False, dispatch_uid='kt_telemetry_prerun')
+def task_started(task_id=None, task=None, **kwargs):
+    _started[task_id] = time.perf_counter()
+    wait = queue_wait(task.request)
+    if wait is not None and prometheus_client is not None:
+        TASK_QUEUE_WAIT.labels(task.name).observe(wait)
+
+
+@task_postrun.connect(weak=False, dispatch_uid='kt_telemetry_postrun')
+def task_finished(task_id=None, task=None, state=None, **kwargs):
+    started = _started.pop(task_id, None)
+    if started is not None and prometheus_client is not None:
+        TASK_SECONDS.labels(task.name, state or 'UNKNOWN').observe(time.perf_counter() - started)
+
+
+@task_retry.connect(weak=False, dispatch_uid='kt_telemetry_retry')
+def task_retried(sender=None, **kwargs):
+    if prometheus_client is not None:
+        TASK_RETRIES.labels(sender.name).inc()
+
+
+@worker_init.connect(weak=False, dispatch_uid='kt_telemetry_worker_metrics')
+def serve_worker_metrics(**kwargs):
+    if settings.KT_WORKER_METRICS_PORT and prometheus_client is not None:
+        prometheus_client.start_http_server(settings.KT_WORKER_METRICS_PORT, registry=metrics_registry())
+
+
+def start_timing(attachment_id, file_type, request):
+    """Open (or, for a retry, reopen) the timing record when process_attachment claims an attachment"""
+    wait = queue_wait(request)
+    wait_ms = round(wait * 1000) if wait is not None else 0
+    AttachmentTiming.objects.update_or_create(
+        attachment_id=attachment_id,
+        create_defaults={'file_type': file_type, 'started_at': timezone.now(), 'queue_wait_ms': wait_ms},
+        defaults={'queue_wait_ms': F('queue_wait_ms') + wait_ms, 'retries': F('retries') + 1},
+    )
+
+
+def finished(outcome):
+    """AttachmentTimer.flush() fields closing the record"""
+    return {
+        'outcome': outcome,
+        'finished_at': Now(),
+        'processing_time': ExpressionWrapper(Now() - F('started_at'), output_field=DurationField()),
+    }
+
+
+class AttachmentTimer:
+    """Stage durations of one task run for an attachment, written by a single UPDATE in flush()"""
+
+    def __init__(self, attachment_id, file_type=None):
+        self.attachment_id = attachment_id
+        self.file_type = file_type or 'unknown'
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+            if prometheus_client is not None:
+                STAGE_SECONDS.labels(name, self.file_type).observe(elapsed)
+
+    def flush(self, **fields):
+        updates = {f'{name}_ms': F(f'{name}_ms') + round(seconds * 1000) for name, seconds in self.stages.items()}
+        updates.update(fields)
+        if updates:
+            AttachmentTiming.objects.filter(attachment_id=self.attachment_id).update(**updates)
+        self.stages = {}
+
+
+def broker_queue_depth():
+    """Messages waiting in the default Celery queue, None if the broker cannot tell"""
+    try:
+        with current_app.connection_for_read() as connection:
+            connection.ensure_connection(max_retries=1)
+            queue = current_app.conf.task_default_queue
+            return connection.default_channel.queue_declare(queue=queue, passive=True).message_count
+    except Exception:
+        return None
+
+
+def _empty_stats():
+    return {
+        'pending': 0, 'processing': 0, 'done': 0, 'failed': 0, 'per_minute': 0.0,
+        'avg_queue_wait_ms': None, 'avg_processing_ms': None,
+    }
+
+
+def processing_stats(window):
+    """
+    Backlog and throughput per file_type over the last `window` (a timedelta):
+    pending/processing attachments now, and attachments finished in the window
+    with their rate and average queue wait / processing time.
+    """
+    since = timezone.now() - window
+    file_types = {file_type: _empty_stats() for file_type, _ in Attachment.FILE_TYPE_CHOICES}
+
+    backlog = (
+        Attachment.objects.filter(status__in=['pending', 'processing'])
+        .values('file_type', 'status').annotate(count=Count('id')).order_by()
+    )
+    for row in backlog:
+        file_types.setdefault(row['file_type'], _empty_stats())[row['status']] = row['count']
+
+    throughput = (
+        AttachmentTiming.objects.filter(finished_at__gte=since)
+        .values('file_type')
+        .annotate(
+            done=Count('pk', filter=Q(outcome='done')),
+            failed=Count('pk', filter=Q(outcome='failed')),
+            queue_wait=Avg('queue_wait_ms'),
+            processing=Avg('processing_time'),
+        )
+        .order_by()
+    )
+    minutes = window.total_seconds() / 60
+    for row in throughput:
+        file_types.setdefault(row['file_type'], _empty_stats()).update({
+            'done': row['done'],
+            'failed': row['failed'],
+            'per_minute': round((row['done'] + row['failed']) / minutes, 3),
+            'avg_queue_wait_ms': round(row['queue_wait']) if row['queue_wait'] is not None else None,
+            'avg_processing_ms': (
+                round(row['processing'] / timedelta(milliseconds=1)) if row['processing'] is not None else None
+            ),
+        })
+
+    return {
+        'window_seconds': int(window.total_seconds()),
+        'queue_depth': {
+            'broker': broker_queue_depth(),
+            'outbox': OutboxMessage.objects.count(),
+        },
+        'file_types': file_types,
+    }
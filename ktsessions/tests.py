@@ -1,3 +1,1133 @@
-from django.test import TestCase
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from django_redis import get_redis_connection
+from fakeredis.aioredis import FakeRedis as FakeAsyncRedis
+from prometheus_client import REGISTRY
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from authentication.models import CustomUser
+
+from . import async_views, events
+from .attachment_fields import ATTACHMENT_FIELDS, attachment_queryset, attachment_to_dict, serialize_attachments
+from .content_store import get_texts, put_text, put_texts, read_range
+from .events import publish_status
+from .models import Attachment, AttachmentTiming, ContentFrame, KTSession, OutboxMessage, ProcessingResult
+from .outbox import relay_batch
+from .processing import LocalTranscriber, merge_segments, split_segments
+from .renderers import ORJSONRenderer, render_json
+from .serializers import KTSessionUpdateSerializer
+from .sharing import get_or_create_share_token, resolve_share_token
+from .tasks import (
+    MAX_RETRIES,
+    _claim,
+    _stale_claims,
+    delete_session,
+    merge_transcript,
+    process_attachment,
+    requeue_stale_attachments
+)
+
+
+class SessionTestCase(TestCase):
+    def setUp(self):
+        # Cached tokens and payloads would outlive the rolled back rows
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            username='owner@example.com', email='owner@example.com', name='owner', password='owner-password'
+        )
+        self.session = KTSession.objects.create(title='KT', description='handover', created_by=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def add_attachment(self, **fields):
+        fields = {'file_type': 'text', 'file_url': 'https://example.com/media/notes.txt', **fields}
+        return Attachment.objects.create(session=self.session, **fields)
+
+
+class ShareTokenTests(SessionTestCase):
+    def test_token_is_reused(self):
+        token = get_or_create_share_token(self.session)
+
+        self.assertEqual(get_or_create_share_token(self.session), token)
+        self.assertEqual(resolve_share_token(token), self.session.id)
+        self.session.refresh_from_db()
+        self.assertEqual(str(self.session.share_token), token)
+
+    def test_sharing_url_resolves(self):
+        response = self.client.get(f'/api/kt-sessions/get_sharing_url/{self.session.id}/')
+        self.assertEqual(response.status_code, 200, response.content)
+
+        response = self.client.get('/api' + response.json()['share_url'] + '/')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['title'], 'KT')
+
+    def test_stored_token_survives_eviction(self):
+        token = get_or_create_share_token(self.session)
+        cache.clear()
+
+        self.assertEqual(resolve_share_token(token), self.session.id)
+        self.assertEqual(get_or_create_share_token(KTSession.objects.get(id=self.session.id)), token)
+
+    def test_expired_and_unknown_tokens(self):
+        token = get_or_create_share_token(self.session)
+        cache.clear()
+        KTSession.objects.filter(id=self.session.id).update(share_token_expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertIsNone(resolve_share_token(token))
+        self.assertIsNone(resolve_share_token('not-a-token'))
+        self.assertEqual(self.client.get('/api/kt-sessions/get_by_url/not-a-token/').status_code, 404)
+
+
+class SharePayloadTests(SessionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = f'/api/kt-sessions/get_by_url/{get_or_create_share_token(self.session)}/'
+
+    def test_warm_payload_needs_no_query(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['title'], 'KT')
+
+    def test_session_change_drops_payload(self):
+        self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.session.description = 'edited'
+            self.session.save()
+
+        self.assertEqual(self.client.get(self.url).json()['description'], 'edited')
+
+    def test_new_attachment_drops_payload(self):
+        self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_attachment()
+
+        self.assertEqual(len(self.client.get(self.url).json()['attachments']), 1)
+
+
+class CursorPaginationTests(SessionTestCase):
+    def test_pages_cover_every_attachment_once(self):
+        ids = [self.add_attachment().id for _ in range(5)]
+
+        seen, url = [], f'/api/attachments/?session_id={self.session.id}&per_page=2&cursor='
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            seen += [attachment['id'] for attachment in response.json()['attachments']]
+            url = response.json()['pagination']['next']
+
+        self.assertEqual(seen, ids[::-1])
+
+    def test_previous_link_returns_the_page_before(self):
+        for _ in range(4):
+            self.add_attachment()
+        first = self.client.get(f'/api/attachments/?session_id={self.session.id}&per_page=2&cursor=').json()
+        second = self.client.get(first['pagination']['next']).json()
+
+        previous = self.client.get(second['pagination']['previous']).json()
+        self.assertEqual(previous['attachments'], first['attachments'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/attachments/?cursor=not-a-cursor')
+
+        self.assertEqual(response.status_code, 400)
+
+
+class SparseFieldsetTests(SessionTestCase):
+    def test_fields_selects_keys(self):
+        attachment = self.add_attachment(transcript='long transcript', summary='short')
+
+        response = self.client.get(f'/api/attachments/{attachment.id}/?fields=id,status')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json(), {'id': attachment.id, 'status': 'pending'})
+
+    def test_exclude_drops_keys(self):
+        self.add_attachment(transcript='long transcript', summary='short')
+
+        response = self.client.get(f'/api/attachments/?session_id={self.session.id}&exclude=transcript,summary')
+        self.assertEqual(response.status_code, 200, response.content)
+        attachment = response.json()['attachments'][0]
+        self.assertNotIn('transcript', attachment)
+        self.assertNotIn('summary', attachment)
+        self.assertEqual(attachment['file_type'], 'text')
+
+    def test_unknown_field(self):
+        attachment = self.add_attachment()
+
+        self.assertEqual(self.client.get(f'/api/attachments/{attachment.id}/?fields=id,secret').status_code, 400)
+
+    def test_transcript_endpoint_streams_text(self):
+        attachment = self.add_attachment(transcript='héllo ' * 20000)
+
+        response = self.client.get(f'/api/attachments/{attachment.id}/transcript/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content).decode(), 'héllo ' * 20000)
+
+
+class BulkCreateTests(SessionTestCase):
+    def item(self, **fields):
+        return {'session_id': self.session.id, 'file_type': 'audio', 'file_url': 'https://example.com/media/a.mp3', **fields}
+
+    def test_creates_every_item(self):
+        response = self.client.post('/api/attachments/bulk/', [self.item() for _ in range(3)], format='json')
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(Attachment.objects.filter(session=self.session).count(), 3)
+        self.assertEqual([result['index'] for result in response.json()['results']], [0, 1, 2])
+
+    def test_reports_errors_per_item(self):
+        response = self.client.post('/api/attachments/bulk/', [
+            self.item(), self.item(file_type='exe'), self.item(session_id=self.session.id + 100), 'not an object',
+        ], format='json')
+
+        self.assertEqual(response.status_code, 207, response.content)
+        results = response.json()['results']
+        self.assertIn('attachment', results[0])
+        self.assertIn('file_type', results[1]['error'])
+        self.assertEqual(results[2]['error'], 'Session not found')
+        self.assertEqual(results[3]['error'], 'Expected an object')
+        self.assertEqual(Attachment.objects.count(), 1)
+
+    def test_texts_are_stored_in_one_write(self):
+        def statements(count):
+            items = [self.item(transcript=f'handover {count} {n}', summary=f'summary {count} {n}') for n in range(count)]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/api/attachments/bulk/', items, format='json')
+            self.assertEqual(response.status_code, 201, response.content)
+            return [query['sql'] for query in queries if 'SAVEPOINT' not in query['sql']]
+
+        # The first request also loads the user
+        statements(1)
+        few, many = statements(2), statements(8)
+
+        self.assertEqual(len(many), len(few), many)
+        attachment = Attachment.objects.filter(session=self.session).order_by('id').last()
+        self.assertEqual((attachment.transcript, attachment.summary), ('handover 8 7', 'summary 8 7'))
+
+    def test_nothing_valid(self):
+        response = self.client.post('/api/attachments/bulk/', [self.item(file_url='not a url')], format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Attachment.objects.exists())
+        self.assertEqual(self.client.post('/api/attachments/bulk/', [], format='json').status_code, 400)
+
+
+class FailingTranscriber(LocalTranscriber):
+    def transcribe(self, file_url, file_type, start, end):
+        raise RuntimeError('transcriber down')
+
+
+@override_settings(KT_LOCAL_TRANSCRIBER_DELAY=0, KT_LOCAL_MEDIA_DURATION=900, KT_SEGMENT_SECONDS=300)
+class SegmentProcessingTests(SessionTestCase):
+    def test_split_segments(self):
+        self.assertEqual(split_segments(900, 300), [(0, 300), (300, 600), (600, 900)])
+        self.assertEqual(split_segments(1000, 300)[-1], (900, 1000))
+        self.assertEqual(split_segments(None, 300), [(0, None)])
+
+    def test_merge_orders_segments(self):
+        merged = merge_segments([
+            {'start': 300, 'end': 600, 'text': 'second'}, {'start': 0, 'end': 300, 'text': 'first'},
+        ])
+
+        self.assertEqual(merged, '[00:00:00] first\n[00:05:00] second')
+
+    def test_media_is_transcribed_in_segments(self):
+        attachment = self.add_attachment(file_type='audio')
+
+        process_attachment.delay(attachment.id)
+
+        attachment = Attachment.objects.get(id=attachment.id)
+        self.assertEqual(attachment.status, 'done')
+        self.assertEqual(
+            [line[:10] for line in attachment.transcript.splitlines()], ['[00:00:00]', '[00:05:00]', '[00:10:00]']
+        )
+        self.assertTrue(attachment.summary)
+
+    def test_document_is_one_segment(self):
+        attachment = self.add_attachment(file_type='pdf')
+
+        process_attachment.delay(attachment.id)
+
+        attachment = Attachment.objects.get(id=attachment.id)
+        self.assertEqual(attachment.status, 'done')
+        self.assertNotIn('[00:00:00]', attachment.transcript)
+
+    @override_settings(KT_TRANSCRIBER='ktsessions.tests.FailingTranscriber')
+    def test_failed_segment_fails_the_attachment(self):
+        attachment = self.add_attachment(file_type='video')
+
+        # Run it as the last retry: where eager tasks propagate errors (benchmarks.settings)
+        # an earlier attempt would raise Retry instead of retrying inline
+        process_attachment.apply(args=[attachment.id], retries=MAX_RETRIES)
+
+        self.assertEqual(Attachment.objects.get(id=attachment.id).status, 'failed')
+
+
+@override_settings(KT_LOCAL_TRANSCRIBER_DELAY=0)
+class DeduplicationTests(SessionTestCase):
+    def test_same_media_reuses_the_result(self):
+        first = self.add_attachment(file_type='audio', file_url='https://example.com/media/same.mp3')
+        process_attachment.delay(first.id)
+        second = self.add_attachment(file_type='audio', file_url='https://example.com/media/same.mp3')
+
+        with override_settings(KT_TRANSCRIBER='ktsessions.tests.FailingTranscriber'):
+            process_attachment.delay(second.id)
+
+        first, second = Attachment.objects.get(id=first.id), Attachment.objects.get(id=second.id)
+        self.assertEqual(second.status, 'done')
+        self.assertEqual(second.content_hash, first.content_hash)
+        self.assertEqual((second.transcript, second.summary), (first.transcript, first.summary))
+        self.assertEqual(ProcessingResult.objects.get(content_hash=first.content_hash).hit_count, 1)
+
+    def test_other_media_is_processed(self):
+        first = self.add_attachment(file_type='pdf', file_url='https://example.com/media/one.pdf')
+        second = self.add_attachment(file_type='pdf', file_url='https://example.com/media/two.pdf')
+        process_attachment.delay(first.id)
+        process_attachment.delay(second.id)
+
+        first, second = Attachment.objects.get(id=first.id), Attachment.objects.get(id=second.id)
+        self.assertNotEqual(first.content_hash, second.content_hash)
+        self.assertNotEqual(first.transcript, second.transcript)
+        self.assertEqual(ProcessingResult.objects.count(), 2)
+
+
+@override_settings(KT_LOCAL_TRANSCRIBER_DELAY=0)
+class ClaimTests(SessionTestCase):
+    def test_duplicate_delivery_only_tries_to_claim(self):
+        attachment = self.add_attachment(status='processing', claimed_at=timezone.now())
+
+        with CaptureQueriesContext(connection) as queries:
+            process_attachment.delay(attachment.id)
+        # atomic() only adds savepoints inside the test transaction
+        statements = [query['sql'] for query in queries if 'SAVEPOINT' not in query['sql']]
+        # pending -> processing, then the takeover of an expired claim
+        self.assertEqual(len(statements), 2, statements)
+        self.assertEqual(Attachment.objects.get(id=attachment.id).status, 'processing')
+
+    def test_done_attachment_is_not_reprocessed(self):
+        attachment = self.add_attachment(status='done', transcript='kept')
+
+        process_attachment.delay(attachment.id)
+
+        self.assertEqual(Attachment.objects.get(id=attachment.id).transcript, 'kept')
+
+
+class OutboxTests(SessionTestCase):
+    def test_create_queues_job_in_the_outbox(self):
+        response = self.client.post('/api/attachments/create/', {
+            'session_id': self.session.id, 'file_type': 'audio', 'file_url': 'https://example.com/media/a.mp3',
+        }, format='json')
+
+        self.assertEqual(response.status_code, 201, response.content)
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.task, 'ktsessions.tasks.process_attachment')
+        self.assertEqual(message.args, [response.json()['id']])
+        self.assertEqual(Attachment.objects.get().status, 'pending')
+
+    def test_relay_publishes_and_deletes_a_batch(self):
+        OutboxMessage.objects.bulk_create(
+            OutboxMessage(task='ktsessions.tasks.process_attachment', args=[attachment_id])
+            for attachment_id in range(1, 4)
+        )
+
+        self.assertEqual(relay_batch(2), 2)
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+        self.assertEqual(relay_batch(2), 1)
+        self.assertEqual(relay_batch(2), 0)
+
+
+class StatusEventTests(SessionTestCase):
+    def test_publish_reaches_session_channel(self):
+        pubsub = get_redis_connection('default').pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(f'kt:session:{self.session.id}:attachments')
+
+        publish_status(self.session.id, 7, 'done')
+
+        # The first read consumes the subscribe confirmation
+        message = pubsub.get_message(timeout=1) or pubsub.get_message(timeout=1)
+        self.assertEqual(json.loads(message['data']), {'attachment_id': 7, 'status': 'done'})
+        pubsub.close()
+
+    def stream(self, query=''):
+        # The stream is only served over ASGI
+        return async_to_sync(AsyncClient().get)(f'/api/kt-sessions/{self.session.id}/events/{query}')
+
+    def test_stream_needs_asgi(self):
+        token = AccessToken.for_user(self.user)
+
+        response = self.client_class().get(f'/api/kt-sessions/{self.session.id}/events/?token={token}')
+        self.assertEqual(response.status_code, 501)
+
+    def test_stream_needs_a_token(self):
+        self.assertEqual(self.stream().status_code, 401)
+
+    def test_stream_of_another_users_session(self):
+        other = CustomUser.objects.create_user(
+            username='other@example.com', email='other@example.com', name='other', password='other-password'
+        )
+        token = AccessToken.for_user(other)
+
+        self.assertEqual(self.stream(f'?token={token}').status_code, 404)
+
+    def test_hub_is_closed_when_its_loop_shuts_down(self):
+        async def subscribe():
+            hub = events._hubs[asyncio.get_running_loop()] = events.StatusHub(FakeAsyncRedis())
+            await hub.subscribe(self.session.id)
+            return hub
+
+        hub = asyncio.run(subscribe())
+
+        self.assertEqual(len(events._hubs), 0)
+        self.assertIsNone(hub.pubsub.connection)
+
+
+class AsyncReadTests(SessionTestCase):
+    def async_get(self, view, path, **kwargs):
+        request = RequestFactory().get(path, HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        return async_to_sync(view)(request, **kwargs)
+
+    def test_attachment_list_matches_sync_view(self):
+        for _ in range(3):
+            self.add_attachment(transcript='text')
+
+        for query in ('per_page=2', 'per_page=2&cursor=', 'fields=id,status&page=2&per_page=2'):
+            path = f'/api/attachments/?session_id={self.session.id}&{query}'
+            response = self.async_get(async_views.get_attachments, path)
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertEqual(json.loads(response.content), self.client.get(path).json())
+
+    def test_attachment_matches_sync_view(self):
+        attachment = self.add_attachment(transcript='text', summary='short')
+        path = f'/api/attachments/{attachment.id}/?exclude=transcript'
+
+        response = self.async_get(async_views.get_attachment, path, attachment_id=attachment.id)
+        self.assertEqual(json.loads(response.content), self.client.get(path).json())
+        missing = self.async_get(async_views.get_attachment, path, attachment_id=attachment.id + 1)
+        self.assertEqual(missing.status_code, 404)
+
+    def test_unauthenticated(self):
+        request = RequestFactory().get('/api/attachments/')
+
+        self.assertEqual(async_to_sync(async_views.get_attachments)(request).status_code, 401)
+
+
+class SearchTests(SessionTestCase):
+    def search(self, query):
+        response = self.client.get('/api/search/', {'q': query})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['results']
+
+    def test_edited_text_is_found_and_highlighted(self):
+        attachment = self.add_attachment()
+        self.client.patch(f'/api/attachments/{attachment.id}/update/', {
+            'transcript': 'the deployment runbook lives in the wiki', 'summary': 'runbook walkthrough',
+        }, format='json')
+
+        [result] = self.search('runbook')
+        self.assertEqual(result['attachment_id'], attachment.id)
+        self.assertEqual(result['session'], {'id': self.session.id, 'title': 'KT'})
+        self.assertIn('<mark>runbook</mark>', result['highlights']['summary'])
+        self.assertEqual(self.search('kubernetes'), [])
+
+    def test_only_own_sessions_are_searched(self):
+        other = CustomUser.objects.create_user(
+            username='other@example.com', email='other@example.com', name='other', password='other-password'
+        )
+        session = KTSession.objects.create(title='Other', description='', created_by=other)
+        Attachment.objects.create(session=session, file_type='text', file_url='https://example.com/o.txt',
+                                  status='done', transcript='secret runbook')
+        call_command('rebuild_search_index', stdout=StringIO())
+
+        self.assertEqual(self.search('runbook'), [])
+
+    def test_rebuild_indexes_finished_attachments(self):
+        done = self.add_attachment(status='done', transcript='billing service handover')
+        self.add_attachment(status='pending', transcript='billing draft')
+
+        call_command('rebuild_search_index', stdout=StringIO())
+
+        self.assertEqual([result['attachment_id'] for result in self.search('billing')], [done.id])
+
+    def test_query_is_required(self):
+        self.assertEqual(self.client.get('/api/search/').status_code, 400)
+        self.assertEqual(self.client.get('/api/search/', {'q': 'x', 'limit': 0}).status_code, 400)
+
+
+def session_counts(session_id):
+    return KTSession.objects.values(
+        'attachment_count', 'pending_count', 'processing_count', 'done_count', 'failed_count'
+    ).get(id=session_id)
+
+
+@override_settings(KT_LOCAL_TRANSCRIBER_DELAY=0)
+class CounterTests(SessionTestCase):
+    def test_attachment_create_and_delete_adjust_counters(self):
+        response = self.client.post('/api/attachments/create/', {
+            'session_id': str(self.session.id), 'file_type': 'video', 'file_url': 'https://example.com/media/a.mp4',
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(session_counts(self.session.id)['attachment_count'], 1)
+        self.assertEqual(session_counts(self.session.id)['pending_count'], 1)
+
+        response = self.client.delete(f"/api/attachments/{response.json()['id']}/delete/")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(session_counts(self.session.id)['attachment_count'], 0)
+        self.assertEqual(session_counts(self.session.id)['pending_count'], 0)
+
+    def test_bulk_create_and_processing_move_counters(self):
+        response = self.client.post('/api/attachments/bulk/', [
+            {'session_id': self.session.id, 'file_type': 'pdf', 'file_url': f'https://example.com/media/{n}.pdf'}
+            for n in range(3)
+        ], format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+
+        process_attachment.delay(response.json()['results'][0]['attachment']['id'])
+
+        self.assertEqual(session_counts(self.session.id), {
+            'attachment_count': 3, 'pending_count': 2, 'processing_count': 0, 'done_count': 1, 'failed_count': 0,
+        })
+
+    def test_repair_recomputes_counters(self):
+        self.add_attachment()
+        self.add_attachment(status='done')
+        KTSession.objects.filter(id=self.session.id).update(attachment_count=7, failed_count=3)
+
+        call_command('repair_attachment_counts', stdout=StringIO())
+
+        self.assertEqual(session_counts(self.session.id), {
+            'attachment_count': 2, 'pending_count': 1, 'processing_count': 0, 'done_count': 1, 'failed_count': 0,
+        })
+
+    def test_session_list_returns_counters(self):
+        self.client.post('/api/attachments/create/', {
+            'session_id': self.session.id, 'file_type': 'text', 'file_url': 'https://example.com/media/a.txt',
+        }, format='json')
+
+        session = self.client.get('/api/kt-sessions/').json()['sessions'][0]
+        self.assertEqual((session['attachment_count'], session['pending_count']), (1, 1))
+
+
+class SessionListTests(SessionTestCase):
+    def test_pages_cover_every_session_once(self):
+        ids = [self.session.id] + [
+            KTSession.objects.create(title=f'KT {n}', description='', created_by=self.user).id for n in range(4)
+        ]
+
+        seen, url = [], '/api/kt-sessions/?per_page=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            seen += [session['id'] for session in response.json()['sessions']]
+            url = response.json()['pagination']['next']
+
+        self.assertEqual(seen, ids[::-1])
+        self.assertEqual(self.client.get('/api/kt-sessions/?per_page=0').status_code, 400)
+
+    def test_warm_page_skips_the_session_query(self):
+        self.client.get('/api/kt-sessions/')
+
+        # The user comes from the user cache too
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/kt-sessions/')
+        self.assertEqual(len(response.json()['sessions']), 1)
+
+    def test_new_session_drops_cached_pages(self):
+        self.client.get('/api/kt-sessions/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/kt-sessions/', {'title': 'Second', 'description': 'handover'}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+
+        self.assertEqual(len(self.client.get('/api/kt-sessions/').json()['sessions']), 2)
+
+    def test_counter_change_drops_cached_pages(self):
+        self.client.get('/api/kt-sessions/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/attachments/create/', {
+                'session_id': self.session.id, 'file_type': 'text', 'file_url': 'https://example.com/media/a.txt',
+            }, format='json')
+
+        self.assertEqual(self.client.get('/api/kt-sessions/').json()['sessions'][0]['attachment_count'], 1)
+
+
+def session_revision(session_id):
+    return KTSession.objects.values_list('revision', flat=True).get(id=session_id)
+
+
+class ETagTests(SessionTestCase):
+    def test_session_detail_not_modified_until_changed(self):
+        url = f'/api/kt-sessions/{self.session.id}/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        response = self.client.patch(url, {'description': 'edited'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['description'], 'edited')
+
+    def test_session_detail_changes_with_its_attachments(self):
+        url = f'/api/kt-sessions/{self.session.id}/'
+        etag = self.client.get(url)['ETag']
+
+        self.add_attachment()
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_attachment_not_modified_until_changed(self):
+        attachment = self.add_attachment(summary='first')
+        url = f'/api/attachments/{attachment.id}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        response = self.client.patch(f'/api/attachments/{attachment.id}/update/', {'summary': 'second'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['summary'], 'second')
+
+    def test_etag_follows_the_negotiated_media_type(self):
+        url = f'/api/kt-sessions/{self.session.id}/'
+        response = self.client.get(url)
+        self.assertIn('Accept', response['Vary'])
+        etag = response['ETag']
+
+        response = self.client.get(url, HTTP_ACCEPT='text/html', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/html; charset=utf-8')
+        self.assertNotEqual(response['ETag'], etag)
+        response = self.client.get(url, HTTP_ACCEPT='text/html', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('Accept', response['Vary'])
+
+    def test_warm_share_link_revalidates_without_a_query(self):
+        url = f'/api/kt-sessions/get_by_url/{get_or_create_share_token(self.session)}/'
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_share_token_save_keeps_revision(self):
+        revision = session_revision(self.session.id)
+        self.session.share_token = uuid.uuid4()
+        self.session.save(update_fields=['share_token'])
+
+        self.assertEqual(session_revision(self.session.id), revision)
+
+
+class SerializationTests(SessionTestCase):
+    def test_row_and_instance_serialize_alike(self):
+        attachment = self.add_attachment(transcript='text', summary='short')
+        attachment = Attachment.objects.select_related('session').get(id=attachment.id)
+
+        for fields in (list(ATTACHMENT_FIELDS), ['id', 'status'], ['id', 'session', 'created_at']):
+            row = attachment_queryset(fields).get(id=attachment.id)
+            self.assertEqual(serialize_attachments([row], fields), [attachment_to_dict(attachment, fields)])
+
+    def test_render_json_matches_drf(self):
+        data = {
+            'at': datetime(2026, 1, 2, 3, 4, 5, tzinfo=dt_timezone.utc), 'price': Decimal('1.50'),
+            'label': gettext_lazy('Done'), 'nested': [{'id': 1}],
+        }
+
+        self.assertEqual(render_json(data), JSONRenderer().render(data))
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_indented_output_uses_the_standard_encoder(self):
+        context = {'indent': 2}
+
+        self.assertEqual(
+            ORJSONRenderer().render({'id': 1}, renderer_context=context),
+            JSONRenderer().render({'id': 1}, renderer_context=context)
+        )
+
+
+@override_settings(KT_LOCAL_TRANSCRIBER_DELAY=0)
+class CounterSignalTests(SessionTestCase):
+    def test_orm_writes_are_counted(self):
+        attachment = Attachment.objects.create(
+            session=self.session, file_type='text', file_url='https://example.com/media/a.txt'
+        )
+        self.assertEqual(session_counts(self.session.id)['pending_count'], 1)
+
+        attachment.delete()
+        self.assertEqual(session_counts(self.session.id)['attachment_count'], 0)
+
+    def test_drifted_counter_does_not_fail_processing(self):
+        attachment = self.add_attachment(file_type='pdf')
+        KTSession.objects.filter(id=self.session.id).update(pending_count=0)
+
+        process_attachment.delay(attachment.id)
+
+        self.assertEqual(Attachment.objects.get(id=attachment.id).status, 'done')
+        self.assertEqual(session_counts(self.session.id)['pending_count'], 0)
+
+
+class RequestMetricsTests(SessionTestCase):
+    def observed(self, name, view):
+        return REGISTRY.get_sample_value(f'{name}_count', {'view': view}) or 0
+
+    def test_request_is_observed_under_its_url_name(self):
+        before = self.observed('kt_request_db_queries', 'get_attachments')
+
+        self.client.get(f'/api/attachments/?session_id={self.session.id}')
+
+        self.assertEqual(self.observed('kt_request_db_queries', 'get_attachments'), before + 1)
+
+    @override_settings(KT_METRICS_TOKEN='scrape-token')
+    def test_metrics_need_the_token_or_staff(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(APIClient().get('/metrics').status_code, 403)
+        self.assertEqual(APIClient().get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+
+        response = APIClient().get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-token')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'kt_request_duration_seconds_bucket{', response.content)
+
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    @override_settings(KT_TIMING_HEADER=True)
+    def test_server_timing_on_request(self):
+        response = self.client.get(f'/api/kt-sessions/{self.session.id}/', HTTP_X_DEBUG_TIMING='1')
+
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", redis;')
+        self.assertNotIn('Server-Timing', self.client.get(f'/api/kt-sessions/{self.session.id}/'))
+
+    def test_server_timing_disabled_by_default(self):
+        response = self.client.get(f'/api/kt-sessions/{self.session.id}/', HTTP_X_DEBUG_TIMING='1')
+
+        self.assertNotIn('Server-Timing', response)
+
+
+@override_settings(KT_LOCAL_TRANSCRIBER_DELAY=0, KT_LOCAL_MEDIA_DURATION=900, KT_SEGMENT_SECONDS=300)
+class TelemetryTests(SessionTestCase):
+    def test_processing_records_its_timeline(self):
+        attachment = self.add_attachment(file_type='audio')
+
+        process_attachment.delay(attachment.id)
+
+        timing = AttachmentTiming.objects.get(attachment_id=attachment.id)
+        self.assertEqual((timing.outcome, timing.segments, timing.cached), ('done', 3, False))
+        self.assertEqual(timing.file_type, 'audio')
+        self.assertIsNotNone(timing.processing_time)
+
+    def test_reused_result_is_marked_cached(self):
+        process_attachment.delay(self.add_attachment(file_type='pdf').id)
+        second = self.add_attachment(file_type='pdf')
+
+        process_attachment.delay(second.id)
+
+        timing = AttachmentTiming.objects.get(attachment_id=second.id)
+        self.assertEqual((timing.outcome, timing.cached, timing.segments), ('done', True, 0))
+
+    def test_stats_are_staff_only(self):
+        self.assertEqual(self.client.get('/api/attachments/stats/').status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        self.add_attachment(file_type='video')
+        process_attachment.delay(self.add_attachment(file_type='pdf').id)
+
+        response = self.client.get('/api/attachments/stats/', {'window': 600})
+        self.assertEqual(response.status_code, 200, response.content)
+        stats = response.json()
+        self.assertEqual(stats['window_seconds'], 600)
+        self.assertEqual(stats['file_types']['video']['pending'], 1)
+        self.assertEqual(stats['file_types']['pdf']['done'], 1)
+        self.assertEqual(self.client.get('/api/attachments/stats/', {'window': 0}).status_code, 400)
+
+
+@override_settings(KT_DELETE_BATCH_SIZE=2)
+class DeletionTests(SessionTestCase):
+    def test_session_is_hidden_then_purged_in_batches(self):
+        for _ in range(5):
+            self.add_attachment()
+
+        response = self.client.delete(f'/api/kt-sessions/{self.session.id}/')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.client.get(f'/api/kt-sessions/{self.session.id}/').status_code, 404)
+        self.assertEqual(self.client.get('/api/kt-sessions/').json()['sessions'], [])
+        message = OutboxMessage.objects.get(task='ktsessions.tasks.delete_session')
+        self.assertEqual(message.args, [self.session.id])
+
+        self.assertTrue(KTSession.all_objects.filter(id=self.session.id).exists())
+
+        delete_session(self.session.id)
+
+        self.assertFalse(KTSession.all_objects.exists())
+        self.assertFalse(Attachment.objects.exists())
+
+    def test_attachments_of_a_hidden_session_are_gone(self):
+        attachment = self.add_attachment(status='done', transcript='handover notes')
+        self.assertEqual(self.client.delete(f'/api/kt-sessions/{self.session.id}/').status_code, 202)
+
+        for path in (f'/api/attachments/{attachment.id}/', f'/api/attachments/{attachment.id}/transcript/'):
+            self.assertEqual(self.client.get(path).status_code, 404, path)
+        response = self.client.get(f'/api/attachments/?session_id={self.session.id}')
+        self.assertEqual(response.json()['attachments'], [])
+
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.assertEqual(async_to_sync(async_views.get_attachment)(request, attachment_id=attachment.id).status_code, 404)
+        request = RequestFactory().get(
+            '/', {'session_id': self.session.id}, HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}'
+        )
+        self.assertEqual(json.loads(async_to_sync(async_views.get_attachments)(request).content)['attachments'], [])
+
+    def test_bulk_delete_reports_missing_ids(self):
+        kept, first, second = self.add_attachment(), self.add_attachment(), self.add_attachment()
+
+        response = self.client.post('/api/attachments/bulk/delete/', [first.id, second.id, 999], format='json')
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json(), {'deleted': 2, 'not_found': [999]})
+        self.assertEqual(list(Attachment.objects.values_list('id', flat=True)), [kept.id])
+        self.assertEqual(session_counts(self.session.id)['attachment_count'], 1)
+        self.assertEqual(self.client.post('/api/attachments/bulk/delete/', ['1'], format='json').status_code, 400)
+
+    def test_single_delete_moves_counters(self):
+        attachment = self.add_attachment(status='done')
+
+        self.assertEqual(self.client.delete(f'/api/attachments/{attachment.id}/delete/').status_code, 200)
+        self.assertEqual(self.client.delete(f'/api/attachments/{attachment.id}/delete/').status_code, 404)
+        self.assertEqual(session_counts(self.session.id)['done_count'], 0)
+
+
+@override_settings(KT_CONTENT_FRAME_SIZE=16)
+class ContentStoreTests(SessionTestCase):
+    text = 'Handover: the café runbook, step ünder step. ' * 4
+
+    def test_round_trip(self):
+        digest, length = put_text(self.text)
+
+        self.assertEqual(length, len(self.text.encode()))
+        self.assertEqual(get_texts([digest]), {digest: self.text})
+        self.assertEqual(ContentFrame.objects.filter(digest=digest).count(), -(-length // 16))
+
+    def test_identical_texts_are_stored_once(self):
+        first, _ = put_text(self.text)
+        frames = ContentFrame.objects.count()
+
+        self.assertEqual(put_text(self.text)[0], first)
+        self.assertEqual(ContentFrame.objects.count(), frames)
+
+    def test_batch_is_one_lookup_and_one_write(self):
+        stored, _ = put_text(self.text)
+        texts = [self.text, 'first', 'second', 'first', '', None]
+
+        with self.assertNumQueries(2):
+            batch = put_texts(texts)
+
+        self.assertEqual(batch[self.text], (stored, len(self.text.encode())))
+        self.assertEqual(set(batch), {self.text, 'first', 'second', ''})
+        self.assertEqual(get_texts([batch['first'][0], batch['second'][0]]),
+                         {batch['first'][0]: 'first', batch['second'][0]: 'second'})
+        frames = ContentFrame.objects.count()
+        with self.assertNumQueries(1):
+            self.assertEqual(put_texts(texts), batch)
+        self.assertEqual(ContentFrame.objects.count(), frames)
+
+    def test_empty_and_missing_texts(self):
+        empty, length = put_text('')
+
+        self.assertEqual(length, 0)
+        self.assertEqual(get_texts([empty]), {empty: ''})
+        self.assertEqual(put_text(None), (None, 0))
+
+    def test_read_range_across_frames(self):
+        digest, _ = put_text(self.text)
+        data = self.text.encode()
+
+        self.assertEqual(b''.join(read_range(digest, 10, 50)), data[10:50])
+        self.assertEqual(b''.join(read_range(digest, 0, len(data))), data)
+
+    def test_attachment_texts(self):
+        attachment = self.add_attachment(transcript=self.text, summary='')
+
+        attachment = Attachment.objects.get(id=attachment.id)
+        self.assertEqual((attachment.transcript, attachment.summary), (self.text, ''))
+        self.assertEqual(attachment.transcript_length, len(self.text.encode()))
+
+    def test_transcript_byte_range(self):
+        attachment = self.add_attachment(transcript=self.text)
+        url = f'/api/attachments/{attachment.id}/transcript/'
+        data = self.text.encode()
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), data)
+
+        response = self.client.get(url, HTTP_RANGE='bytes=5-40')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 5-40/{len(data)}')
+        self.assertEqual(b''.join(response.streaming_content), data[5:41])
+
+        response = self.client.get(url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), data[-10:])
+
+        response = self.client.get(url, HTTP_RANGE=f'bytes={len(data)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(data)}')
+
+
+class BackupTests(SessionTestCase):
+    def export(self, **params):
+        response = self.client.get('/api/kt-sessions/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_export_streams_sessions_then_attachments(self):
+        self.add_attachment(status='done', transcript='full transcript', summary='short')
+
+        records = [json.loads(line) for line in self.export().splitlines()]
+
+        self.assertEqual([record['type'] for record in records], ['export', 'session', 'attachment'])
+        self.assertEqual(records[1]['owner'], 'owner@example.com')
+        self.assertEqual(records[2]['session'], self.session.id)
+        self.assertEqual((records[2]['transcript'], records[2]['summary']), ('full transcript', 'short'))
+
+    def test_import_round_trip(self):
+        self.add_attachment(status='done', transcript='full transcript', summary='short')
+        self.add_attachment(file_type='audio', file_url='https://example.com/media/a.mp3')
+        data = self.export()
+        other = CustomUser.objects.create_user(
+            username='other@example.com', email='other@example.com', name='other', password='other-password'
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(other)}')
+        OutboxMessage.objects.all().delete()
+
+        response = self.client.generic('POST', '/api/kt-sessions/import/', data, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json(), {'sessions': 1, 'attachments': 2, 'queued': 1, 'errors': []})
+        session = KTSession.objects.get(created_by=other)
+        self.assertEqual((session.title, session.created_at), (self.session.title, self.session.created_at))
+        done = Attachment.objects.get(session=session, status='done')
+        self.assertEqual((done.transcript, done.summary), ('full transcript', 'short'))
+        pending = Attachment.objects.get(session=session, status='pending')
+        self.assertEqual(list(OutboxMessage.objects.values_list('args', flat=True)), [[pending.id]])
+        self.assertEqual(session_counts(session.id)['attachment_count'], 2)
+
+    def test_import_reports_bad_lines(self):
+        data = b'{"type": "export", "version": 1}\nnot json\n{"type": "attachment", "session": 99}\n'
+
+        response = self.client.generic('POST', '/api/kt-sessions/import/', data, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual([error['line'] for error in response.json()['errors']], [2, 3])
+
+    def test_other_users_are_staff_only(self):
+        self.assertEqual(self.client.get('/api/kt-sessions/export/', {'all': 'true'}).status_code, 403)
+        self.assertEqual(self.client.post('/api/kt-sessions/import/?keep_owners=true', b'',
+                                          content_type='application/x-ndjson').status_code, 403)
+
+
+class StaleSessionSaveTests(SessionTestCase):
+    def test_update_through_stale_instance_keeps_counters(self):
+        stale = KTSession.objects.get(id=self.session.id)
+        self.add_attachment()
+        self.add_attachment()
+        revision = session_revision(self.session.id)
+
+        serializer = KTSessionUpdateSerializer(stale, data={'title': 'renamed'}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+
+        self.assertEqual(session_counts(self.session.id)['attachment_count'], 2)
+        self.assertEqual(session_counts(self.session.id)['pending_count'], 2)
+        self.assertEqual(session_revision(self.session.id), revision + 1)
+        self.assertEqual((stale.attachment_count, stale.revision), (2, revision + 1))
+
+    def test_full_save_does_not_write_counters(self):
+        stale = KTSession.objects.get(id=self.session.id)
+        self.add_attachment()
+        revision = session_revision(self.session.id)
+
+        stale.description = 'edited'
+        stale.save()
+
+        self.assertEqual(session_counts(self.session.id)['attachment_count'], 1)
+        self.assertEqual(session_revision(self.session.id), revision + 1)
+        self.assertEqual(stale.revision, revision + 1)
+
+    def test_patch_renders_owner_without_reloading_it(self):
+        response = self.client.patch(f'/api/kt-sessions/{self.session.id}/', {'description': 'edited'}, format='json')
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['created_by_name'], 'owner')
+        self.assertEqual(response.json()['attachment_count'], 0)
+
+
+def expire_claims(**filters):
+    expired = timezone.now() - timedelta(seconds=settings.KT_PROCESSING_LEASE + 1)
+    Attachment.objects.filter(**filters).update(claimed_at=expired)
+
+
+class LeaseCheckingTranscriber(LocalTranscriber):
+    """Lets the claim expire while probing, then records whether each later stage still holds it"""
+    held = []
+
+    def probe(self, file_url, file_type):
+        expire_claims(file_url=file_url)
+        return super().probe(file_url, file_type)
+
+    def transcribe(self, file_url, file_type, start, end):
+        self.held.append(not _stale_claims().exists())
+        return super().transcribe(file_url, file_type, start, end)
+
+    def summarize(self, transcript):
+        self.held.append(not _stale_claims().exists())
+        return super().summarize(transcript)
+
+
+@override_settings(KT_TRANSCRIBER='ktsessions.tests.LeaseCheckingTranscriber', KT_LOCAL_TRANSCRIBER_DELAY=0)
+class LeaseTests(SessionTestCase):
+    def setUp(self):
+        super().setUp()
+        LeaseCheckingTranscriber.held.clear()
+
+    def expire_claim(self, attachment):
+        expire_claims(id=attachment.id)
+
+    def test_dispatch_renews_the_claim(self):
+        attachment = self.add_attachment(file_type='audio')
+
+        process_attachment.delay(attachment.id)
+
+        self.assertEqual(Attachment.objects.get(id=attachment.id).status, 'done')
+        self.assertTrue(LeaseCheckingTranscriber.held)
+        self.assertTrue(all(LeaseCheckingTranscriber.held), LeaseCheckingTranscriber.held)
+
+    def test_merge_renews_the_claim(self):
+        attachment = self.add_attachment(file_type='audio')
+        _claim(attachment.id)
+        self.expire_claim(attachment)
+
+        merge_transcript.delay([{'start': 0, 'end': 60, 'text': 'hello'}], attachment.id)
+
+        self.assertEqual(LeaseCheckingTranscriber.held, [True])
+        self.assertEqual(Attachment.objects.get(id=attachment.id).status, 'done')
+
+    def test_claim_moves_pending_to_processing(self):
+        attachment = self.add_attachment()
+
+        self.assertEqual(_claim(attachment.id), self.session.id)
+        attachment.refresh_from_db()
+        self.assertEqual(attachment.status, 'processing')
+        self.assertIsNotNone(attachment.claimed_at)
+        self.assertEqual(session_counts(self.session.id)['pending_count'], 0)
+        self.assertEqual(session_counts(self.session.id)['processing_count'], 1)
+
+    def test_live_claim_is_not_taken_over(self):
+        attachment = self.add_attachment()
+        _claim(attachment.id)
+
+        self.assertIsNone(_claim(attachment.id))
+
+    def test_expired_claim_is_taken_over_without_recounting(self):
+        attachment = self.add_attachment()
+        _claim(attachment.id)
+        self.expire_claim(attachment)
+
+        with self.assertLogs('ktsessions.tasks', 'WARNING'):
+            self.assertEqual(_claim(attachment.id), self.session.id)
+        attachment.refresh_from_db()
+        self.assertGreater(attachment.claimed_at, timezone.now() - timedelta(minutes=1))
+        self.assertEqual(session_counts(self.session.id), {
+            'attachment_count': 1, 'pending_count': 0, 'processing_count': 1, 'done_count': 0, 'failed_count': 0,
+        })
+
+    def test_requeue_stale_attachments(self):
+        stale, live = self.add_attachment(), self.add_attachment()
+        _claim(stale.id)
+        _claim(live.id)
+        self.expire_claim(stale)
+        OutboxMessage.objects.all().delete()
+
+        with self.assertLogs('ktsessions.tasks', 'WARNING'):
+            requeue_stale_attachments()
+
+        stale.refresh_from_db()
+        live.refresh_from_db()
+        self.assertEqual((stale.status, stale.claimed_at), ('pending', None))
+        self.assertEqual(live.status, 'processing')
+        self.assertEqual(list(OutboxMessage.objects.values_list('args', flat=True)), [[stale.id]])
+        self.assertEqual(session_counts(self.session.id)['pending_count'], 1)
+        self.assertEqual(session_counts(self.session.id)['processing_count'], 1)
+
+
+class CreateAttachmentErrorTests(SessionTestCase):
+    def create(self, query='', **data):
+        return self.client.post(f'/api/attachments/create/{query}', {
+            'session_id': str(self.session.id), 'file_type': 'pdf', 'file_url': 'https://example.com/media/a.pdf', **data,
+        }, format='json')
+
+    def test_unknown_field_is_rejected(self):
+        response = self.create('?fields=id,secret')
+
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertFalse(Attachment.objects.exists())
+
+    def test_non_numeric_session_id_is_rejected(self):
+        self.assertEqual(self.create(session_id='abc').status_code, 400)
+
+
+class BulkSessionIdTests(SessionTestCase):
+    def test_numeric_string_session_id_is_accepted(self):
+        response = self.client.post('/api/attachments/bulk/', [
+            {'session_id': str(self.session.id), 'file_type': 'pdf', 'file_url': 'https://example.com/media/a.pdf'},
+            {'session_id': True, 'file_type': 'pdf', 'file_url': 'https://example.com/media/b.pdf'},
+        ], format='json')
+
+        self.assertEqual(response.status_code, 207, response.content)
+        results = response.json()['results']
+        self.assertEqual(results[0]['attachment']['session']['id'], self.session.id)
+        self.assertEqual(results[1]['error'], 'session_id must be an integer, got True')
+
+
+class SearchRebuildTests(SessionTestCase):
+    def rebuild_statements(self):
+        with CaptureQueriesContext(connection) as queries:
+            call_command('rebuild_search_index', '--batch-size', '10', stdout=StringIO())
+        # atomic() only adds savepoints inside the test transaction
+        return [query['sql'] for query in queries if 'SAVEPOINT' not in query['sql']]
+
+    def test_rebuild_queries_do_not_grow_with_the_page(self):
+        for n in range(2):
+            self.add_attachment(status='done', transcript=f'handover {n}')
+        few = self.rebuild_statements()
+
+        for n in range(8):
+            self.add_attachment(status='done', transcript=f'handover {n}')
+        many = self.rebuild_statements()
+
+        self.assertEqual(len(many), len(few), many)
@@ -1,18 +1,31 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+# Under ASGI the hot read endpoints can be served by their async versions
+read_views = async_views if settings.KT_ASYNC_READS else views
 
 urlpatterns = [
     path('kt-sessions/', views.kt_session_list_create, name='kt_session_list_create'),
+    path('kt-sessions/export/', views.export_sessions, name='export_sessions'),
+    path('kt-sessions/import/', views.import_sessions, name='import_sessions'),
     path('kt-sessions/<int:pk>/', views.kt_session_detail, name='kt_session_detail'),
+    path('kt-sessions/<int:pk>/events/', async_views.session_events, name='session_events'),
 
     # Public share view
     path('kt-sessions/get_sharing_url/<int:pk>/', views.get_sharing_url, name='get_sharing_url'),
-    path('kt-sessions/get_by_url/<str:share_token>/', views.kt_session_by_url, name='kt_session_by_url'),
+    path('kt-sessions/get_by_url/<str:share_token>/', read_views.kt_session_by_url, name='kt_session_by_url'),
 
-    path('attachments/', views.get_attachments, name='get_attachments'),
+    path('attachments/', read_views.get_attachments, name='get_attachments'),
     path('attachments/create/', views.create_attachment, name='create_attachment'),
-    path('attachments/<int:attachment_id>/', views.get_attachment, name='get_attachment'),
+    path('attachments/stats/', views.processing_stats_view, name='processing_stats'),
+    path('attachments/bulk/', views.create_attachments_bulk, name='create_attachments_bulk'),
+    path('attachments/bulk/delete/', views.delete_attachments_bulk, name='delete_attachments_bulk'),
+    path('attachments/<int:attachment_id>/', read_views.get_attachment, name='get_attachment'),
+    path('attachments/<int:attachment_id>/transcript/', views.get_attachment_transcript, name='get_attachment_transcript'),
     path('attachments/<int:attachment_id>/update/', views.update_attachment, name='update_attachment'),
     path('attachments/<int:attachment_id>/delete/', views.delete_attachment, name='delete_attachment'),
 
-]
\ No newline at end of file
+    path('search/', views.search, name='search'),
+
+]
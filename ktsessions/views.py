@@ -1,32 +1,74 @@
-import uuid
+from datetime import timedelta
+
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.core.paginator import Paginator
-from django.core.cache import cache  # Redis cache
 
+from .attachment_fields import (
+    LARGE_ATTACHMENT_FIELDS,
+    attachment_queryset,
+    attachment_to_dict,
+    requested_attachment_fields,
+    serialize_attachments
+)
+from .conditional import (
+    attachment_list_validators,
+    attachment_validators,
+    attachment_version,
+    not_modified,
+    representation,
+    session_validators,
+    session_version,
+    with_validators
+)
+from .backup import export_lines, import_lines
+from .content_store import read_range, set_texts
+from .counters import attachment_added, attachment_removed, attachments_added
+from .deletion import delete_attachments, hide_session
 from .models import KTSession, Attachment
+from .pagination import cursor_link, paginate_by_cursor
+from .renderers import render_json
+from .search import index_attachment, search_attachments
 from .serializers import (
     KTSessionSerializer,
     KTSessionCreateSerializer,
     KTSessionUpdateSerializer,
     SessionPublicSerializer
 )
-from .tasks import process_attachment
+from .session_list_cache import current_generation, get_page, store_page
+from .sharing import (
+    fetch_share_payload,
+    get_or_create_share_token,
+    invalidate_share_payload,
+    resolve_share_token,
+    store_share_payload
+)
+from .outbox import enqueue_processing
+from .telemetry import processing_stats
+
+SESSION_PAGE_SIZE = 20
+MAX_SESSION_PAGE_SIZE = 100
+
 
 # Alternative function-based views (if you prefer)
 @api_view(['GET', 'POST'])
 @permission_classes([permissions.IsAuthenticated])
 def kt_session_list_create(request):
     """
-    GET: List all KT sessions for the authenticated user
+    GET: List the authenticated user's KT sessions, newest first, one cursor page at a time
     POST: Create a new KT session
     """
     if request.method == 'GET':
-        sessions = KTSession.objects.filter(created_by=request.user).order_by('-created_at')
-        serializer = KTSessionSerializer(sessions, many=True)
-        return Response(serializer.data)
+        try:
+            return _session_list_page(request)
+        except ValueError as e:
+            return Response({'error': f'Invalid per_page or cursor parameter: {e}'}, status=status.HTTP_400_BAD_REQUEST)
 
     elif request.method == 'POST':
         serializer = KTSessionCreateSerializer(data=request.data, context={'request': request})
@@ -37,32 +79,70 @@ def kt_session_list_create(request):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+def _session_list_page(request):
+    """One cursor page of the user's sessions, rendered once per generation"""
+    per_page = min(int(request.GET.get('per_page', SESSION_PAGE_SIZE)), MAX_SESSION_PAGE_SIZE)
+    if per_page < 1:
+        raise ValueError('per_page must be positive')
+    cursor = request.GET.get('cursor', '')
+    url = request.build_absolute_uri()
+
+    # Read the generation before querying so a concurrent write can only strand this page
+    generation = current_generation(request.user.id)
+    payload = get_page(request.user.id, generation, url)
+    if payload is None:
+        # Counters live on the row and created_by_name comes from the join: one query per page
+        sessions = KTSession.objects.filter(created_by=request.user).select_related('created_by').order_by('-created_at', '-id')
+        cursor_page = paginate_by_cursor(sessions, cursor, per_page)
+        payload = render_json({
+            'sessions': KTSessionSerializer(cursor_page.items, many=True).data,
+            'pagination': {
+                'per_page': per_page,
+                'next': cursor_link(request, cursor_page.next_cursor),
+                'previous': cursor_link(request, cursor_page.previous_cursor),
+                'has_next': cursor_page.next_cursor is not None,
+                'has_previous': cursor_page.previous_cursor is not None
+            }
+        })
+        store_page(request.user.id, generation, url, payload)
+    return HttpResponse(payload, content_type='application/json')
+
+
 @api_view(['GET', 'PUT', 'PATCH', 'DELETE'])
 @permission_classes([permissions.IsAuthenticated])
 def kt_session_detail(request, pk):
     """
     GET: Retrieve a specific KT session
     PUT/PATCH: Update a KT session
-    DELETE: Delete a KT session
+    DELETE: Hide a KT session at once, its rows are deleted in the background
     """
-    session = get_object_or_404(KTSession, pk=pk, created_by=request.user)
-
     if request.method == 'GET':
-        serializer = SessionPublicSerializer(session)
-        return Response(serializer.data)
+        # Decide the 304 from the revision before loading the attachments
+        etag, last_modified = session_validators(
+            get_object_or_404(session_version(pk=pk, created_by=request.user)), representation(request)
+        )
+        response = not_modified(request, etag, last_modified)
+        if response is None:
+            session = get_object_or_404(KTSession.objects.prefetch_related('attachments'), pk=pk)
+            response = Response(SessionPublicSerializer(session).data)
+        return with_validators(response, etag, last_modified)
+
+    session = get_object_or_404(KTSession, pk=pk, created_by=request.user)
 
-    elif request.method in ['PUT', 'PATCH']:
+    if request.method in ['PUT', 'PATCH']:
         partial = request.method == 'PATCH'
         serializer = KTSessionUpdateSerializer(session, data=request.data, partial=partial)
         if serializer.is_valid():
             serializer.save()
+            # Owned by request.user, created_by_name needs no second user query
+            session.created_by = request.user
             response_serializer = KTSessionSerializer(session)
             return Response(response_serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     elif request.method == 'DELETE':
-        session.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        hide_session(session)
+        return Response(status=status.HTTP_202_ACCEPTED)
 
 
 @api_view(['GET'])
@@ -74,21 +154,7 @@ def get_sharing_url(request, pk):
 
     try:
         session = get_object_or_404(KTSession, pk=pk, created_by=request.user)
-        existing_token = None
-        for key in cache.iter_keys('*'):
-            if cache.get(key) == session.id:
-                existing_token = key
-                break
-
-        if existing_token:
-            # Token exists in cache, return it
-            token = existing_token
-        else:
-            # Generate a new token
-            token = str(uuid.uuid4())
-            session.share_token = token
-            session.save(update_fields=['share_token'])
-            cache.set(token, session.id, timeout=60 * 10 )  # 10 minutes TTL
+        token = get_or_create_share_token(session)
 
         return Response({'share_url': f'/kt-sessions/get_by_url/{token}'}, status=200)
     except Exception as e:
@@ -103,22 +169,51 @@ def kt_session_by_url(request, share_token):
     GET: Retrieve a KT session by share token (public access)
     """
     try:
-        session_id = cache.get(share_token)
-        if not session_id:
-            return Response({'error': 'Invalid or expired token'}, status=status.HTTP_404_NOT_FOUND)
-
-        session = get_object_or_404(KTSession, id=session_id)
-        serializer = SessionPublicSerializer(session)
-        return Response(serializer.data)
+        # Warm path: token index, rendered payload and its ETag come back in one Redis call
+        session_id, payload, version, etag = fetch_share_payload(share_token)
+        if session_id is None:
+            session_id = resolve_share_token(share_token)
+            if not session_id:
+                return Response({'error': 'Invalid or expired token'}, status=status.HTTP_404_NOT_FOUND)
+
+        if payload is None or etag is None:
+            payload = None
+            etag, _ = session_validators(get_object_or_404(session_version(id=session_id)), 'share')
+        response = not_modified(request, etag)
+        if response is None:
+            if payload is None:
+                session = get_object_or_404(KTSession.objects.prefetch_related('attachments'), id=session_id)
+                payload = render_json(SessionPublicSerializer(session).data)
+                store_share_payload(session_id, payload, version, etag)
+            response = HttpResponse(payload, content_type='application/json')
+        return with_validators(response, etag)
+    except Http404:
+        raise
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 ## attachment-based code
+BULK_ATTACHMENT_LIMIT = 1000
+MAX_SEARCH_RESULTS = 100
+STATS_WINDOW = 60 * 60  # seconds
+MAX_STATS_WINDOW = 7 * 24 * 60 * 60
+
+
+def _session_id(value):
+    """session_id of a request body: an integer or a numeric string"""
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    raise ValueError(f'session_id must be an integer, got {value!r}')
+
+
 @api_view(['POST'])
 def create_attachment(request):
     """Create a new attachment"""
     try:
         data = request.data
+        fields = requested_attachment_fields(request)
 
         # Validate required fields
         required_fields = ['session_id', 'file_type', 'file_url']
@@ -128,7 +223,7 @@ def create_attachment(request):
 
         # Validate session exists
         try:
-            session = KTSession.objects.get(id=data['session_id'])
+            session = KTSession.objects.get(id=_session_id(data['session_id']))
         except KTSession.DoesNotExist:
             return Response({'error': 'Session not found'}, status=status.HTTP_404_NOT_FOUND)
 
@@ -140,32 +235,131 @@ def create_attachment(request):
             }, status=status.HTTP_400_BAD_REQUEST)
 
         # Create attachment (status is handled internally, always starts as 'pending')
-        attachment = Attachment.objects.create(
-            session=session,
-            file_type=data['file_type'],
-            file_url=data['file_url'],
-            status='pending',  # Always set to pending initially
-            transcript=data.get('transcript', ''),
-            summary=data.get('summary', '')
+        # and queue its processing job in the same transaction
+        with transaction.atomic():
+            attachment = Attachment.objects.create(
+                session=session,
+                file_type=data['file_type'],
+                file_url=data['file_url'],
+                status='pending',  # Always set to pending initially
+                transcript=data.get('transcript', ''),
+                summary=data.get('summary', '')
+            )
+            enqueue_processing([attachment.id])
+
+        return Response(
+            attachment_to_dict(attachment, fields),
+            status=status.HTTP_201_CREATED
         )
 
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 
-        process_attachment.delay(attachment.id)
+@api_view(['POST'])
+def create_attachments_bulk(request):
+    """
+    Create many attachments in one request.
+    Body is a list of {session_id, file_type, file_url[, transcript, summary]} objects.
+    Valid items are inserted with a single bulk_create and queued with one outbox insert;
+    invalid items are reported per index without failing the batch.
+    """
+    try:
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'Expected a non-empty list of attachments'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > BULK_ATTACHMENT_LIMIT:
+            return Response({
+                'error': f'At most {BULK_ATTACHMENT_LIMIT} attachments per request'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        fields = requested_attachment_fields(request)
+
+        # One query for every referenced session
+        session_ids = {}
+        for index, item in enumerate(items):
+            if isinstance(item, dict) and 'session_id' in item:
+                try:
+                    session_ids[index] = _session_id(item['session_id'])
+                except ValueError as e:
+                    session_ids[index] = e
+        sessions = KTSession.objects.only('id', 'title').in_bulk(
+            {session_id for session_id in session_ids.values() if isinstance(session_id, int)}
+        )
 
+        valid_file_types = [choice[0] for choice in Attachment.FILE_TYPE_CHOICES]
+        file_url_field = Attachment._meta.get_field('file_url')
+        results = [None] * len(items)
+        pending = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                results[index] = {'index': index, 'error': 'Expected an object'}
+                continue
+            missing = [field for field in ('session_id', 'file_type', 'file_url') if field not in item]
+            if missing:
+                results[index] = {'index': index, 'error': f'{missing[0]} is required'}
+                continue
+            if isinstance(session_ids[index], ValueError):
+                results[index] = {'index': index, 'error': str(session_ids[index])}
+                continue
+            session = sessions.get(session_ids[index])
+            if session is None:
+                results[index] = {'index': index, 'error': 'Session not found'}
+                continue
+            if item['file_type'] not in valid_file_types:
+                results[index] = {
+                    'index': index,
+                    'error': f'Invalid file_type. Must be one of: {valid_file_types}'
+                }
+                continue
+            try:
+                file_url_field.clean(item['file_url'], None)
+            except ValidationError as e:
+                results[index] = {'index': index, 'error': f'Invalid file_url: {" ".join(e.messages)}'}
+                continue
+
+            pending.append((index, Attachment(
+                session=session,
+                file_type=item['file_type'],
+                file_url=item['file_url'],
+                status='pending'
+            )))
+
+        if pending:
+            # One content store lookup and write for every text in the request
+            set_texts([attachment for _, attachment in pending], [
+                {'transcript': items[index].get('transcript', ''), 'summary': items[index].get('summary', '')}
+                for index, _ in pending
+            ])
+            with transaction.atomic():
+                created = Attachment.objects.bulk_create([attachment for _, attachment in pending])
+                attachments_added(created)
+                attachment_ids = [attachment.id for attachment in created]
+                affected_sessions = {attachment.session_id for attachment in created}
+                # bulk_create skips post_save, so invalidate cached share payloads here
+                for session_id in affected_sessions:
+                    transaction.on_commit(lambda session_id=session_id: invalidate_share_payload(session_id))
+                # Processing jobs go through the outbox in the same transaction
+                enqueue_processing(attachment_ids)
+            for index, attachment in pending:
+                results[index] = {'index': index, 'attachment': attachment_to_dict(attachment, fields)}
+
+        failed = sum(1 for result in results if 'error' in result)
+        if not pending:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif failed:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_201_CREATED
         return Response({
-            'id': attachment.id,
-            'session': {
-                'id': attachment.session.id,
-                'title': attachment.session.title
-            },
-            'file_type': attachment.file_type,
-            'file_url': attachment.file_url,
-            'status': attachment.status,
-            'transcript': attachment.transcript,
-            'summary': attachment.summary,
-            'created_at': attachment.created_at.isoformat()
-        }, status=status.HTTP_201_CREATED)
+            'created': len(pending),
+            'failed': failed,
+            'results': results
+        }, status=response_status)
 
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -179,9 +373,16 @@ def get_attachments(request):
         file_type = request.GET.get('file_type')
         page = int(request.GET.get('page', 1))
         per_page = int(request.GET.get('per_page', 10))
+        # Cursor mode is selected by passing `cursor` (empty for the first page)
+        cursor = request.GET.get('cursor')
+        default_count = 'false' if cursor is not None else 'true'
+        include_count = request.GET.get('include_count', default_count).lower() == 'true'
+        if per_page < 1:
+            raise ValueError('per_page must be positive')
+        fields = requested_attachment_fields(request)
 
-        # Build queryset
-        queryset = Attachment.objects.select_related('session').all()
+        # Build queryset, reading only the requested columns
+        queryset = attachment_queryset(fields)
 
         # Apply filters (status filtering removed)
         if session_id:
@@ -189,33 +390,38 @@ def get_attachments(request):
         if file_type:
             queryset = queryset.filter(file_type=file_type)
 
-        # Order by creation date (newest first)
-        queryset = queryset.order_by('-created_at')
+        # Order by creation date (newest first), id breaks ties
+        queryset = queryset.order_by('-created_at', '-id')
 
-        # Paginate
-        paginator = Paginator(queryset, per_page)
-        page_obj = paginator.get_page(page)
-
-        # Serialize data
-        attachments = []
-        for attachment in page_obj:
-            attachments.append({
-                'id': attachment.id,
-                'session': {
-                    'id': attachment.session.id,
-                    'title': attachment.session.title
-                },
-                'file_type': attachment.file_type,
-                'file_url': attachment.file_url,
-                'status': attachment.status,
-                'transcript': attachment.transcript,
-                'summary': attachment.summary,
-                'created_at': attachment.created_at.isoformat()
-            })
+        # A session's list is versioned by the session revision; unscoped lists
+        # have no cheap version (it would take a full COUNT) and get no validators
+        etag = last_modified = None
+        if session_id:
+            version = session_version(id=session_id).first()
+            if version is not None:
+                etag, last_modified = attachment_list_validators(version, representation(request))
+                response = not_modified(request, etag, last_modified)
+                if response is not None:
+                    return with_validators(response, etag, last_modified)
 
-        return Response({
-            'attachments': attachments,
-            'pagination': {
+        # Paginate
+        if cursor is not None:
+            cursor_page = paginate_by_cursor(queryset, cursor, per_page)
+            rows = cursor_page.items
+            pagination = {
+                'per_page': per_page,
+                'next': cursor_link(request, cursor_page.next_cursor),
+                'previous': cursor_link(request, cursor_page.previous_cursor),
+                'has_next': cursor_page.next_cursor is not None,
+                'has_previous': cursor_page.previous_cursor is not None
+            }
+            if include_count:
+                pagination['total_count'] = queryset.count()
+        elif include_count:
+            paginator = Paginator(queryset, per_page)
+            page_obj = paginator.get_page(page)
+            rows = page_obj
+            pagination = {
                 'page': page,
                 'per_page': per_page,
                 'total_pages': paginator.num_pages,
@@ -223,10 +429,28 @@ def get_attachments(request):
                 'has_next': page_obj.has_next(),
                 'has_previous': page_obj.has_previous()
             }
-        })
+        else:
+            # Skip the COUNT(*): fetch one extra row to know if there is a next page
+            offset = (max(page, 1) - 1) * per_page
+            rows = list(queryset[offset:offset + per_page + 1])
+            pagination = {
+                'page': page,
+                'per_page': per_page,
+                'has_next': len(rows) > per_page,
+                'has_previous': page > 1
+            }
+            rows = rows[:per_page]
 
-    except ValueError:
-        return Response({'error': 'Invalid page or per_page parameter'}, status=status.HTTP_400_BAD_REQUEST)
+        # Serialize data, with the requested texts read from the content store at once
+        attachments = serialize_attachments(rows, fields)
+
+        return with_validators(Response({
+            'attachments': attachments,
+            'pagination': pagination
+        }), etag, last_modified)
+
+    except ValueError as e:
+        return Response({'error': f'Invalid page, per_page, cursor or fields parameter: {e}'}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -235,74 +459,174 @@ def get_attachments(request):
 def get_attachment(request, attachment_id):
     """Get a single attachment by ID"""
     try:
-        attachment = get_object_or_404(
-            Attachment.objects.select_related('session'),
-            id=attachment_id
+        fields = requested_attachment_fields(request)
+        etag, last_modified = attachment_validators(
+            get_object_or_404(attachment_version(attachment_id)), representation(request), fields
         )
-
-        return Response({
-            'id': attachment.id,
-            'session': {
-                'id': attachment.session.id,
-                'title': attachment.session.title
-            },
-            'file_type': attachment.file_type,
-            'file_url': attachment.file_url,
-            'status': attachment.status,
-            'transcript': attachment.transcript,
-            'summary': attachment.summary,
-            'created_at': attachment.created_at.isoformat()
-        })
-
+        response = not_modified(request, etag, last_modified)
+        if response is None:
+            row = get_object_or_404(attachment_queryset(fields), id=attachment_id)
+            response = Response(serialize_attachments([row], fields)[0])
+        return with_validators(response, etag, last_modified)
+
+    except Http404:
+        raise
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+def get_attachment_transcript(request, attachment_id):
+    """
+    Stream an attachment's transcript as UTF-8 plain text from the content store.
+    A single `Range: bytes=` range is honoured; only the frames it overlaps are read.
+    """
+    row = Attachment.objects.filter(id=attachment_id, session__deleted_at__isnull=True).values_list(
+        'transcript_ref', 'transcript_length'
+    ).first()
+    if row is None:
+        return Response({'error': 'Attachment not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    ref, length = row
+    byte_range = _byte_range(request.headers.get('Range'), length)
+    start, end = byte_range or (0, length)
+    if start >= end and byte_range:
+        response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        response['Content-Range'] = f'bytes */{length}'
+        return response
+
+    response = StreamingHttpResponse(
+        read_range(ref, start, end) if ref and end > start else iter(()),
+        content_type='text/plain; charset=utf-8',
+        status=status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK
+    )
+    if byte_range:
+        response['Content-Range'] = f'bytes {start}-{end - 1}/{length}'
+    response['Content-Length'] = str(end - start)
+    response['Accept-Ranges'] = 'bytes'
+    response['X-Transcript-Length'] = str(length)
+    return response
+
+
+def _byte_range(header, length):
+    """
+    (start, end) bytes, end exclusive, of a single-range `bytes=` Range header, or None
+    to send everything (no header, a multi-range or a malformed one).
+    start == end marks an unsatisfiable range.
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    first, separator, last = header[len('bytes='):].strip().partition('-')
+    if not separator:
+        return None
+    try:
+        if not first:
+            # Suffix range: the last `last` bytes, none of them is unsatisfiable
+            suffix = int(last)
+            return (max(length - suffix, 0), length) if suffix > 0 else (length, length)
+        start = int(first)
+        end = int(last) + 1 if last else length
+    except ValueError:
+        return None
+    if start >= length:
+        return length, length
+    if end <= start:
+        return None
+    return start, min(end, length)
+
+
 @api_view(['PUT', 'PATCH'])
 def update_attachment(request, attachment_id):
     """Update an attachment"""
     try:
-        attachment = get_object_or_404(Attachment, id=attachment_id)
         data = request.data
+        fields = requested_attachment_fields(request)
 
         # Update allowed fields (status removed from public API)
         updatable_fields = ['file_type', 'file_url', 'transcript', 'summary']
+        valid_file_types = [choice[0] for choice in Attachment.FILE_TYPE_CHOICES]
+        if 'file_type' in data and data['file_type'] not in valid_file_types:
+            return Response({
+                'error': f'Invalid file_type. Must be one of: {valid_file_types}'
+            }, status=status.HTTP_400_BAD_REQUEST)
 
-        for field in updatable_fields:
-            if field in data:
-                if field == 'file_type':
-                    valid_file_types = [choice[0] for choice in Attachment.FILE_TYPE_CHOICES]
-                    if data[field] not in valid_file_types:
-                        return Response({
-                            'error': f'Invalid file_type. Must be one of: {valid_file_types}'
-                        }, status=status.HTTP_400_BAD_REQUEST)
-
+        with transaction.atomic():
+            # Row lock keeps status stable while counters move with the session
+            # Texts are in the content store, read only if they are returned
+            attachment = get_object_or_404(
+                Attachment.objects.select_for_update().select_related('session').defer('search_vector'),
+                id=attachment_id
+            )
+            changed_fields = [field for field in updatable_fields if field in data]
+            for field in changed_fields:
                 setattr(attachment, field, data[field])
 
-        # Handle session update if provided
-        if 'session_id' in data:
-            try:
-                session = KTSession.objects.get(id=data['session_id'])
-                attachment.session = session
-            except KTSession.DoesNotExist:
-                return Response({'error': 'Session not found'}, status=status.HTTP_404_NOT_FOUND)
+            # Handle session update if provided
+            previous_session_id = attachment.session_id
+            if 'session_id' in data:
+                try:
+                    session = KTSession.objects.get(id=data['session_id'])
+                    attachment.session = session
+                    changed_fields.append('session')
+                except KTSession.DoesNotExist:
+                    return Response({'error': 'Session not found'}, status=status.HTTP_404_NOT_FOUND)
+
+            # Only write what the request changed, never a stale status
+            attachment.save(update_fields=changed_fields + ['updated_at'] if changed_fields else [])
+            if attachment.session_id != previous_session_id:
+                attachment_removed(previous_session_id, attachment.status)
+                attachment_added(attachment.session_id, attachment.status)
+                # post_save only invalidates the new session's share payload
+                transaction.on_commit(lambda: invalidate_share_payload(previous_session_id))
+            if 'session' in changed_fields or any(field in data for field in LARGE_ATTACHMENT_FIELDS):
+                index_attachment(attachment.id)
+
+        return Response(attachment_to_dict(attachment, fields))
+
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        attachment.save()
+
+@api_view(['GET'])
+def search(request):
+    """Full-text search over transcripts and summaries of the user's KT sessions"""
+    try:
+        query = request.GET.get('q', '').strip()
+        if not query:
+            return Response({'error': 'q is required'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(int(request.GET.get('limit', 20)), MAX_SEARCH_RESULTS)
+        offset = int(request.GET.get('offset', 0))
+        if limit < 1 or offset < 0:
+            raise ValueError('limit must be positive and offset not negative')
 
         return Response({
-            'id': attachment.id,
-            'session': {
-                'id': attachment.session.id,
-                'title': attachment.session.title
-            },
-            'file_type': attachment.file_type,
-            'file_url': attachment.file_url,
-            'status': attachment.status,
-            'transcript': attachment.transcript,
-            'summary': attachment.summary,
-            'created_at': attachment.created_at.isoformat()
+            'query': query,
+            'results': search_attachments(request.user, query, limit=limit, offset=offset)
         })
 
+    except ValueError as e:
+        return Response({'error': f'Invalid limit or offset parameter: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def processing_stats_view(request):
+    """Processing backlog and throughput per file_type over the last `window` seconds"""
+    try:
+        window = int(request.GET.get('window', STATS_WINDOW))
+        if not 0 < window <= MAX_STATS_WINDOW:
+            raise ValueError(f'window must be between 1 and {MAX_STATS_WINDOW}')
+
+        return Response(processing_stats(timedelta(seconds=window)))
+
+    except ValueError as e:
+        return Response({'error': f'Invalid window parameter: {e}'}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -311,11 +635,101 @@ def update_attachment(request, attachment_id):
 def delete_attachment(request, attachment_id):
     """Delete an attachment"""
     try:
-        attachment = get_object_or_404(Attachment, id=attachment_id)
-        attachment.delete()
+        # Raw DELETE by id, the row is never loaded
+        if not delete_attachments([attachment_id]):
+            return Response({'error': 'Attachment not found'}, status=status.HTTP_404_NOT_FOUND)
 
         return Response({'message': 'Attachment deleted successfully'})
 
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+
+@api_view(['POST'])
+def delete_attachments_bulk(request):
+    """
+    Delete many attachments in one request.
+    Body is a list of attachment ids; they are deleted in KT_DELETE_BATCH_SIZE batches
+    without loading the rows. Ids that do not exist are reported back.
+    """
+    try:
+        ids = request.data
+        if not isinstance(ids, list) or not ids:
+            return Response({'error': 'Expected a non-empty list of attachment ids'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > BULK_ATTACHMENT_LIMIT:
+            return Response({
+                'error': f'At most {BULK_ATTACHMENT_LIMIT} attachments per request'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if not all(isinstance(attachment_id, int) and not isinstance(attachment_id, bool) for attachment_id in ids):
+            return Response({'error': 'Attachment ids must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        ids = list(dict.fromkeys(ids))
+        deleted = set(delete_attachments(ids))
+        return Response({
+            'deleted': len(deleted),
+            'not_found': [attachment_id for attachment_id in ids if attachment_id not in deleted]
+        })
+
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def export_sessions(request):
+    """
+    Stream the requesting user's KT sessions and attachments as NDJSON (see ktsessions/backup.py).
+    Staff can export another user with ?user=<email> or every user with ?all=true.
+    """
+    try:
+        users = [request.user]
+        email = request.GET.get('user')
+        export_all = request.GET.get('all') == 'true'
+        if email or export_all:
+            if not request.user.is_staff:
+                return Response({'error': 'Only staff can export other users'}, status=status.HTTP_403_FORBIDDEN)
+            if export_all:
+                users = None
+            else:
+                users = list(get_user_model().objects.filter(email=email))
+                if not users:
+                    return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        # Rows are read through a server-side cursor while the response is sent
+        response = StreamingHttpResponse(export_lines(users), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="kt-sessions.ndjson"'
+        return response
+
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def import_sessions(request):
+    """
+    Import an NDJSON export, sent as a multipart `file` or an application/x-ndjson body.
+    Sessions are created for the requesting user; staff can give them to the exported
+    owners with ?keep_owners=true. Attachments exported with a transcript are not processed again.
+    """
+    try:
+        keep_owners = request.GET.get('keep_owners') == 'true'
+        if keep_owners and not request.user.is_staff:
+            return Response({'error': 'Only staff can keep the exported owners'}, status=status.HTTP_403_FORBIDDEN)
+
+        if (request.content_type or '').startswith('multipart/'):
+            upload = request.FILES.get('file')
+            if upload is None:
+                return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+            lines = upload
+        else:
+            # Read line by line, the body is never held in memory as a whole
+            lines = iter(request.readline, b'')
+
+        result = import_lines(lines, owner=None if keep_owners else request.user)
+        created = result['sessions'] or result['attachments']
+        return Response(result, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+    except ValueError as e:
+        return Response({'error': f'Invalid import: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)